@@ -0,0 +1,133 @@
+"""
+Benchmark time-to-first-token over a multi-turn conversation.
+
+Runs the same scripted conversation with two prompt layouts:
+
+* flat:     the previous layout, one user message with the retrieved context
+            ahead of the flattened history, so the prompt prefix changes every turn
+* messages: a stable system message, prior turns as chat messages and the
+            retrieved context in the last message (what generate_response_streaming sends)
+
+Each layout starts with the model loaded but an empty KV cache. Ollama's
+prompt_eval_count is the number of prompt tokens it had to evaluate, i.e. the
+tokens not served from the KV cache of the previous turn.
+
+Usage:
+    python benchmarks/chat_ttft.py --turns 10
+    python benchmarks/chat_ttft.py --no-rag --questions questions.txt
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import ollama
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.chat import build_chat_messages
+from src.constants import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL_NAME, OLLAMA_NUM_CTX
+from src.opensearch import hybrid_search
+
+DEFAULT_QUESTIONS = [
+    "What is this document about?",
+    "Who is the intended audience?",
+    "Summarize the main requirements.",
+    "What are the key definitions?",
+    "Which steps does the process involve?",
+    "What are the most common mistakes?",
+    "How is success measured?",
+    "What are the limitations mentioned?",
+    "Which examples are given?",
+    "What should I read next?",
+]
+
+
+def flat_messages(query, context, history):
+    """The previous layout: one user message with the context before the history."""
+    prompt = "You are a knowledgeable chatbot assistant. "
+    if context:
+        prompt += "Use the following context to answer the question.\nContext:\n" + context + "\n"
+    else:
+        prompt += "Answer questions to the best of your knowledge.\n"
+    if history:
+        prompt += "Conversation History:\n"
+        for msg in history:
+            role = "User" if msg["role"] == "user" else "Assistant"
+            prompt += f"{role}: {msg['content']}\n"
+        prompt += "\n"
+    prompt += f"User: {query}\nAssistant:"
+    return [{"role": "user", "content": prompt}]
+
+
+def retrieve_context(query, top_k):
+    """Format the top hybrid search hits the way generate_response_streaming does."""
+    hits = hybrid_search(query, top_k=top_k)
+    return "".join(f"Document {i}:\n{hit['_source']['text']}\n\n" for i, hit in enumerate(hits))
+
+
+def run_conversation(build_messages, questions, contexts, max_tokens):
+    """Run one conversation and return per-turn (TTFT in ms, prompt tokens evaluated)."""
+    # Reload the model so every layout starts with an empty KV cache
+    ollama.generate(model=OLLAMA_MODEL_NAME, prompt="", keep_alive=0)
+    ollama.generate(model=OLLAMA_MODEL_NAME, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+
+    history, turns = [], []
+    for query, context in zip(questions, contexts):
+        start = time.perf_counter()
+        ttft, answer, evaluated = None, "", 0
+        for chunk in ollama.chat(
+            model=OLLAMA_MODEL_NAME,
+            messages=build_messages(query, context, history),
+            stream=True,
+            options={"temperature": 0, "num_ctx": OLLAMA_NUM_CTX, "num_predict": max_tokens},
+            keep_alive=OLLAMA_KEEP_ALIVE,
+        ):
+            if ttft is None and chunk["message"]["content"]:
+                ttft = (time.perf_counter() - start) * 1000
+            answer += chunk["message"]["content"]
+            if chunk.get("done"):
+                evaluated = chunk.get("prompt_eval_count", 0)
+        history += [{"role": "user", "content": query}, {"role": "assistant", "content": answer}]
+        turns.append((ttft or 0.0, evaluated))
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--questions", type=Path, help="File with one question per line")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--no-rag", action="store_true", help="Chat without retrieved context")
+    parser.add_argument("--max-tokens", type=int, default=64, help="Tokens generated per answer")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        questions = [line.strip() for line in args.questions.read_text().splitlines() if line.strip()]
+    questions = (questions * args.turns)[: args.turns]
+    contexts = ["" if args.no_rag else retrieve_context(q, args.top_k) for q in questions]
+
+    results = {
+        "flat": run_conversation(flat_messages, questions, contexts, args.max_tokens),
+        "messages": run_conversation(build_chat_messages, questions, contexts, args.max_tokens),
+    }
+
+    print(f"Model {OLLAMA_MODEL_NAME}, {args.turns} turns, num_ctx={OLLAMA_NUM_CTX}")
+    print(f"{'turn':>4} {'flat ms':>9} {'flat tok':>9} {'msgs ms':>9} {'msgs tok':>9}")
+    for turn, (flat, messages) in enumerate(zip(results["flat"], results["messages"]), 1):
+        print(f"{turn:>4} {flat[0]:>9.0f} {flat[1]:>9} {messages[0]:>9.0f} {messages[1]:>9}")
+    for layout, turns in results.items():
+        later = turns[1:] or turns
+        print(
+            f"{layout:<9} mean TTFT after turn 1: {statistics.mean(t for t, _ in later):.0f} ms, "
+            f"prompt tokens evaluated: {sum(n for _, n in turns)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
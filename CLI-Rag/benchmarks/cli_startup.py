@@ -0,0 +1,159 @@
+"""
+Measure the startup time of every rag subcommand with `python -X importtime`.
+
+Runs `python -X importtime -m cli.main <command> --help` for the root command and
+every subcommand, including those of `rag manage`, plus the LIGHTWEIGHT_RUNS
+commands that need no services, and reports for each:
+
+* wall:    wall time of the whole process
+* imports: time spent importing modules, summed from -X importtime
+* top:     the top-level packages that took longest to import
+* heavy:   heavy dependencies (torch, opensearchpy, ollama, ...) that were imported
+
+`--help` stops right before a command runs, so it measures what every invocation
+pays before doing any work. All measured commands are lightweight: their imports
+must fit in --budget-ms, and the script exits with status 1 when one does not, so
+it can run in CI. --output appends the results as JSON lines to track them over time.
+
+Commands run in a temporary directory, so they do not touch the project's files.
+
+Usage:
+    python benchmarks/cli_startup.py
+    python benchmarks/cli_startup.py --repeat 5 --budget-ms 300 --output startup.jsonl
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import click
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from cli.main import cli
+
+# Commands that do real work without OpenSearch or Ollama, measured as they run
+LIGHTWEIGHT_RUNS = [["manage", "list-docs"], ["chat", "--list-sessions"]]
+HEAVY_PACKAGES = (
+    "torch", "sentence_transformers", "transformers", "opensearchpy", "ollama", "streamlit",
+    "langchain", "pytesseract", "PyPDF2", "numpy", "prompt_toolkit",
+)
+
+
+def help_commands(group, prefix=()):
+    """List the argument lists of `--help` for a group and all of its subcommands."""
+    ctx = click.Context(group)
+    commands = [list(prefix) + ["--help"]]
+    for name in group.list_commands(ctx):
+        command = group.get_command(ctx, name)
+        if isinstance(command, click.Group):
+            commands += help_commands(command, prefix + (name,))
+        else:
+            commands.append(list(prefix) + [name, "--help"])
+    return commands
+
+
+def parse_importtime(stderr):
+    """Return the total import time in ms, per top-level package times and the packages imported."""
+    total_us = 0
+    top = Counter()
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        total_us += int(self_us)
+        package = name.strip().split(".")[0]
+        packages.add(package)
+        if not name.startswith(" "):
+            top[package] += int(cumulative_us)
+    return total_us / 1000, {package: us / 1000 for package, us in top.items()}, packages
+
+
+def measure(args, repeat, workdir):
+    """Run `rag <args>` with -X importtime and return the median timings."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(project_root), os.environ.get("PYTHONPATH", "")])}
+    walls, imports, tops = [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "cli.main", *args],
+            cwd=workdir, env=env, capture_output=True, text=True,
+        )
+        walls.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"rag {' '.join(args)} failed:\n{result.stderr[-2000:]}")
+        import_ms, top, packages = parse_importtime(result.stderr)
+        imports.append(import_ms)
+        tops.append(top)
+    slowest = sorted(tops[-1].items(), key=lambda item: -item[1])[:3]
+    return {
+        "command": " ".join(args),
+        "wall_ms": statistics.median(walls),
+        "import_ms": statistics.median(imports),
+        "top": {package: round(ms, 1) for package, ms in slowest},
+        "heavy": sorted(package for package in HEAVY_PACKAGES if package in packages),
+    }
+
+
+def git_revision():
+    """The current commit, to label tracked results."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per command; the median is reported")
+    parser.add_argument("--budget-ms", type=float, default=300, help="Import time allowed for each lightweight command")
+    parser.add_argument("--output", type=Path, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    commands = help_commands(cli) + LIGHTWEIGHT_RUNS
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # src modules log to logs/app.log under the working directory
+        (Path(workdir) / "logs").mkdir()
+        for command in commands:
+            result = measure(command, args.repeat, workdir)
+            result["over_budget"] = result["import_ms"] > args.budget_ms
+            results.append(result)
+
+    print(f"{len(commands)} commands, median of {args.repeat} runs, budget {args.budget_ms:.0f} ms of imports\n")
+    print(f"{'command':<32}{'wall ms':>10}{'imports ms':>12}  top packages / heavy dependencies")
+    for result in results:
+        flag = "  OVER" if result["over_budget"] else ""
+        top = ", ".join(f"{package} {ms:.0f}" for package, ms in result["top"].items())
+        print(f"rag {result['command']:<28}{result['wall_ms']:>10.0f}{result['import_ms']:>12.0f}  {top}{flag}")
+        if result["heavy"]:
+            print(f"{'':<56}heavy: {', '.join(result['heavy'])}")
+
+    if args.output:
+        stamp = {"timestamp": datetime.now().isoformat(timespec="seconds"), "revision": git_revision(), "budget_ms": args.budget_ms}
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps({**stamp, **result}) + "\n")
+
+    over = [result["command"] for result in results if result["over_budget"]]
+    if over:
+        print(f"\n{len(over)} command(s) over the {args.budget_ms:.0f} ms budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark latency and recall of filtered kNN retrieval.
+
+Compares three ways of restricting a kNN query to a subset of the index:
+
+* efficient: the filter is passed inside the kNN query (what hybrid_search does)
+* post:      the top k are retrieved globally and filtered afterwards
+* none:      unfiltered baseline latency
+
+for a selective filter (the smallest document) and a broad filter (every other
+document). Ground truth is the exact filtered nearest-neighbour set computed by
+the local retrieval backend over the same vectors.
+
+Usage:
+    python benchmarks/filtered_knn.py --queries 100 --top-k 10
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from opensearchpy import helpers
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.constants import EMBEDDING_DIMENSION, OPENSEARCH_INDEX
+from src.local_store import LocalVectorStore
+from src.opensearch import build_search_filter, get_opensearch_client
+
+
+def load_chunks(client, index_name):
+    """Scroll every chunk of the index, including its embedding."""
+    return [
+        {
+            "doc_id": hit["_id"],
+            "text": hit["_source"]["text"],
+            "embedding": hit["_source"]["embedding"],
+            "document_name": hit["_source"]["document_name"],
+        }
+        for hit in helpers.scan(client, index=index_name, query={"query": {"match_all": {}}})
+    ]
+
+
+def knn_ids(client, index_name, vector, top_k, filters, mode):
+    """Run a kNN-only query and return (ids, latency in ms)."""
+    search_filter = build_search_filter(filters)
+    knn = {"vector": vector, "k": top_k}
+    body = {"size": top_k, "_source": False, "query": {"knn": {"embedding": knn}}}
+    if mode == "efficient" and search_filter:
+        knn["filter"] = search_filter
+    elif mode == "post" and search_filter:
+        body["post_filter"] = search_filter
+
+    start = time.perf_counter()
+    response = client.search(index=index_name, body=body)
+    latency = (time.perf_counter() - start) * 1000
+    return [hit["_id"] for hit in response["hits"]["hits"]], latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--index-name", default=OPENSEARCH_INDEX)
+    parser.add_argument("--queries", type=int, default=100, help="Number of query vectors")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    client = get_opensearch_client()
+    chunks = load_chunks(client, args.index_name)
+    counts = Counter(chunk["document_name"] for chunk in chunks)
+    if len(counts) < 2:
+        sys.exit("The benchmark needs an index with at least two documents.")
+
+    smallest = min(counts, key=counts.get)
+    scenarios = {
+        "selective": {"document_name": [smallest]},
+        "broad": {"document_name": [name for name in counts if name != smallest]},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        reference = LocalVectorStore(directory, EMBEDDING_DIMENSION)
+        reference.index_documents(chunks)
+
+        # Query with perturbed copies of random chunk vectors
+        rng = np.random.default_rng(args.seed)
+        vectors = np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32)
+        picks = rng.choice(len(chunks), size=args.queries, replace=True)
+        noise = rng.normal(scale=vectors.std() * 0.1, size=(args.queries, vectors.shape[1]))
+        queries = (vectors[picks] + noise).astype(np.float32)
+
+        print(f"Index {args.index_name}: {len(chunks)} chunks, {len(counts)} documents")
+        print(f"{'filter':<10} {'share':>7} {'mode':<10} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+        for name, filters in scenarios.items():
+            rows = reference.filter_rows(filters)
+            share = len(rows) / len(chunks)
+            truth = [
+                set(reference.doc_ids_for(reference.exact_knn(query, args.top_k, rows)))
+                for query in queries
+            ]
+            for mode in ("efficient", "post", "none"):
+                latencies, recalls = [], []
+                for query, expected in zip(queries, truth):
+                    ids, latency = knn_ids(
+                        client, args.index_name, query.tolist(), args.top_k, filters, mode
+                    )
+                    latencies.append(latency)
+                    recalls.append(len(expected & set(ids)) / max(1, len(expected)))
+                latencies.sort()
+                p95 = latencies[int(0.95 * (len(latencies) - 1))]
+                recall = f"{statistics.mean(recalls):.3f}" if mode != "none" else "-"
+                print(
+                    f"{name:<10} {share:>7.1%} {mode:<10} "
+                    f"{statistics.median(latencies):>8.1f} {p95:>8.1f} {recall:>9}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Measure the latency saved by routing queries between a small and a large model.
+
+Replays a query log twice with the same prompts:
+
+* large:  every query is answered by OLLAMA_LARGE_MODEL_NAME
+* routed: route_model picks OLLAMA_MODEL_NAME or OLLAMA_LARGE_MODEL_NAME per
+          query from its length and the hybrid search scores
+
+and reports the median and p95 time to first token and total time of both, the
+share of queries routed to the small model and the routing reasons. Both models
+are loaded before timing, as they are in the app.
+
+The query log is a text file with one query per line, or a JSON lines file whose
+records have a "query" field.
+
+Usage:
+    python benchmarks/model_routing.py --log queries.txt
+    python benchmarks/model_routing.py --log queries.jsonl --no-rag --max-tokens 256
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import ollama
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import src.chat
+from src.chat import CONTEXT_INSTRUCTION, SYSTEM_PROMPT, build_chat_messages, route_model
+from src.constants import OLLAMA_KEEP_ALIVE, OLLAMA_LARGE_MODEL_NAME, OLLAMA_MODEL_NAME, OLLAMA_NUM_CTX
+from src.context_packer import pack_context
+from src.opensearch import hybrid_search
+
+DEFAULT_QUERIES = [
+    "What is the main topic of the documents?",
+    "Which requirements are mandatory?",
+    "Compare the configuration options described in the documents and explain which one fits a small deployment best.",
+    "Who is responsible for approvals?",
+    "What are the known limitations, and how do the documents suggest working around each of them?",
+    "Hi!",
+]
+
+
+def load_queries(path):
+    """Read queries from a text or JSON lines file."""
+    queries = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            query = json.loads(line).get("query")
+            if query:
+                queries.append(query)
+        else:
+            queries.append(line)
+    return queries
+
+
+def answer(model, messages, max_tokens):
+    """Stream an answer and return its time to first token and total time."""
+    start = time.perf_counter()
+    ttft = None
+    for chunk in ollama.chat(
+        model=model,
+        messages=messages,
+        stream=True,
+        options={"temperature": 0, "num_ctx": OLLAMA_NUM_CTX, "num_predict": max_tokens},
+        keep_alive=OLLAMA_KEEP_ALIVE,
+    ):
+        if ttft is None and chunk["message"]["content"]:
+            ttft = (time.perf_counter() - start) * 1000
+    return {"ttft_ms": ttft or 0.0, "total_ms": (time.perf_counter() - start) * 1000}
+
+
+def summarize(name, runs):
+    """Print median and p95 of the time to first token and total time."""
+    ttft = [r["ttft_ms"] for r in runs]
+    total = [r["total_ms"] for r in runs]
+    print(
+        f"{name:<8}{statistics.median(ttft):>12.0f}{np.percentile(ttft, 95):>12.0f}"
+        f"{statistics.median(total):>12.0f}{np.percentile(total, 95):>12.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--log", type=Path, help="Query log: one query per line, or JSON lines with a 'query' field")
+    parser.add_argument("--top-k", type=int, default=5, help="Hits retrieved per query")
+    parser.add_argument("--no-rag", action="store_true", help="Answer without retrieved context")
+    parser.add_argument("--max-tokens", type=int, default=128, help="Tokens generated per answer")
+    args = parser.parse_args()
+
+    queries = load_queries(args.log) if args.log else DEFAULT_QUERIES
+    # Evaluate the routing even when it is disabled in src/constants.py
+    src.chat.MODEL_ROUTING_ENABLED = True
+
+    for model in (OLLAMA_MODEL_NAME, OLLAMA_LARGE_MODEL_NAME):
+        ollama.generate(model=model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+    if not args.no_rag:
+        hybrid_search(queries[0], top_k=1)
+
+    results = {"large": [], "routed": []}
+    reasons = Counter()
+    for query in queries:
+        hits = None if args.no_rag else hybrid_search(query, top_k=args.top_k)
+        chunks = [f"Document {i}:\n{hit['_source']['text']}\n\n" for i, hit in enumerate(hits or [])]
+        _, chunks, _ = pack_context(f"{SYSTEM_PROMPT}{CONTEXT_INSTRUCTION}\nQuestion: {query}", [], chunks)
+        messages = build_chat_messages(query, "".join(chunks), [])
+
+        model, reason = route_model(query, hits)
+        reasons[(model, reason)] += 1
+        results["large"].append(answer(OLLAMA_LARGE_MODEL_NAME, messages, args.max_tokens))
+        results["routed"].append(answer(model, messages, args.max_tokens))
+
+    print(f"{len(queries)} queries, {OLLAMA_MODEL_NAME} (small) vs {OLLAMA_LARGE_MODEL_NAME} (large)")
+    for (model, reason), count in reasons.most_common():
+        print(f"  {count:>4} x {model:<20} {reason}")
+    print(f"\n{'':<8}{'ttft p50':>12}{'ttft p95':>12}{'total p50':>12}{'total p95':>12}")
+    for name, runs in results.items():
+        summarize(name, runs)
+
+    saved = sum(r["total_ms"] for r in results["large"]) - sum(r["total_ms"] for r in results["routed"])
+    small = sum(count for (model, _), count in reasons.items() if model == OLLAMA_MODEL_NAME)
+    print(
+        f"\n{small / len(queries):.0%} of queries routed to the small model, "
+        f"{saved / len(queries):.0f} ms saved per query on average"
+    )
+
+
+if __name__ == "__main__":
+    main()
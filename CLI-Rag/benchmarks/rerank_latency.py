@@ -0,0 +1,121 @@
+"""
+Measure the end-to-end latency trade-off of cross-encoder reranking.
+
+For each query, compares two ways of building the context:
+
+* baseline: the top --baseline-k hybrid search hits go to the LLM
+* rerank:   --candidates hits are reranked and the top --top-n go to the LLM
+
+and reports per stage the median retrieval time, rerank time, prompt tokens,
+prefill time (Ollama's prompt_eval_duration), time to first token and total
+time. Reranking pays off when the prefill time it saves exceeds its own cost.
+
+Usage:
+    python benchmarks/rerank_latency.py --queries queries.txt
+    python benchmarks/rerank_latency.py --candidates 30 --top-n 3 --baseline-k 10
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import ollama
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.chat import CONTEXT_INSTRUCTION, SYSTEM_PROMPT, build_chat_messages
+from src.constants import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL_NAME, OLLAMA_NUM_CTX
+from src.context_packer import pack_context
+from src.opensearch import hybrid_search
+from src.rerank import get_reranker, rerank_hits
+
+DEFAULT_QUERIES = [
+    "What is the main topic of the documents?",
+    "Which requirements are mandatory?",
+    "How is the process configured?",
+    "What are the known limitations?",
+    "Who is responsible for approvals?",
+]
+
+
+def answer(query, hits, max_tokens):
+    """Build the prompt from hits and stream an answer, returning prefill stats."""
+    chunks = [f"Document {i}:\n{hit['_source']['text']}\n\n" for i, hit in enumerate(hits)]
+    _, chunks, _ = pack_context(f"{SYSTEM_PROMPT}{CONTEXT_INSTRUCTION}\nQuestion: {query}", [], chunks)
+    messages = build_chat_messages(query, "".join(chunks), [])
+
+    start = time.perf_counter()
+    ttft, final = None, {}
+    for chunk in ollama.chat(
+        model=OLLAMA_MODEL_NAME,
+        messages=messages,
+        stream=True,
+        options={"temperature": 0, "num_ctx": OLLAMA_NUM_CTX, "num_predict": max_tokens},
+        keep_alive=OLLAMA_KEEP_ALIVE,
+    ):
+        if ttft is None and chunk["message"]["content"]:
+            ttft = (time.perf_counter() - start) * 1000
+        if chunk.get("done"):
+            final = chunk
+    return {
+        "prompt_tokens": final.get("prompt_eval_count", 0),
+        "prefill_ms": final.get("prompt_eval_duration", 0) / 1e6,
+        "ttft_ms": ttft or 0.0,
+        "generate_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def run(query, top_k, top_n, max_tokens):
+    """Run one query; reranks when top_n is given."""
+    start = time.perf_counter()
+    hits = hybrid_search(query, top_k=top_k)
+    stats = {"retrieval_ms": (time.perf_counter() - start) * 1000, "rerank_ms": 0.0}
+    if top_n is not None:
+        hits = rerank_hits(query, hits, top_n, stats)
+    stats.update(answer(query, hits, max_tokens))
+    stats["total_ms"] = stats["retrieval_ms"] + stats["rerank_ms"] + stats["generate_ms"]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", type=Path, help="File with one query per line")
+    parser.add_argument("--baseline-k", type=int, default=10, help="Hits sent to the LLM without reranking")
+    parser.add_argument("--candidates", type=int, default=20, help="Hits fetched for the reranker")
+    parser.add_argument("--top-n", type=int, default=3, help="Hits kept after reranking")
+    parser.add_argument("--max-tokens", type=int, default=128, help="Tokens generated per answer")
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        queries = [line.strip() for line in args.queries.read_text().splitlines() if line.strip()]
+
+    # Load the models and the kNN graphs before timing anything
+    get_reranker()
+    hybrid_search(queries[0], top_k=1)
+    ollama.generate(model=OLLAMA_MODEL_NAME, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+
+    results = {"baseline": [], "rerank": []}
+    for query in queries:
+        results["baseline"].append(run(query, args.baseline_k, None, args.max_tokens))
+        results["rerank"].append(run(query, args.candidates, args.top_n, args.max_tokens))
+
+    columns = ["retrieval_ms", "rerank_ms", "prompt_tokens", "prefill_ms", "ttft_ms", "total_ms"]
+    print(f"{len(queries)} queries, medians")
+    print(f"{'':<9}" + "".join(f"{column:>14}" for column in columns))
+    for name, runs in results.items():
+        print(f"{name:<9}" + "".join(f"{statistics.median(r[c] for r in runs):>14.0f}" for c in columns))
+
+    saved = statistics.median(r["prefill_ms"] for r in results["baseline"]) - statistics.median(
+        r["prefill_ms"] for r in results["rerank"]
+    )
+    cost = statistics.median(r["rerank_ms"] for r in results["rerank"])
+    print(f"\nPrefill saved: {saved:.0f} ms, rerank cost: {cost:.0f} ms, net: {saved - cost:+.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
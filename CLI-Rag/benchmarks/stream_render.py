@@ -0,0 +1,108 @@
+"""
+Measure the rendering cost of streaming an answer token by token.
+
+Replays a synthetic answer of --tokens tokens at --tokens-per-second through
+the two frontends, once rendering every token and once through RenderCoalescer:
+
+* streamlit: each update serializes the whole answer so far into the Markdown
+             message Streamlit sends over the websocket (what st.empty().markdown does)
+* cli:       each update prints the new text with rich, as `rag chat` does
+
+and reports the number of updates, the bytes sent to the browser or terminal and
+the CPU time spent rendering. No browser or model is needed.
+
+Usage:
+    python benchmarks/stream_render.py
+    python benchmarks/stream_render.py --tokens 2000 --tokens-per-second 50 --fps 15
+"""
+
+import argparse
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+from rich.console import Console
+from streamlit.proto.Markdown_pb2 import Markdown
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.constants import STREAM_RENDER_FPS, STREAM_RENDER_MAX_PENDING_CHARS
+from src.rendering import RenderCoalescer
+
+WORDS = "the model answers questions about documents using retrieved context and history".split()
+
+
+def make_tokens(count):
+    """A reproducible answer of `count` word-sized tokens."""
+    rng = random.Random(0)
+    return [(" " if i else "") + rng.choice(WORDS) for i in range(count)]
+
+
+def streamlit_renderer(stats):
+    """Serialize the full text like st.markdown, counting the bytes sent."""
+    def render(text, _):
+        stats["bytes"] += len(Markdown(body=text + "▌").SerializeToString())
+    return render
+
+
+class CountingWriter(io.TextIOBase):
+    """A terminal stand-in counting the bytes written to it."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def write(self, text):
+        self.stats["bytes"] += len(text.encode())
+        return len(text)
+
+
+def cli_renderer(stats):
+    """Print the new text with rich, counting the bytes written."""
+    console = Console(file=CountingWriter(stats), force_terminal=True, width=100)
+
+    def render(_, delta):
+        console.print(delta, end="")
+    return render
+
+
+def replay(tokens, delay, make_renderer, fps, max_pending_chars):
+    """Stream tokens through a coalescer, measuring updates, bytes and CPU time."""
+    stats = {"bytes": 0}
+    coalescer = RenderCoalescer(make_renderer(stats), fps=fps, max_pending_chars=max_pending_chars)
+    cpu = 0.0
+    for token in tokens:
+        time.sleep(delay)
+        start = time.process_time()
+        coalescer.add(token)
+        cpu += time.process_time() - start
+    start = time.process_time()
+    coalescer.flush()
+    cpu += time.process_time() - start
+    return {"updates": coalescer.flushes, "bytes": stats["bytes"], "cpu_ms": cpu * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=1000, help="Tokens in the answer")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="Simulated decode speed")
+    parser.add_argument("--fps", type=float, default=STREAM_RENDER_FPS, help="Coalesced updates per second")
+    parser.add_argument("--max-pending-chars", type=int, default=STREAM_RENDER_MAX_PENDING_CHARS, help="Characters that force an update")
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.tokens)
+    delay = 1 / args.tokens_per_second
+    print(f"{args.tokens} tokens at {args.tokens_per_second:.0f} tok/s, coalesced at {args.fps:.0f} fps")
+    print(f"{'':<22}{'updates':>10}{'bytes':>14}{'cpu ms':>10}")
+    for name, make_renderer in (("streamlit", streamlit_renderer), ("cli", cli_renderer)):
+        baseline = replay(tokens, delay, make_renderer, 0, 1)
+        coalesced = replay(tokens, delay, make_renderer, args.fps, args.max_pending_chars)
+        for mode, result in (("per token", baseline), ("coalesced", coalesced)):
+            print(f"{name + ' ' + mode:<22}{result['updates']:>10}{result['bytes']:>14,}{result['cpu_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
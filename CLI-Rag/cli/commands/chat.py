@@ -1,60 +1,140 @@
 import click
 from rich.console import Console
 from rich.markdown import Markdown
+from rich.markup import escape
 from rich.panel import Panel
-from prompt_toolkit import PromptSession
-from prompt_toolkit.history import FileHistory
+from rich.table import Table
 import sys
+from datetime import datetime
 from pathlib import Path
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.chat import generate_response_streaming, ensure_model_pulled
-from src.embeddings import get_embedding_model
-from src.opensearch import hybrid_search
-from src.constants import OLLAMA_MODEL_NAME
+from src.constants import OPENSEARCH_INDEX, RERANK_ENABLED, SESSION_RENDER_MESSAGES
 
 console = Console()
 
+def print_messages(messages):
+    """Print stored messages dimmed; returns the ID to page back from, or None at the start."""
+    for message in messages:
+        label = 'You' if message['role'] == 'user' else 'Assistant'
+        console.print(f"[dim]{label} ❯ {escape(message['content'])}[/dim]")
+    if len(messages) < SESSION_RENDER_MESSAGES:
+        return None
+    return messages[0]['message_id']
+
 @click.command()
 @click.option('--rag/--no-rag', default=True, help='Enable/disable RAG mode')
 @click.option('--top-k', default=5, help='Number of documents to retrieve')
+@click.option('--rerank/--no-rerank', default=RERANK_ENABLED, help='Rerank over-fetched results with a cross-encoder')
 @click.option('--temperature', default=0.7, help='LLM temperature')
-@click.option('--index-name', default='rag_index', help='OpenSearch index name')
-def chat(rag, top_k, temperature, index_name):
+@click.option('--index-name', default=OPENSEARCH_INDEX, help='OpenSearch index name')
+@click.option('--doc', 'docs', multiple=True, help='Only retrieve from this document (repeatable)')
+@click.option('--collection', 'collections', multiple=True, help='Only retrieve from this collection (repeatable)')
+@click.option('--tenant', 'tenants', multiple=True, help='Only retrieve from this tenant (repeatable)')
+@click.option('--timings', is_flag=True, help='Show the latency of each stage after every answer')
+@click.option('--model', default=None, help='Ollama model to answer with (default: routed per query)')
+@click.option('--session', 'session_id', default=None, help='Resume a stored conversation by its ID')
+@click.option('--list-sessions', is_flag=True, help='List recent conversations and exit')
+def chat(rag, top_k, rerank, temperature, index_name, docs, collections, tenants, timings, model, session_id, list_sessions):
     """Start an interactive chat session."""
     
+    # Conversations are stored, so they can be resumed with --session
+    from src.session_store import get_session_store
+    store = get_session_store()
+    if list_sessions:
+        table = Table(title="Recent Conversations")
+        table.add_column("Session", style="cyan")
+        table.add_column("Title")
+        table.add_column("Messages", justify="right")
+        table.add_column("Last Active")
+        for stored in store.list_sessions():
+            table.add_row(
+                stored['session_id'],
+                escape(stored['title']),
+                str(stored['message_count']),
+                datetime.fromtimestamp(stored['updated_at']).strftime('%Y-%m-%d %H:%M'),
+            )
+        console.print(table)
+        return
+    if session_id and not store.count_messages(session_id):
+        console.print(f"[red]Unknown session: {session_id}[/red]")
+        raise click.Abort()
+    resumed = session_id is not None
+    
+    # Imported here so `rag --help` and --list-sessions do not load torch, ollama and opensearchpy
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.history import FileHistory
+    from src.chat import chat_models, generate_response_streaming, ensure_model_pulled
+    from src.embeddings import get_embedding_model
+    from src.generation import get_generation_stats
+    from src.metrics import format_timings
+    from src.model_readiness import get_model_readiness
+    from src.rendering import RenderCoalescer
+    from src.opensearch import warmup_search_index
+    from src.rerank import get_reranker
+    session_id = session_id or store.create_session()
+    
+    filters = {
+        'document_name': list(docs),
+        'collection': list(collections),
+        'tenant': list(tenants),
+    }
+    scope = ", ".join(list(docs) + list(collections) + list(tenants)) or "All documents"
+    
     console.print(Panel.fit(
         "[bold cyan]Local RAG Chat System[/bold cyan]\n\n"
-        f"Mode: {'RAG Enabled' if rag else 'Direct LLM'}\n"
-        f"Model: {OLLAMA_MODEL_NAME}\n"
-        f"Temperature: {temperature}\n\n"
+        f"Mode: {'RAG Enabled' if rag else 'Direct LLM'}{' + Rerank' if rag and rerank else ''}\n"
+        f"Model: {model or ' / '.join(chat_models())}\n"
+        f"Temperature: {temperature}\n"
+        f"Scope: {scope}\n"
+        f"Session: {session_id}\n\n"
         "[dim]Commands:[/dim]\n"
         "  • Type 'exit' or 'quit' to end\n"
-        "  • Type 'clear' to clear history\n"
+        "  • Type 'clear' to start a new conversation\n"
+        "  • Type 'older' to show earlier messages\n"
         "  • Ctrl+C to interrupt",
         border_style="cyan"
     ))
     
     # Ensure model is available
+    models = [model] if model else chat_models()
     with console.status("[bold green]Checking model availability..."):
-        if not ensure_model_pulled(OLLAMA_MODEL_NAME):
+        if not all(ensure_model_pulled(name) for name in models):
             console.print("[red]Failed to load model. Please check Ollama installation.[/red]")
             raise click.Abort()
+    # Load the models while the embedding model and the index warm up
+    readiness = get_model_readiness()
+    readiness.warm_up(models)
     
     # Load embedding model if RAG is enabled
     embedding_model = None
     if rag:
         with console.status("[bold green]Loading embedding model..."):
             embedding_model = get_embedding_model()
+        with console.status("[bold green]Warming up search index..."):
+            warmup_search_index(index_name)
+        if rerank:
+            with console.status("[bold green]Loading reranker model..."):
+                get_reranker()
         console.print("[green]✓ RAG system ready[/green]\n")
     else:
         console.print("[yellow]⚠ RAG disabled - using direct LLM only[/yellow]\n")
+    console.print(
+        "[dim]Models: "
+        + ", ".join(f"{name} ({readiness.status(name)})" for name in models)
+        + "[/dim]\n"
+    )
     
     session = PromptSession(history=FileHistory('.chat_history'))
-    chat_history = []
+    conversation = store.open_conversation(session_id)
+    # Only the latest messages of a resumed conversation are shown
+    oldest_shown = None
+    if resumed:
+        messages = store.load_messages(session_id, SESSION_RENDER_MESSAGES)
+        oldest_shown = print_messages(messages)
     
     while True:
         try:
@@ -69,53 +149,105 @@ def chat(rag, top_k, temperature, index_name):
                 break
             
             if user_input.lower() == 'clear':
-                chat_history = []
+                session_id = store.create_session()
+                conversation = store.open_conversation(session_id)
+                oldest_shown = None
                 console.clear()
-                console.print("[green]✓ Chat history cleared[/green]")
+                console.print(f"[green]✓ Started a new conversation ({session_id})[/green]")
+                continue
+            
+            if user_input.lower() == 'older':
+                if oldest_shown is None:
+                    console.print("[dim]No earlier messages[/dim]")
+                else:
+                    messages = store.load_messages(session_id, SESSION_RENDER_MESSAGES, before_id=oldest_shown)
+                    oldest_shown = print_messages(messages)
                 continue
             
-            # Retrieve context if RAG is enabled
-            context = ""
-            if rag and embedding_model:
-                with console.status("[dim]Retrieving relevant documents...[/dim]"):
-                    search_results = hybrid_search(
-                        user_input, 
-                        embedding_model, 
-                        top_k, 
-                        index_name
+            response_stream = None
+            response_text = ''
+            try:
+                # Retrieve context (if RAG is enabled) and start the response stream
+                prompt_report = {}
+                with console.status("[dim]Retrieving relevant documents...[/dim]") as status:
+                    response_stream = generate_response_streaming(
+                        user_input,
+                        use_hybrid_search=rag,
+                        num_results=top_k,
+                        temperature=temperature,
+                        chat_history=conversation.prompt_messages(),
+                        filters=filters,
+                        index_name=index_name,
+                        report=prompt_report,
+                        rerank=rerank,
+                        model=model,
+                        on_queue_position=lambda ahead: status.update(
+                            f"[dim]Waiting for the model: {ahead} request(s) ahead...[/dim]"
+                        ),
                     )
-                    
-                    if search_results:
-                        context = "\n\n".join([
-                            result['_source']['text'] 
-                            for result in search_results
-                        ])
-                        console.print(f"[dim]Retrieved {len(search_results)} relevant chunks[/dim]")
             
-            # Generate response
-            console.print("\n[bold blue]Assistant[/bold blue] ❯ ", end="")
+                if response_stream is None:
+                    if prompt_report.get('error'):
+                        console.print(f"[yellow]{prompt_report['error']}[/yellow]")
+                    else:
+                        console.print("[red]Failed to generate a response. Please check Ollama.[/red]")
+                    continue
+                # Stored as soon as the answer starts, so an interrupted answer does not lose it
+                store.add_messages(session_id, [{'role': 'user', 'content': user_input}])
             
-            response_text = ""
-            for chunk in generate_response_streaming(
-                user_input, 
-                context, 
-                chat_history, 
-                temperature
-            ):
-                console.print(chunk, end="")
-                response_text += chunk
+                # Generate response
+                console.print("\n[bold blue]Assistant[/bold blue] ❯ ", end="")
+            
+                coalescer = RenderCoalescer(lambda _, delta: console.print(delta, end=""))
+                try:
+                    for chunk in response_stream:
+                        coalescer.add(chunk['message']['content'])
+                except KeyboardInterrupt:
+                    # Close the stream so Ollama stops generating the rest of the answer
+                    response_stream.cancel()
+                    coalescer.flush()
+                    response_text = coalescer.text
+                    stats = get_generation_stats()
+                    console.print(
+                        f"\n\n[yellow]⚠ Generation stopped[/yellow] "
+                        f"[dim]({stats['tokens_saved']} tokens saved by stopped answers so far)[/dim]"
+                    )
+                    continue
+            
+                coalescer.flush()
+                response_text = coalescer.text
+                console.print()  # New line after response
+                if prompt_report.get('answer_cache') == 'hit':
+                    console.print(
+                        f"[dim]Answered from the cache of similar questions "
+                        f"({prompt_report['hit_rate']:.0%} hit rate)[/dim]"
+                    )
+                else:
+                    console.print(
+                        f"[dim]Prompt: {prompt_report['used']}/{prompt_report['budget']} tokens, "
+                        f"{prompt_report['chunks_used']} chunks "
+                        f"({prompt_report['chunks_truncated']} truncated, {prompt_report['chunks_dropped']} dropped), "
+                        f"{prompt_report['history_messages']} history messages "
+                        f"({conversation.summarized} summarized), "
+                        f"{prompt_report['model']} ({prompt_report['route']})"
+                        + (
+                            f", reranked {prompt_report['rerank_candidates']} hits in {prompt_report['rerank_ms']:.0f} ms"
+                            if 'rerank_ms' in prompt_report
+                            else ""
+                        )
+                        + "[/dim]"
+                    )
             
-            console.print()  # New line after response
+                if timings and prompt_report.get('timings'):
+                    console.print(f"[dim]{format_timings(prompt_report['timings'])}[/dim]")
             
-            # Update history
-            chat_history.append({
-                "role": "user",
-                "content": user_input
-            })
-            chat_history.append({
-                "role": "assistant", 
-                "content": response_text
-            })
+            finally:
+                # Update history, with an interrupted answer as far as it got;
+                # older turns are summarized in the background. A request that
+                # never started answering is not stored.
+                if response_stream is not None:
+                    store.add_messages(session_id, [{'role': 'assistant', 'content': response_text}])
+                    conversation.add_turn(user_input, response_text)
             
         except KeyboardInterrupt:
             console.print("\n\n[yellow]⚠ Interrupted[/yellow]")
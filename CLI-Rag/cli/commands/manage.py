@@ -2,15 +2,27 @@ import click
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
+from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
 import sys
+import time
+from datetime import datetime
 from pathlib import Path
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from opensearchpy import OpenSearch
-from src.ingestion import delete_index, delete_documents_by_document_name
+# The modules behind the commands (opensearchpy, torch, ollama) are imported by
+# the commands that need them, so listing documents or showing help stays fast
+from src.constants import (
+    CAPACITY_GROWTH_FACTORS,
+    DELETE_REQUESTS_PER_SECOND,
+    EXPUNGE_AFTER_DELETE,
+    FORCE_MERGE_MAX_SEGMENTS,
+    OPENSEARCH_INDEX,
+    SNAPSHOT_IMPORT_THREADS,
+    SNAPSHOT_SLICES,
+)
 
 console = Console()
 
@@ -27,12 +39,6 @@ try:
 except ImportError:
     INDEX_NAME = 'rag_index'
 
-try:
-    import ollama
-    OLLAMA_AVAILABLE = True
-except ImportError:
-    OLLAMA_AVAILABLE = False
-
 @click.group()
 def manage():
     """Manage the RAG system."""
@@ -46,6 +52,7 @@ def status():
     
     # Check OpenSearch
     try:
+        from opensearchpy import OpenSearch
         client = OpenSearch(
             hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
             http_compress=True,
@@ -63,9 +70,12 @@ def status():
         console.print(f"  Error: {str(e)}")
     
     # Check Ollama
-    if OLLAMA_AVAILABLE:
+    try:
+        import ollama
+    except ImportError:
+        ollama = None
+    if ollama is not None:
         try:
-            import ollama
             models = ollama.list()
             console.print(f"\n[green]✓[/green] Ollama: [bold]Available[/bold]")
             model_list = models.get('models', [])
@@ -102,6 +112,7 @@ def status():
 def list_indices(index_name):
     """List OpenSearch indices and their stats."""
     try:
+        from opensearchpy import OpenSearch
         client = OpenSearch(
             hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
             http_compress=True,
@@ -137,6 +148,8 @@ def list_indices(index_name):
 def delete_idx():
     """Delete the OpenSearch index (removes all documents)."""
     try:
+        from opensearchpy import OpenSearch
+        from src.ingestion import delete_index
         client = OpenSearch(
             hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
             http_compress=True,
@@ -152,21 +165,403 @@ def delete_idx():
 
 @manage.command()
 @click.argument('document_name')
+@click.option('--wait/--no-wait', default=True, help='Wait for the background deletion to finish')
+@click.option('--requests-per-second', 'requests_per_second', type=float,
+              default=DELETE_REQUESTS_PER_SECOND, help='Throttle for the deletion')
+@click.option('--expunge/--no-expunge', default=EXPUNGE_AFTER_DELETE,
+              help='Expunge deleted chunks afterwards to reclaim kNN graph memory')
 @click.confirmation_option(prompt='Are you sure you want to delete this document?')
-def delete_doc(document_name):
+def delete_doc(document_name, wait, requests_per_second, expunge):
     """Delete a specific document by filename."""
     try:
-        result = delete_documents_by_document_name(document_name)
+        from src.ingestion import expunge_deleted_documents, start_document_deletion
+        task_id = start_document_deletion(document_name, requests_per_second=requests_per_second)
+        
+        if not wait:
+            console.print(f"[green]✓ Deletion of '{document_name}' started as task {task_id}[/green]")
+            console.print(f"[dim]Check progress with: rag manage task-status {task_id}[/dim]")
+            return
+        
+        status = wait_for_deletion(task_id, f"Deleting '{document_name}'...")
+        print_deletion_status(document_name, status)
+        
+        if expunge and status['completed'] and status['deleted'] > 0:
+            expunge_deleted_documents()
+            console.print("[green]✓ Started expunging deleted chunks[/green]")
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command()
+@click.argument('task_id')
+@click.option('--wait/--no-wait', default=False, help='Keep polling until the task finishes')
+def task_status(task_id, wait):
+    """Show the progress of a background document deletion."""
+    try:
+        from src.ingestion import get_deletion_status
+        if wait:
+            status = wait_for_deletion(task_id, f"Task {task_id}...")
+        else:
+            status = get_deletion_status(task_id)
+        
+        state = "[green]completed[/green]" if status['completed'] else "[yellow]running[/yellow]"
+        console.print(f"Task {task_id}: {state}")
+        console.print(f"  Deleted: {status['deleted']} / {status['total']} chunks")
+        if status['failures'] or status.get('error'):
+            console.print(f"  [red]Failures: {status.get('error') or status['failures']}[/red]")
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+def wait_for_deletion(task_id, description, poll_interval=1.0):
+    """Poll a deletion task with a progress bar until it completes."""
+    from src.ingestion import get_deletion_status
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total}"),
+        console=console,
+    ) as progress:
+        bar = progress.add_task(description, total=None)
+        while True:
+            status = get_deletion_status(task_id)
+            progress.update(bar, total=status['total'] or None, completed=status['deleted'])
+            if status['completed']:
+                return status
+            time.sleep(poll_interval)
+
+def print_deletion_status(document_name, status):
+    """Report the outcome of a finished deletion."""
+    if status['failures'] or status.get('error'):
+        console.print(f"[red]Deletion finished with errors: {status.get('error') or status['failures']}[/red]")
+    elif status['deleted'] > 0:
+        console.print(f"[green]✓ Deleted {status['deleted']} chunks from document '{document_name}'[/green]")
+    else:
+        console.print(f"[yellow]No documents found with name '{document_name}'[/yellow]")
+
+@manage.command()
+@click.option('--promote/--no-promote', default=True, help='Point the alias at the new index when it is ready')
+@click.option('--rechunk/--keep-chunks', default=None,
+              help='Re-chunk documents (default: only if the chunk settings changed)')
+@click.option('--reuse-embeddings/--reembed', default=None,
+              help='Reuse stored embeddings (default: only if the embedding model is unchanged)')
+def reindex(promote, rechunk, reuse_embeddings):
+    """Build a new index version with the current settings while search stays up."""
+    try:
+        from src.opensearch import get_opensearch_client
+        from src.reindex import build_index_version
+        client = get_opensearch_client()
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed}/{task.total}"),
+            console=console,
+        ) as progress:
+            bar = progress.add_task("Building new index version...", total=None)
+            stats = build_index_version(
+                client,
+                promote=promote,
+                rechunk=rechunk,
+                reuse_embeddings=reuse_embeddings,
+                progress_callback=lambda done, total: progress.update(bar, completed=done, total=total),
+            )
+        
+        console.print(f"[green]✓ Built {stats['index']} from {stats['source_index'] or 'an empty index'}[/green]")
+        console.print(f"  Chunks: {stats['chunks']} "
+                      f"({stats['reused_embeddings']} reused, {stats['new_embeddings']} new embeddings)")
+        if stats['promoted']:
+            if stats['caught_up']:
+                console.print(f"  Caught up: {stats['caught_up']} document(s) changed during the build")
+            console.print(f"[green]✓ {stats['index']} is now live[/green]")
+        else:
+            console.print(f"[dim]Promote it with: rag manage promote {stats['index']}[/dim]")
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command()
+def list_versions():
+    """List the index versions behind the search alias."""
+    try:
+        from src.opensearch import get_opensearch_client
+        from src.reindex import list_index_versions
+        versions = list_index_versions(get_opensearch_client())
+        
+        if not versions:
+            console.print("[yellow]No index versions found[/yellow]")
+            return
+        
+        table = Table(title="Index Versions", border_style="blue")
+        table.add_column("Index", style="cyan")
+        table.add_column("Live", justify="center")
+        table.add_column("Chunks", justify="right", style="green")
+        table.add_column("Size", justify="right")
+        table.add_column("Embedding Model")
+        table.add_column("Chunk Size", justify="right")
+        table.add_column("Created", style="yellow")
+        
+        for version in versions:
+            meta = version['meta']
+            table.add_row(
+                version['index'],
+                "[green]●[/green]" if version['live'] else "",
+                str(version['chunks']),
+                version['size'],
+                str(meta.get('embedding_model', 'unknown')),
+                str(meta.get('text_chunk_size', '?')),
+                datetime.fromtimestamp(version['created']).strftime('%Y-%m-%d %H:%M'),
+            )
+        
+        console.print(table)
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command()
+@click.argument('version')
+def promote(version):
+    """Point the search alias at another index version (e.g. 3 or documents_v3)."""
+    try:
+        from src.ingestion import versioned_index_name
+        from src.opensearch import get_opensearch_client
+        from src.reindex import promote_index_version
+        index_name = versioned_index_name(int(version)) if version.isdigit() else version
+        caught_up = promote_index_version(get_opensearch_client(), index_name)
+        if caught_up:
+            console.print(f"[dim]Copied {caught_up} document(s) changed since the build[/dim]")
+        console.print(f"[green]✓ {index_name} is now live[/green]")
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command()
+@click.option('--keep', default=1, help='Number of previous versions to keep for rollback')
+@click.confirmation_option(prompt='Are you sure you want to delete old index versions?')
+def gc(keep):
+    """Delete index versions older than the live one."""
+    try:
+        from src.opensearch import get_opensearch_client
+        from src.reindex import gc_index_versions
+        deleted = gc_index_versions(get_opensearch_client(), keep=keep)
         
-        deleted = result.get('deleted', 0)
-        if deleted > 0:
-            console.print(f"[green]✓ Deleted {deleted} chunks from document '{document_name}'[/green]")
+        if deleted:
+            console.print(f"[green]✓ Deleted {', '.join(deleted)}[/green]")
         else:
-            console.print(f"[yellow]No documents found with name '{document_name}'[/yellow]")
+            console.print("[yellow]No old index versions to delete[/yellow]")
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command()
+@click.argument('output_dir', type=click.Path(file_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['parquet', 'npy']), default=None,
+              help='Shard format (default: parquet if pyarrow is installed, else npy)')
+@click.option('--slices', default=SNAPSHOT_SLICES, help='Number of parallel sliced scrolls')
+@click.option('--index-name', default=OPENSEARCH_INDEX, help='OpenSearch index or alias to export')
+def export(output_dir, file_format, slices, index_name):
+    """Export chunks and embeddings to local snapshot files."""
+    try:
+        from src.snapshot import export_index
+        start = time.perf_counter()
+        with console.status(f"[bold green]Exporting {index_name} to {output_dir}..."):
+            manifest = export_index(output_dir, index_name=index_name, file_format=file_format, slices=slices)
+        elapsed = time.perf_counter() - start
+        
+        console.print(f"[green]✓ Exported {manifest['chunks']} chunks to {output_dir} "
+                      f"({len(manifest['shards'])} {manifest['format']} shards)[/green]")
+        console.print(f"[dim]{elapsed:.1f}s, {manifest['chunks'] / max(elapsed, 1e-9):.0f} chunks/s[/dim]")
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command(name='import')
+@click.argument('input_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('--threads', default=SNAPSHOT_IMPORT_THREADS, help='Threads sending bulk requests')
+@click.option('--index-name', default=OPENSEARCH_INDEX, help='OpenSearch index or alias to load into')
+def import_(input_dir, threads, index_name):
+    """Load a snapshot without re-embedding (also seeds the local backend)."""
+    try:
+        from src.snapshot import import_snapshot
+        start = time.perf_counter()
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed}/{task.total}"),
+            console=console,
+        ) as progress:
+            bar = progress.add_task(f"Importing {input_dir}...", total=None)
+            result = import_snapshot(
+                input_dir,
+                index_name=index_name,
+                thread_count=threads,
+                progress_callback=lambda done, total: progress.update(bar, completed=done, total=total),
+            )
+        elapsed = time.perf_counter() - start
+        
+        console.print(f"[green]✓ Imported {result['chunks']} chunks into {index_name}[/green]")
+        console.print(f"[dim]{elapsed:.1f}s, {result['chunks'] / max(elapsed, 1e-9):.0f} chunks/s[/dim]")
+        if result['errors']:
+            console.print(f"[red]{len(result['errors'])} chunks failed to index[/red]")
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command()
+@click.option('--index-name', default=OPENSEARCH_INDEX, help='OpenSearch index or alias to warm up')
+def warmup(index_name):
+    """Load the kNN graphs of the index into memory."""
+    try:
+        from src.opensearch import get_opensearch_client, warmup_knn_index
+        client = get_opensearch_client()
+        start = time.perf_counter()
+        with console.status(f"[bold green]Warming up {index_name}..."):
+            response = warmup_knn_index(client, index_name)
+        shards = response.get('_shards', {})
+        console.print(f"[green]✓ Warmed up {index_name} in {time.perf_counter() - start:.1f}s "
+                      f"({shards.get('successful', 0)}/{shards.get('total', 0)} shards)[/green]")
+        print_graph_memory(client)
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command()
+@click.option('--max-segments', default=FORCE_MERGE_MAX_SEGMENTS, help='Target number of segments per shard')
+@click.option('--warmup/--no-warmup', 'warm', default=True, help='Warm up the merged kNN graphs')
+@click.option('--index-name', default=OPENSEARCH_INDEX, help='OpenSearch index or alias to optimize')
+def optimize(max_segments, warm, index_name):
+    """Force-merge the index to fewer segments and warm it up."""
+    try:
+        from src.opensearch import (
+            force_merge_index,
+            get_opensearch_client,
+            get_segment_count,
+            warmup_knn_index,
+        )
+        client = get_opensearch_client()
+        before = get_segment_count(client, index_name)
+        start = time.perf_counter()
+        with console.status(f"[bold green]Merging {before} segments of {index_name}..."):
+            force_merge_index(client, index_name, max_num_segments=max_segments)
+        after = get_segment_count(client, index_name)
+        console.print(f"[green]✓ Merged {before} → {after} segments in {time.perf_counter() - start:.1f}s[/green]")
+        
+        if warm:
+            # Merged segments have new graphs that are not loaded yet
+            with console.status(f"[bold green]Warming up {index_name}..."):
+                warmup_knn_index(client, index_name)
+            console.print(f"[green]✓ Warmed up {index_name}[/green]")
+        print_graph_memory(client)
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+
+@manage.command()
+@click.option('--index-name', default=OPENSEARCH_INDEX, help='OpenSearch index or alias to inspect')
+@click.option('--growth', 'growth_factors', type=float, multiple=True,
+              help='Corpus growth factor to project (repeatable, default: 2, 5, 10)')
+@click.option('--top-docs', default=10, help='Number of documents listed by chunk count')
+def stats(index_name, growth_factors, top_docs):
+    """Show index statistics and project memory and latency for corpus growth."""
+    try:
+        from src.index_stats import collect_index_stats, project_capacity
+        from src.opensearch import get_opensearch_client
+        client = get_opensearch_client()
+        with console.status(f"[bold green]Collecting statistics of {index_name}..."):
+            index_stats = collect_index_stats(client, index_name)
+        
+        latency = index_stats['knn_latency_ms']
+        console.print(Panel.fit(
+            f"[bold]Index:[/bold] {index_stats['index']}\n"
+            f"Chunks: {index_stats['chunks']} in {index_stats['documents']} documents\n"
+            f"Average chunk length: {index_stats['avg_chunk_chars']:.0f} characters\n"
+            f"Vectors: {index_stats['dimension']} dimensions, "
+            f"{index_stats['method'].get('engine', '?')} {index_stats['method'].get('name', '?')}\n"
+            f"Graph memory: {format_bytes(index_stats['actual_graph_bytes'])} loaded, "
+            f"{format_bytes(index_stats['estimated_graph_bytes'])} estimated\n"
+            f"Segments: {index_stats['segments']}\n"
+            f"Query cache hit rate: {format_rate(index_stats['query_cache_hit_rate'])} | "
+            f"Request cache hit rate: {format_rate(index_stats['request_cache_hit_rate'])}\n"
+            f"kNN latency (p50): {f'{latency:.1f} ms' if latency is not None else 'n/a'}\n"
+            f"kNN circuit breaker limit (smallest node): {format_bytes(index_stats['circuit_breaker_bytes'])}",
+            title="Index Statistics",
+            border_style="cyan",
+        ))
+        
+        documents = sorted(index_stats['chunks_per_document'].items(), key=lambda item: -item[1])
+        table = Table(title=f"Chunks per Document (top {top_docs})", border_style="blue")
+        table.add_column("Document", style="cyan")
+        table.add_column("Chunks", justify="right", style="green")
+        for name, count in documents[:top_docs]:
+            table.add_row(name, str(count))
+        console.print(table)
+        
+        table = Table(title="Capacity Projection", border_style="magenta")
+        table.add_column("Growth", justify="right", style="cyan")
+        table.add_column("Chunks", justify="right")
+        table.add_column("Graph Memory", justify="right", style="green")
+        table.add_column("Breaker Limit Used", justify="right")
+        table.add_column("kNN Latency (p50)", justify="right")
+        for row in project_capacity(index_stats, growth_factors or CAPACITY_GROWTH_FACTORS):
+            share = row['breaker_share']
+            share_text = format_rate(share)
+            if share is not None and share >= 1:
+                share_text = f"[red]{share_text} (trips breaker)[/red]"
+            elif share is not None and share >= 0.8:
+                share_text = f"[yellow]{share_text}[/yellow]"
+            projected = row['knn_latency_ms']
+            table.add_row(
+                f"{row['factor']:g}×",
+                str(row['chunks']),
+                format_bytes(row['graph_bytes']),
+                share_text,
+                f"{projected:.1f} ms" if projected is not None else "n/a",
+            )
+        console.print(table)
         
     except Exception as e:
         console.print(f"[red]Error: {str(e)}[/red]")
 
+def format_bytes(size):
+    """Format a byte count for display."""
+    if size is None:
+        return "n/a"
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def format_rate(rate):
+    """Format a ratio as a percentage for display."""
+    return f"{rate:.1%}" if rate is not None else "n/a"
+
+def print_graph_memory(client):
+    """Print the kNN graph memory of each node from the k-NN stats API."""
+    from src.opensearch import get_knn_graph_memory
+    
+    table = Table(title="kNN Graph Memory", border_style="blue")
+    table.add_column("Node", style="cyan")
+    table.add_column("Graph Memory", justify="right", style="green")
+    table.add_column("Cache Used", justify="right")
+    table.add_column("Indices in Cache")
+    
+    for node, stats in get_knn_graph_memory(client).items():
+        cache_used = f"{stats['graph_memory_percent']:.1f}%"
+        if stats['cache_capacity_reached']:
+            cache_used = f"[red]{cache_used} (full)[/red]"
+        table.add_row(
+            node,
+            f"{stats['graph_memory_kb'] / 1024:.1f} MB",
+            cache_used,
+            ", ".join(f"{name} ({kb / 1024:.1f} MB)" for name, kb in stats['indices'].items()) or "-",
+        )
+    
+    console.print(table)
+
 @manage.command()
 def list_docs():
     """List all uploaded documents."""
@@ -2,44 +2,74 @@ import click
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
+import json
 import sys
+import time
 from pathlib import Path
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.opensearch import hybrid_search
-from src.embeddings import get_embedding_model
+from src.constants import MSEARCH_PAGE_SIZE, OPENSEARCH_INDEX
 
 console = Console()
 
 @click.command()
-@click.argument('query')
+@click.argument('query', required=False)
 @click.option('--top-k', default=5, help='Number of results')
-@click.option('--index-name', default='rag_index', help='OpenSearch index name')
-def search(query, top_k, index_name):
+@click.option('--index-name', default=OPENSEARCH_INDEX, help='OpenSearch index name')
+@click.option('--batch', 'batch_file', type=click.Path(exists=True, dir_okay=False),
+              help='File with one query per line to run as a batch')
+@click.option('--output', type=click.Path(dir_okay=False), default='results.jsonl',
+              help='JSONL file for batch results')
+@click.option('--page-size', default=MSEARCH_PAGE_SIZE, help='Queries per _msearch request')
+@click.option('--concurrency', default=1, help='Number of _msearch requests in flight')
+@click.option('--doc', 'docs', multiple=True, help='Only search this document (repeatable)')
+@click.option('--collection', 'collections', multiple=True, help='Only search this collection (repeatable)')
+@click.option('--tenant', 'tenants', multiple=True, help='Only search this tenant (repeatable)')
+def search(query, top_k, index_name, batch_file, output, page_size, concurrency,
+           docs, collections, tenants):
     """Search for documents using hybrid search."""
-    
+
+    filters = {
+        'document_name': list(docs),
+        'collection': list(collections),
+        'tenant': list(tenants),
+    }
+
+    if batch_file:
+        search_batch(batch_file, output, top_k, index_name, page_size, concurrency, filters)
+        return
+
+    if not query:
+        console.print("[red]Error: Provide a QUERY or --batch FILE[/red]")
+        raise click.Abort()
+
     console.print(Panel.fit(
         f"[bold]Query:[/bold] {query}\n"
-        f"[dim]Index: {index_name} | Top-K: {top_k}[/dim]",
+        f"[dim]Index: {index_name} | Top-K: {top_k} | Scope: {describe_filters(filters)}[/dim]",
         border_style="blue"
     ))
-    
+
     try:
+        # Imported here so `rag --help` does not load torch and opensearchpy
+        from src.embeddings import get_embedding_model
+        from src.opensearch import hybrid_search, warmup_search_index
+
         # Get embedding model
         with console.status("[bold green]Loading embedding model..."):
             model = get_embedding_model()
-        
+            warmup_search_index(index_name)
+
         # Perform hybrid search
         with console.status("[bold green]Searching..."):
-            results = hybrid_search(query, model, top_k, index_name)
-        
+            results = hybrid_search(query, top_k=top_k, index_name=index_name, filters=filters)
+
         if not results:
             console.print("[yellow]No results found[/yellow]")
             return
-        
+
         # Create results table
         table = Table(
             title=f"Search Results ({len(results)} found)",
@@ -51,25 +81,96 @@ def search(query, top_k, index_name):
         table.add_column("Score", justify="right", width=10)
         table.add_column("Source", style="green", width=30)
         table.add_column("Text Preview", width=80)
-        
+
         for idx, result in enumerate(results, 1):
             score = result.get('_score', 0)
             source = result.get('_source', {})
             text = source.get('text', 'N/A')
-            filename = source.get('metadata', {}).get('filename', 'Unknown')
-            
+            filename = source.get('document_name', 'Unknown')
+
             # Truncate text for display
             text_preview = text[:150] + "..." if len(text) > 150 else text
-            
+
             table.add_row(
                 str(idx),
                 f"{score:.4f}",
                 filename[:28],
                 text_preview
             )
-        
+
         console.print(table)
-        
+
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        import traceback
+        console.print(f"[dim]{traceback.format_exc()}[/dim]")
+        raise click.Abort()
+
+
+def describe_filters(filters):
+    """Format active search filters for display."""
+    return ", ".join(
+        f"{field}={','.join(values)}" for field, values in filters.items() if values
+    ) or "All documents"
+
+
+def search_batch(batch_file, output, top_k, index_name, page_size, concurrency, filters=None):
+    """Run every query in a file through hybrid_search_many and write JSONL results."""
+
+    with open(batch_file, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    if not queries:
+        console.print("[yellow]No queries found in batch file[/yellow]")
+        return
+
+    console.print(Panel.fit(
+        f"[bold]Batch:[/bold] {batch_file} ({len(queries)} queries)\n"
+        f"[dim]Index: {index_name} | Top-K: {top_k} | "
+        f"Page size: {page_size} | Concurrency: {concurrency}[/dim]",
+        border_style="blue"
+    ))
+
+    try:
+        from src.embeddings import get_embedding_model
+        from src.opensearch import hybrid_search_many, warmup_search_index
+
+        with console.status("[bold green]Loading embedding model..."):
+            get_embedding_model()
+            warmup_search_index(index_name)
+
+        start = time.perf_counter()
+        with console.status(f"[bold green]Searching {len(queries)} queries..."):
+            all_results = hybrid_search_many(
+                queries,
+                top_k=top_k,
+                index_name=index_name,
+                page_size=page_size,
+                concurrency=concurrency,
+                filters=filters,
+            )
+        elapsed = time.perf_counter() - start
+
+        with open(output, 'w', encoding='utf-8') as f:
+            for query, results in zip(queries, all_results):
+                record = {
+                    'query': query,
+                    'results': [
+                        {
+                            'rank': rank,
+                            'id': result.get('_id'),
+                            'score': result.get('_score'),
+                            'document_name': result.get('_source', {}).get('document_name'),
+                            'text': result.get('_source', {}).get('text'),
+                        }
+                        for rank, result in enumerate(results, 1)
+                    ],
+                }
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        console.print(f"[green]✓[/green] Wrote results for {len(queries)} queries to {output}")
+        console.print(f"[dim]{elapsed:.2f}s total, {len(queries) / elapsed:.1f} queries/s[/dim]")
+
     except Exception as e:
         console.print(f"[red]Error: {str(e)}[/red]")
         import traceback
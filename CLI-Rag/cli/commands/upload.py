@@ -1,9 +1,24 @@
 import click
 from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
+from rich.markup import escape
+from rich.progress import (
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    BarColumn,
+    MofNCompleteColumn,
+    TimeRemainingColumn,
+)
+from rich.table import Table
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+import glob
+import json
+import multiprocessing
+import os
 import sys
 import shutil
+import time
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent
@@ -11,12 +26,17 @@ sys.path.insert(0, str(project_root))
 
 console = Console()
 
+UPLOAD_DIR = project_root / 'uploaded_files'
+# Failures listed after the summary; the checkpoint file has all of them
+MAX_FAILURES_SHOWN = 20
+
 # Try to import constants, use defaults if not available
 try:
-    from src.constants import OPENSEARCH_HOST, OPENSEARCH_PORT
+    from src.constants import OPENSEARCH_HOST, OPENSEARCH_PORT, OPENSEARCH_INDEX
 except ImportError:
     OPENSEARCH_HOST = 'localhost'
     OPENSEARCH_PORT = 9200
+    OPENSEARCH_INDEX = 'documents'
 
 try:
     from src.constants import CHUNK_SIZE, CHUNK_OVERLAP
@@ -24,134 +44,271 @@ except ImportError:
     CHUNK_SIZE = 512
     CHUNK_OVERLAP = 50
 
+try:
+    from src.constants import UPLOAD_WORKERS, UPLOAD_EMBED_BATCH_SIZE, UPLOAD_CHECKPOINT_FILE
+except ImportError:
+    UPLOAD_WORKERS = 4
+    UPLOAD_EMBED_BATCH_SIZE = 64
+    UPLOAD_CHECKPOINT_FILE = '.upload_checkpoint.jsonl'
+
+
+def find_pdfs(targets):
+    """Expand files, directories (searched recursively) and glob patterns into PDF paths."""
+    found = []
+    seen = set()
+    for target in targets:
+        path = Path(target)
+        if path.is_dir():
+            candidates = sorted(p for p in path.rglob('*') if p.suffix.lower() == '.pdf' and p.is_file())
+        elif path.is_file():
+            if path.suffix.lower() != '.pdf':
+                console.print(f"[yellow]Skipping {target}: only PDF files are supported[/yellow]")
+                continue
+            candidates = [path]
+        else:
+            candidates = sorted(
+                Path(p) for p in glob.glob(target, recursive=True)
+                if p.lower().endswith('.pdf') and os.path.isfile(p)
+            )
+            if not candidates:
+                console.print(f"[yellow]No PDF files match {target}[/yellow]")
+        for candidate in candidates:
+            resolved = candidate.resolve()
+            if resolved not in seen:
+                seen.add(resolved)
+                found.append(candidate)
+    return found
+
+
+def file_key(path):
+    """Identify a version of a file by its absolute path, size and modification time."""
+    stat = path.stat()
+    return {'path': str(path.resolve()), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def load_checkpoint(checkpoint_path):
+    """Return {path: (size, mtime)} of the files an earlier run finished."""
+    done = {}
+    if not checkpoint_path.exists():
+        return done
+    with open(checkpoint_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if record.get('status') == 'done':
+                done[record['path']] = (record['size'], record['mtime'])
+            else:
+                done.pop(record['path'], None)
+    return done
+
+
+def extract_chunks(path, chunk_size, chunk_overlap):
+    """Copy a PDF to uploaded_files/, extract its text (with OCR) and chunk it. Runs in a worker process."""
+    from src.ocr import extract_text_from_pdf
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    dest_path = UPLOAD_DIR / path.name
+    if path.resolve() != dest_path.resolve():
+        shutil.copy2(path, dest_path)
+    text = extract_text_from_pdf(str(dest_path))
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    return text_splitter.split_text(text)
+
+
+def print_summary(stats, skipped, failures, elapsed, checkpoint_path):
+    """Print the throughput of the run and the files that failed."""
+    minutes = max(elapsed, 1e-9) / 60
+    table = Table(title='Upload Summary', show_header=False)
+    table.add_column('Metric', style='cyan')
+    table.add_column('Value', justify='right')
+    table.add_row('Files indexed', str(stats['files']))
+    table.add_row('Files skipped (checkpoint)', str(skipped))
+    table.add_row('Files failed', str(len(failures)))
+    table.add_row('Chunks indexed', str(stats['chunks']))
+    table.add_row('Elapsed', f"{elapsed:.1f}s")
+    table.add_row('Files/min', f"{stats['files'] / minutes:.1f}")
+    table.add_row('Chunks/sec', f"{stats['chunks'] / (minutes * 60):.1f}")
+    console.print(table)
+
+    for path, error in failures[:MAX_FAILURES_SHOWN]:
+        console.print(f"[red]✗[/red] {path}: {escape(error)}")
+    if len(failures) > MAX_FAILURES_SHOWN:
+        console.print(f"[dim]... and {len(failures) - MAX_FAILURES_SHOWN} more, see {checkpoint_path}[/dim]")
+    if failures:
+        console.print("[yellow]Run the same command again to retry the failed files.[/yellow]")
+
+
 @click.command()
-@click.argument('filepath', type=click.Path(exists=True))
-@click.option('--index-name', default='rag_index', help='OpenSearch index name')
-def upload(filepath, index_name):
-    """Upload and process a PDF document."""
-    
-    filepath = Path(filepath)
-    
-    if not filepath.suffix.lower() == '.pdf':
-        console.print("[red]Error: Only PDF files are supported[/red]")
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--index-name', default=OPENSEARCH_INDEX, help='OpenSearch index or alias to upload into')
+@click.option('--collection', default=None, help='Collection to file the documents under')
+@click.option('--tenant', default=None, help='Tenant that owns the documents')
+@click.option('--workers', default=UPLOAD_WORKERS, show_default=True, help='Processes extracting text from PDFs')
+@click.option('--batch-size', default=UPLOAD_EMBED_BATCH_SIZE, show_default=True, help='Chunks embedded together per model call')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), default=None, help=f'Checkpoint file (default: uploaded_files/{UPLOAD_CHECKPOINT_FILE})')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and process every file again')
+def upload(paths, index_name, collection, tenant, workers, batch_size, checkpoint, restart):
+    """Upload and process PDF documents: files, directories or glob patterns."""
+
+    files = find_pdfs(paths)
+    if not files:
+        console.print("[red]Error: No PDF files found[/red]")
         raise click.Abort()
-    
-    console.print(f"[bold blue]Processing document:[/bold blue] {filepath.name}\n")
-    
+
+    UPLOAD_DIR.mkdir(exist_ok=True)
+    checkpoint_path = Path(checkpoint) if checkpoint else UPLOAD_DIR / UPLOAD_CHECKPOINT_FILE
+    done = {} if restart else load_checkpoint(checkpoint_path)
+
+    # Documents are indexed under their file name, so two files may not share one
+    names = {}
+    pending = []
+    skipped = 0
+    failures = []
+    for path in files:
+        if path.name in names:
+            failures.append((path, f"same file name as {names[path.name]}"))
+            continue
+        names[path.name] = path
+        key = file_key(path)
+        if done.get(key['path']) == (key['size'], key['mtime']):
+            skipped += 1
+            continue
+        pending.append((path, key))
+
+    console.print(
+        f"[bold blue]Processing {len(pending)} document(s)[/bold blue] "
+        f"[dim]({skipped} already done according to {checkpoint_path})[/dim]\n"
+    )
+    stats = {'files': 0, 'chunks': 0}
+    if not pending:
+        print_summary(stats, skipped, failures, 0.0, checkpoint_path)
+        return
+
     try:
         # Import required functions
-        from src.ocr import extract_text_from_pdf
         from src.embeddings import get_embedding_model, generate_embeddings
         from src.ingestion import create_index, bulk_index_documents
         from opensearchpy import OpenSearch
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            console=console,
-            transient=False
-        ) as progress:
-            
-            # Step 1: Copy file to uploaded_files directory
-            task1 = progress.add_task("Copying file...", total=None)
-            upload_dir = project_root / "uploaded_files"
-            upload_dir.mkdir(exist_ok=True)
-            dest_path = upload_dir / filepath.name
-            shutil.copy2(filepath, dest_path)
-            progress.update(task1, completed=True)
-            console.print(f"[green]✓[/green] File copied to uploaded_files/")
-            
-            # Step 2: Extract text from PDF
-            task2 = progress.add_task("Extracting text from PDF...", total=None)
-            full_text = extract_text_from_pdf(str(dest_path))
-            progress.update(task2, completed=True)
-            console.print(f"[green]✓[/green] Extracted {len(full_text)} characters")
-            
-            # Step 3: Chunk the text
-            task3 = progress.add_task("Chunking text...", total=None)
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=CHUNK_SIZE,
-                chunk_overlap=CHUNK_OVERLAP,
-                length_function=len,
-            )
-            chunks = text_splitter.split_text(full_text)
-            progress.update(task3, completed=True)
-            console.print(f"[green]✓[/green] Created {len(chunks)} chunks")
-            
-            # Step 4: Load embedding model
-            task4 = progress.add_task("Loading embedding model...", total=None)
-            embedding_model = get_embedding_model()
-            progress.update(task4, completed=True)
-            console.print(f"[green]✓[/green] Embedding model loaded")
-            
-            # Step 5: Generate embeddings
-            task5 = progress.add_task("Generating embeddings...", total=None)
-            embeddings = generate_embeddings(chunks)
-            progress.update(task5, completed=True)
-            console.print(f"[green]✓[/green] Generated {len(embeddings)} embeddings")
-            
-            # Step 6: Prepare documents for indexing
-            task6 = progress.add_task("Preparing documents...", total=None)
-            documents = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                doc = {
-                    'text': chunk,
-                    'embedding': embedding.tolist(),
-                    'metadata': {
-                        'filename': filepath.name,
-                        'chunk_id': i,
-                        'total_chunks': len(chunks),
-                        'source': str(dest_path)
-                    }
-                }
-                documents.append(doc)
-            progress.update(task6, completed=True)
-            console.print(f"[green]✓[/green] Prepared {len(documents)} documents")
-            
-            # Step 7: Create OpenSearch client and index
-            task7 = progress.add_task("Creating index if needed...", total=None)
-            client = OpenSearch(
-                hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
-                http_compress=True,
-                use_ssl=False,
-                verify_certs=False,
-                ssl_assert_hostname=False,
-                ssl_show_warn=False,
-            )
-            
-            # Check if index exists, if not create it
-            if not client.indices.exists(index=index_name):
-                create_index(client)
-                console.print(f"[green]✓[/green] Created index: {index_name}")
-            else:
-                console.print(f"[green]✓[/green] Using existing index: {index_name}")
-            progress.update(task7, completed=True)
-            
-            # Step 8: Bulk index documents
-            task8 = progress.add_task(f"Indexing {len(documents)} documents...", total=None)
-            success_count, errors = bulk_index_documents(documents)
-            progress.update(task8, completed=True)
-            
-            if errors:
-                console.print(f"[yellow]⚠[/yellow] Indexed with some errors: {success_count}/{len(documents)} successful")
-                console.print(f"[dim]Errors: {len(errors)}[/dim]")
-            else:
-                console.print(f"[green]✓[/green] Successfully indexed all {success_count} documents")
-        
-        console.print(f"\n[bold green]✅ Upload Complete![/bold green]")
-        console.print(f"[cyan]Document:[/cyan] {filepath.name}")
-        console.print(f"[cyan]Index:[/cyan] {index_name}")
-        console.print(f"[cyan]Chunks:[/cyan] {len(chunks)}")
-        console.print(f"[cyan]Location:[/cyan] uploaded_files/{filepath.name}")
-        
+
+        client = OpenSearch(
+            hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
+            http_compress=True,
+            use_ssl=False,
+            verify_certs=False,
+            ssl_assert_hostname=False,
+            ssl_show_warn=False,
+        )
+        # Check if index exists, if not create it
+        if not client.indices.exists(index=index_name):
+            create_index(client, index_name)
+            console.print(f"[green]✓[/green] Created index: {index_name}")
+        else:
+            console.print(f"[green]✓[/green] Using existing index: {index_name}")
+        with console.status("Loading embedding model..."):
+            get_embedding_model()
+        console.print(f"[green]✓[/green] Embedding model loaded")
     except ImportError as e:
         console.print(f"[bold red]Import Error:[/bold red] {str(e)}")
         console.print("\n[yellow]Missing dependency. Please check your installation.[/yellow]")
         raise click.Abort()
     except Exception as e:
         console.print(f"\n[bold red]Error:[/bold red] {str(e)}")
-        import traceback
-        console.print(f"[dim]{traceback.format_exc()}[/dim]")
         raise click.Abort()
+
+    start = time.perf_counter()
+    with open(checkpoint_path, 'a') as checkpoint_file, Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeRemainingColumn(),
+        console=console,
+    ) as progress:
+        task = progress.add_task("Ingesting documents...", total=len(pending))
+
+        def record(path, key, chunks=0, error=None):
+            """Append the outcome of a file to the checkpoint."""
+            if error:
+                failures.append((path, error))
+            else:
+                stats['files'] += 1
+                stats['chunks'] += chunks
+            status = 'failed' if error else 'done'
+            checkpoint_file.write(json.dumps({**key, 'status': status, 'chunks': chunks, 'error': error}) + '\n')
+            checkpoint_file.flush()
+            progress.advance(task)
+
+        def index_ready(ready):
+            """Embed the chunks of the extracted files together, then index and checkpoint the files."""
+            try:
+                embeddings = generate_embeddings(
+                    [chunk for _, _, chunks in ready for chunk in chunks], batch_size=batch_size
+                )
+                documents = []
+                offset = 0
+                for path, _, chunks in ready:
+                    for i, chunk in enumerate(chunks):
+                        documents.append({
+                            'doc_id': f"{path.name}_{i}",
+                            'text': chunk,
+                            'embedding': embeddings[offset + i],
+                            'document_name': path.name,
+                            'collection': collection,
+                            'tenant': tenant,
+                        })
+                    offset += len(chunks)
+                _, errors = bulk_index_documents(documents, index_name=index_name)
+                error = f"{len(errors)} chunks failed to index" if errors else None
+            except Exception as e:
+                error = str(e)
+            for path, key, chunks in ready:
+                record(path, key, chunks=len(chunks), error=error)
+
+        # Extraction and OCR run in worker processes while this process embeds
+        # and indexes; at most two files per worker wait in memory
+        remaining = iter(pending)
+        in_flight = {}
+        ready = []
+        ready_chunks = 0
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            while True:
+                while len(in_flight) < workers * 2:
+                    item = next(remaining, None)
+                    if item is None:
+                        break
+                    in_flight[pool.submit(extract_chunks, item[0], CHUNK_SIZE, CHUNK_OVERLAP)] = item
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path, key = in_flight.pop(future)
+                    try:
+                        chunks = future.result()
+                    except Exception as e:
+                        record(path, key, error=f"{type(e).__name__}: {e}")
+                        continue
+                    if not chunks:
+                        record(path, key, error="no text could be extracted")
+                        continue
+                    ready.append((path, key, chunks))
+                    ready_chunks += len(chunks)
+                if ready and (ready_chunks >= batch_size or not in_flight):
+                    index_ready(ready)
+                    ready = []
+                    ready_chunks = 0
+        except KeyboardInterrupt:
+            for future in in_flight:
+                future.cancel()
+            progress.stop()
+            console.print("\n[yellow]Interrupted. Run the same command again to resume.[/yellow]")
+        finally:
+            pool.shutdown(wait=False)
+
+    print_summary(stats, skipped, failures, time.perf_counter() - start, checkpoint_path)
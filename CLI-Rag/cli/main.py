@@ -1,24 +1,42 @@
 import click
-from rich.console import Console     #Beautiful terminal outpput
-from cli.commands import upload, chat, search, manage
+import importlib
 
-console = Console()
+# Commands are imported when they are run, so `rag --help` and the light
+# commands do not pay for the dependencies of the heavy ones
+COMMANDS = {
+    'upload': 'cli.commands.upload:upload',
+    'chat': 'cli.commands.chat:chat',
+    'search': 'cli.commands.search:search',
+    'manage': 'cli.commands.manage:manage',
+}
 
-@click.group()
-@click.version_option(version='1.0.0')    #check version 
+
+class LazyGroup(click.Group):
+    """A click group that imports the module of a command only when it is used."""
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            module_name, attribute = self.lazy_commands[cmd_name].split(':')
+            self.add_command(getattr(importlib.import_module(module_name), attribute), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
+@click.version_option(version='1.0.0')    #check version
 def cli():
     """
     Local RAG System - CLI Version
-    
+
     A privacy-friendly document search and chat system.
     """
     pass
 
-# Register commands
-cli.add_command(upload.upload)
-cli.add_command(chat.chat)
-cli.add_command(search.search)
-cli.add_command(manage.manage)
-
 if __name__ == '__main__':
-    cli()
\ No newline at end of file
+    cli()
@@ -1,105 +1,224 @@
 import logging
-from typing import Dict, Iterable, List, Optional
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import ollama
-import streamlit as st
 
-from src.constants import ASSYMETRIC_EMBEDDING, OLLAMA_MODEL_NAME
-from src.embeddings import get_embedding_model
+from src.cache import SemanticAnswerCache, get_answer_cache, get_index_generation
+from src.constants import (
+    ANSWER_CACHE_ENABLED,
+    CONTEXT_ASSEMBLY_ENABLED,
+    MODEL_ROUTING_ENABLED,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_LARGE_MODEL_NAME,
+    OLLAMA_MODEL_NAME,
+    OLLAMA_NUM_CTX,
+    OPENSEARCH_INDEX,
+    RERANK_CANDIDATES,
+    RERANK_ENABLED,
+    RERANKER_MODEL_PATH,
+    ROUTE_MIN_RETRIEVAL_SCORE,
+    ROUTE_SHORT_QUERY_WORDS,
+)
+from src.context_assembly import assemble_context
+from src.context_packer import pack_context
+from src.embeddings import embed_query, get_embedding_model
+from src.generation import GenerationHandle
+from src.metrics import instrument_stream, record_chat_metrics, timed
+from src.model_readiness import get_model_readiness
 from src.opensearch import hybrid_search
+from src.rerank import rerank_hits
+from src.scheduler import SchedulerBusyError, get_generation_scheduler
 from src.utils import setup_logging
 
 # Initialize logger
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Identical on every turn, so Ollama can reuse the KV cache of the conversation prefix
+SYSTEM_PROMPT = (
+    "You are a knowledgeable chatbot assistant. When a question comes with "
+    "context, use the context to answer it. Otherwise answer questions to the "
+    "best of your knowledge."
+)
+CONTEXT_INSTRUCTION = "Use the following context to answer the question.\nContext:\n"
+
 
-@st.cache_resource(show_spinner=False)
 def ensure_model_pulled(model: str) -> bool:
     """
     Ensures that the specified model is pulled and available locally.
 
+    Availability is read from the cached list of pulled models, see
+    `ModelReadiness`, so this does not query Ollama on every start.
+
     Args:
         model (str): The name of the model to ensure is available.
 
     Returns:
         bool: True if the model is available or successfully pulled, False if an error occurs.
     """
-    try:
-        available_models = ollama.list()
-        if model not in available_models:
-            logger.info(f"Model {model} not found locally. Pulling the model...")
-            ollama.pull(model)
-            logger.info(f"Model {model} has been pulled and is now available locally.")
-        else:
-            logger.info(f"Model {model} is already available locally.")
-    except ollama.ResponseError as e:
-        logger.error(f"Error checking or pulling model: {e.error}")
-        return False
-    return True
+    return get_model_readiness().ensure_available(model)
+
+
+def chat_models() -> List[str]:
+    """
+    Returns the chat models queries can be routed to.
+
+    Returns:
+        List[str]: The default model, followed by the large model if routing
+            is enabled.
+    """
+    if MODEL_ROUTING_ENABLED:
+        return [OLLAMA_MODEL_NAME, OLLAMA_LARGE_MODEL_NAME]
+    return [OLLAMA_MODEL_NAME]
+
+
+def route_model(
+    query: str,
+    hits: Optional[List[Dict[str, Any]]] = None,
+    override: Optional[str] = None,
+) -> Tuple[str, str]:
+    """
+    Picks the chat model for a query from cheap signals, before any generation.
 
+    Long queries go to the large model. Short queries go to the small model,
+    unless retrieval found no convincing context: in RAG mode the best hybrid
+    search score must reach ROUTE_MIN_RETRIEVAL_SCORE. Hybrid scores are min-max
+    normalized per query, so a high best score means that BM25 and kNN agree on
+    the best passage.
 
-def run_llama_streaming(prompt: str, temperature: float) -> Optional[Iterable[str]]: 
+    Args:
+        query (str): The user's query.
+        hits (Optional[List[Dict[str, Any]]]): Hybrid search hits, or None
+            outside of RAG mode.
+        override (Optional[str]): Model chosen by the user, used as is.
+
+    Returns:
+        Tuple[str, str]: The model and the reason it was chosen.
+    """
+    if override:
+        return override, "user override"
+    if not MODEL_ROUTING_ENABLED:
+        return OLLAMA_MODEL_NAME, "routing disabled"
+    if len(query.split()) > ROUTE_SHORT_QUERY_WORDS:
+        return OLLAMA_LARGE_MODEL_NAME, "long query"
+    if hits is None:
+        return OLLAMA_MODEL_NAME, "short query"
+    if not hits:
+        return OLLAMA_LARGE_MODEL_NAME, "no context"
+    if max(hit.get("_score") or 0.0 for hit in hits) < ROUTE_MIN_RETRIEVAL_SCORE:
+        return OLLAMA_LARGE_MODEL_NAME, "weak retrieval"
+    return OLLAMA_MODEL_NAME, "confident retrieval"
+
+
+def run_llama_streaming(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    model: str = OLLAMA_MODEL_NAME,
+) -> Optional[GenerationHandle]:
     """
     Uses Ollama's Python library to run the LLaMA model with streaming enabled.
 
+    Each response gets its own client, so cancelling the handle can close its
+    connection and stop the generation on the server.
+
     Args:
-        prompt (str): The prompt to send to the model.
+        messages (List[Dict[str, str]]): The chat messages to send to the model.
         temperature (float): The response generation temperature.
+        model (str, optional): The Ollama model to run.
 
     Returns:
-        Optional[Iterable[str]]: A generator yielding response chunks as strings, or None if an error occurs.
+        Optional[GenerationHandle]: A cancellable handle yielding response chunks, or None if an error occurs.
     """
 
     try:
         # Now attempt to stream the response from the model
-        logger.info("Streaming response from LLaMA model.")
-        stream = ollama.chat(
-            model=OLLAMA_MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}],
+        logger.info(f"Streaming response from {model}.")
+        client = ollama.Client()
+        stream = client.chat(
+            model=model,
+            messages=messages,
             stream=True,
-            options={"temperature": temperature},
+            options={"temperature": temperature, "num_ctx": OLLAMA_NUM_CTX},
+            keep_alive=OLLAMA_KEEP_ALIVE,
         )
     except ollama.ResponseError as e:
         logger.error(f"Error during streaming: {e.error}")
         return None
 
-    return stream
+    return GenerationHandle(stream, client)
 
 
-def prompt_template(query: str, context: str, history: List[Dict[str, str]]) -> str:
+def build_chat_messages(
+    query: str, context: str, history: List[Dict[str, str]]
+) -> List[Dict[str, str]]:
     """
-    Builds the prompt with context, conversation history, and user query.
+    Builds the chat messages with conversation history, context, and user query.
+
+    The system message and prior turns come first and do not change between
+    turns, so Ollama can reuse their KV cache. The retrieved context changes
+    every turn and is placed in the last message.
 
     Args:
         query (str): The user's query.
         context (str): Context text gathered from hybrid search.
-        history (List[Dict[str, str]]): Conversation history to include in the prompt.
+        history (List[Dict[str, str]]): Prior turns of the conversation, oldest first.
 
     Returns:
-        str: Constructed prompt for Ollama model.
+        List[Dict[str, str]]: Messages for Ollama's chat endpoint.
     """
-    prompt = "You are a knowledgeable chatbot assistant. "
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    messages.extend({"role": msg["role"], "content": msg["content"]} for msg in history)
     if context:
-        prompt += (
-            "Use the following context to answer the question.\nContext:\n"
-            + context
-            + "\n"
-        )
+        content = f"{CONTEXT_INSTRUCTION}{context}\nQuestion: {query}"
     else:
-        prompt += "Answer questions to the best of your knowledge.\n"
+        content = query
+    messages.append({"role": "user", "content": content})
+    logger.info("Chat messages constructed with context and conversation history.")
+    return messages
+
+
+def stream_cached_answer(answer: str) -> Iterator[Dict[str, Any]]:
+    """
+    Replays a cached answer in the chunk format of Ollama's streaming chat.
 
-    if history:
-        prompt += "Conversation History:\n"
-        for msg in history:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            content = msg["content"]
-            prompt += f"{role}: {content}\n"
-        prompt += "\n"
+    Args:
+        answer (str): The cached answer.
+
+    Yields:
+        Dict[str, Any]: A single chunk holding the whole answer.
+    """
+    yield {"message": {"role": "assistant", "content": answer}, "done": True}
+
+
+def cache_answer_on_completion(
+    stream: Iterable[Any],
+    cache: SemanticAnswerCache,
+    query_embedding: List[float],
+    scope: str,
+    generation: int,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Passes a response stream through and caches the answer once it is complete.
+
+    An answer whose stream is abandoned or fails is not cached.
 
-    prompt += f"User: {query}\nAssistant:"
-    logger.info("Prompt constructed with context and conversation history.")
-    return prompt
+    Args:
+        stream (Iterable[Any]): Ollama's streaming chat response.
+        cache (SemanticAnswerCache): Cache to store the answer in.
+        query_embedding (List[float]): Embedding of the query.
+        scope (str): Retrieval scope of the answer.
+        generation (int): Index generation the answer is grounded on.
+
+    Yields:
+        Dict[str, Any]: The chunks of the response stream.
+    """
+    answer = ""
+    for chunk in stream:
+        answer += chunk["message"]["content"]
+        yield chunk
+    if answer:
+        cache.put(query_embedding, scope, generation, answer)
 
 
 def generate_response_streaming(
@@ -108,44 +227,192 @@ def generate_response_streaming(
     num_results: int,
     temperature: float,
     chat_history: Optional[List[Dict[str, str]]] = None,
-) -> Optional[Iterable[str]]:
+    filters: Optional[Dict[str, List[str]]] = None,
+    index_name: str = OPENSEARCH_INDEX,
+    report: Optional[Dict[str, Any]] = None,
+    rerank: bool = RERANK_ENABLED,
+    session_id: str = "default",
+    on_queue_position: Optional[Callable[[int], None]] = None,
+    model: Optional[str] = None,
+) -> Optional[GenerationHandle]:
     """
     Generates a chatbot response by performing hybrid search and incorporating conversation history.
 
+    History and retrieved chunks are packed into the prompt token budget, so
+    long chunks are truncated or dropped, lowest ranked first, instead of
+    overflowing the model's context window.
+
+    In RAG mode, a question asked without conversation history is first looked
+    up in the semantic answer cache. On a hit, the cached answer is streamed back
+    without retrieval or generation.
+
+    Overlapping or adjacent chunks of a document are merged and near-duplicate
+    passages are dropped before packing, see `assemble_context`.
+
+    With reranking, RERANK_CANDIDATES hits are retrieved and a cross-encoder
+    keeps the `num_results` most relevant ones, so fewer but better chunks are
+    prefilled by the model.
+
+    The model is chosen per query by `route_model` unless `model` is given.
+
+    Generations are admitted by the process-wide `GenerationScheduler`, which
+    limits how many run at once and serves waiting sessions in turn. A request
+    that is not admitted in time returns None with the reason in `report`.
+
     Args:
         query (str): The user's query.
         use_hybrid_search (bool): Whether to use hybrid search for context.
         num_results (int): The number of search results to include in the context.
         temperature (float): The temperature for the response generation.
-        chat_history (Optional[List[Dict[str, str]]]): List of chat history messages.
+        chat_history (Optional[List[Dict[str, str]]]): Prior messages of the
+            conversation, not including the current query, as returned by
+            `ConversationHistory.prompt_messages`.
+        filters (Optional[Dict[str, List[str]]]): Restricts retrieval to matching
+            document names, collections or tenants.
+        index_name (str): Index to retrieve context from.
+        report (Optional[Dict[str, Any]]): When given, filled with the prompt's
+            token usage against its budget, see `pack_context`, and with
+            'answer_cache' set to "hit", "miss" or "bypass", and the rerank
+            statistics of `rerank_hits` and `assemble_context`, and the chosen
+            'model' and its 'route'. Its 'timings' hold the duration of each
+            stage and Ollama's counters, complete once the stream is exhausted.
+        rerank (bool, optional): Rerank over-fetched hits with a cross-encoder.
+        session_id (str, optional): Session the request is queued under.
+        on_queue_position (Optional[Callable[[int], None]]): Called with the
+            number of requests ahead while waiting for the model.
+        model (Optional[str]): Ollama model to answer with, overriding routing.
 
     Returns:
-        Optional[Iterable[str]]: A generator yielding response chunks as strings, or None if an error occurs.
+        Optional[GenerationHandle]: A cancellable handle yielding response chunks, or None if an error occurs.
     """
-    chat_history = chat_history or []
-    max_history_messages = 10
-    history = chat_history[-max_history_messages:]
-    context = ""
+    start = time.perf_counter()
+    timings: Dict[str, Any] = {"rag": use_hybrid_search}
+    if report is not None:
+        report["timings"] = timings
+    history = chat_history or []
+    chunks: List[str] = []
 
-    # Include hybrid search results if enabled
+    # The model the query is routed to, or `model` when it is given
+    chosen_model: str
+    query_embedding: Optional[List[float]] = None
     if use_hybrid_search:
+        with timed(timings, "embed"):
+            query_embedding = embed_query(query)
+
+    # Answers depending on history or on the model alone are not cached
+    answer_cache: Optional[SemanticAnswerCache] = None
+    scope, generation = "", 0
+    if ANSWER_CACHE_ENABLED and query_embedding is not None and not history:
+        with timed(timings, "answer_cache"):
+            answer_cache = get_answer_cache()
+            scope = answer_cache.make_scope(
+                index_name,
+                num_results,
+                filters,
+                model or "+".join(chat_models()),
+                RERANKER_MODEL_PATH if rerank else None,
+            )
+            generation = get_index_generation(index_name)
+            cached_answer = answer_cache.get(query_embedding, scope, generation)
+        timings["answer_cache"] = "miss" if cached_answer is None else "hit"
+        if report is not None:
+            report["answer_cache"] = timings["answer_cache"]
+            report.update(answer_cache.stats())
+        if cached_answer is not None:
+            timings["route"] = "answer cache"
+            timings["total_ms"] = (time.perf_counter() - start) * 1000
+            record_chat_metrics(timings)
+            return GenerationHandle(stream_cached_answer(cached_answer))
+    elif report is not None:
+        report["answer_cache"] = "bypass"
+
+    # Include hybrid search results if enabled
+    search_results: Optional[List[Dict[str, Any]]] = None
+    if query_embedding is not None:
         logger.info("Performing hybrid search.")
-        if ASSYMETRIC_EMBEDDING:
-            prefixed_query = f"passage: {query}"
-        else:
-            prefixed_query = f"{query}"
-        embedding_model = get_embedding_model()
-        query_embedding = embedding_model.encode(
-            prefixed_query
-        ).tolist()  # Convert tensor to list of floats
-        search_results = hybrid_search(query, query_embedding, top_k=num_results)
+        with timed(timings, "search"):
+            search_results = hybrid_search(
+                query,
+                query_embedding,
+                top_k=max(num_results, RERANK_CANDIDATES) if rerank else num_results,
+                index_name=index_name,
+                filters=filters,
+                # Lets context assembly reuse the chunks' embeddings
+                with_embeddings=CONTEXT_ASSEMBLY_ENABLED,
+            )
         logger.info("Hybrid search completed.")
+        if search_results:
+            timings["retrieval_score"] = max(
+                hit.get("_score") or 0.0 for hit in search_results
+            )
+        chosen_model, timings["route"] = route_model(query, search_results, model)
+        if rerank:
+            with timed(timings, "rerank"):
+                search_results = rerank_hits(
+                    query, search_results, num_results, report
+                )
+
+        # Collect text from search results, merging overlapping chunks
+        with timed(timings, "assemble"):
+            if CONTEXT_ASSEMBLY_ENABLED:
+                passages = assemble_context(query_embedding, search_results, report)
+            else:
+                passages = [result["_source"]["text"] for result in search_results]
+        for i, passage in enumerate(passages):
+            chunks.append(f"Document {i}:\n{passage}\n\n")
 
-        # Collect text from search results
-        for i, result in enumerate(search_results):
-            context += f"Document {i}:\n{result['_source']['text']}\n\n"
+    if search_results is None:
+        chosen_model, timings["route"] = route_model(query, None, model)
+    timings["model"] = chosen_model
+    if report is not None:
+        report["model"] = chosen_model
+        report["route"] = timings["route"]
 
-    # Generate prompt using the prompt_template function
-    prompt = prompt_template(query, context, history)
+    # Fit history and context into the token budget around the fixed prompt text
+    with timed(timings, "pack"):
+        fixed_text = f"{SYSTEM_PROMPT}{CONTEXT_INSTRUCTION}\nQuestion: {query}"
+        history, chunks, packing_report = pack_context(fixed_text, history, chunks)
+        messages = build_chat_messages(query, "".join(chunks), history)
+    if report is not None:
+        report.update(packing_report)
 
-    return run_llama_streaming(prompt, temperature)
+    # A model still being pulled or loaded at startup is waited for here
+    readiness = get_model_readiness()
+    if readiness.status(chosen_model) in ("pulling", "loading"):
+        with timed(timings, "warmup"):
+            readiness.wait(chosen_model)
+
+    scheduler = get_generation_scheduler()
+    timings["queue_depth"] = scheduler.queue_depth()
+    try:
+        timings["queue_ms"] = scheduler.acquire(session_id, on_queue_position)
+    except SchedulerBusyError as e:
+        logger.warning(f"Request of session {session_id} was not admitted: {e}")
+        if report is not None:
+            report["error"] = str(e)
+        timings["rejected"] = True
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        record_chat_metrics(timings)
+        return None
+
+    try:
+        handle = run_llama_streaming(messages, temperature, chosen_model)
+    except BaseException:
+        scheduler.release()
+        raise
+    if handle is None:
+        scheduler.release()
+        return None
+    # Released when the handle finishes, is cancelled or is garbage collected
+    handle.add_done_callback(scheduler.release)
+    handle.wrap(
+        lambda stream: instrument_stream(stream, timings, start, record_chat_metrics)
+    )
+    if answer_cache is not None and query_embedding is not None:
+        cache = answer_cache
+        handle.wrap(
+            lambda stream: cache_answer_on_completion(
+                stream, cache, query_embedding, scope, generation
+            )
+        )
+    return handle
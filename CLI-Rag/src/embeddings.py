@@ -1,41 +1,92 @@
 import logging
-from typing import Any, List
+from typing import TYPE_CHECKING, Any, List, Optional
 
 import numpy as np
 import streamlit as st
-from sentence_transformers import SentenceTransformer
 
-from src.constants import EMBEDDING_MODEL_PATH
+from src.constants import ASSYMETRIC_EMBEDDING, EMBEDDING_MODEL_PATH
 from src.utils import setup_logging
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
 # Initialize logger
 setup_logging()  # Configures logging for the application
 logger = logging.getLogger(__name__)
 
 
 @st.cache_resource(show_spinner=False)
-def get_embedding_model() -> SentenceTransformer:
+def get_embedding_model() -> "SentenceTransformer":
     """
-    Loads and caches the embedding model.
+    Loads and caches the embedding model. sentence_transformers (and torch)
+    is only imported here, so importing this module stays cheap.
 
     Returns:
         SentenceTransformer: The loaded embedding model.
     """
+    from sentence_transformers import SentenceTransformer
+
     logger.info(f"Loading embedding model from path: {EMBEDDING_MODEL_PATH}")
     return SentenceTransformer(EMBEDDING_MODEL_PATH)
 
 
-def generate_embeddings(chunks: List[str]) -> List[np.ndarray[Any, Any]]:
+def generate_embeddings(
+    chunks: List[str], batch_size: Optional[int] = None
+) -> List[np.ndarray[Any, Any]]:
     """
     Generates embeddings for a list of text chunks.
 
     Args:
         chunks (List[str]): List of text chunks.
+        batch_size (Optional[int]): Number of chunks encoded per forward pass of
+            the model. Defaults to encoding the chunks one at a time.
 
     Returns:
         List[np.ndarray[Any, Any]]: List of embeddings as numpy arrays for each chunk.
     """
     model = get_embedding_model()
-    embeddings = [np.array(model.encode(chunk)) for chunk in chunks]
+    if batch_size and chunks:
+        embeddings = list(model.encode(chunks, batch_size=batch_size))
+    else:
+        embeddings = [np.array(model.encode(chunk)) for chunk in chunks]
     logger.info(f"Generated embeddings for {len(chunks)} text chunks.")
     return embeddings
+
+
+def embed_query(query: str) -> List[float]:
+    """
+    Generates the embedding of a search query.
+
+    Args:
+        query (str): The query text.
+
+    Returns:
+        List[float]: The query embedding as a list of floats.
+    """
+    if ASSYMETRIC_EMBEDDING:
+        prefixed_query = f"passage: {query}"
+    else:
+        prefixed_query = f"{query}"
+    model = get_embedding_model()
+    embedding: List[float] = model.encode(prefixed_query).tolist()
+    return embedding
+
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """
+    Generates the embeddings of many search queries in a single batch.
+
+    Args:
+        queries (List[str]): The query texts.
+
+    Returns:
+        List[List[float]]: One embedding per query, in input order.
+    """
+    if ASSYMETRIC_EMBEDDING:
+        prefixed_queries = [f"passage: {query}" for query in queries]
+    else:
+        prefixed_queries = list(queries)
+    model = get_embedding_model()
+    embeddings: List[List[float]] = model.encode(prefixed_queries).tolist()
+    logger.info(f"Generated embeddings for {len(queries)} queries.")
+    return embeddings
@@ -0,0 +1,201 @@
+import logging
+import threading
+import weakref
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import ollama
+
+from src.utils import setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_stats = {"completed": 0, "cancelled": 0, "completed_tokens": 0, "tokens_saved": 0}
+
+
+def get_generation_stats() -> Dict[str, Any]:
+    """
+    Returns counters of completed and cancelled generations in this process.
+
+    Tokens saved by a cancellation are estimated as the average length of the
+    completed answers minus the tokens generated before the cancellation.
+
+    Returns:
+        Dict[str, Any]: Completed and cancelled generations, the average answer
+            length in tokens and the estimated tokens saved.
+    """
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    completed = stats.pop("completed_tokens")
+    stats["average_tokens"] = (
+        completed / stats["completed"] if stats["completed"] else 0.0
+    )
+    return stats
+
+
+class GenerationHandle:
+    """
+    A streaming chat response that can be cancelled, also from another thread.
+
+    Iterating the handle yields the response chunks. Cancelling it closes the
+    HTTP stream to Ollama, which makes the server stop decoding, so an abandoned
+    answer no longer occupies the model. A handle whose iteration stops before
+    the answer is complete is cancelled as well, and a handle that is garbage
+    collected without being exhausted, e.g. never iterated because a Streamlit
+    rerun interrupted the page, closes its client and runs its done callbacks.
+    """
+
+    def __init__(
+        self, stream: Iterable[Any], client: Optional[ollama.Client] = None
+    ) -> None:
+        """
+        Args:
+            stream (Iterable[Any]): The streaming chat response.
+            client (Optional[ollama.Client]): Client dedicated to this response;
+                closing it aborts a read blocked in another thread.
+        """
+        self._raw = stream
+        self._stream = stream
+        self._client = client
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._done_callbacks: List[Callable[[], None]] = []
+        self.output_tokens = 0
+        self.finished = False
+        # Must not reference the handle, or it would never be collected
+        self._finalizer = weakref.finalize(
+            self, _release_abandoned, self._lock, self._done_callbacks, client
+        )
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the generation was cancelled before it finished."""
+        return self._cancelled.is_set()
+
+    def wrap(
+        self, wrapper: Callable[[Iterable[Any]], Iterable[Any]]
+    ) -> "GenerationHandle":
+        """
+        Applies a pass-through wrapper to the chunk stream, keeping the handle.
+
+        Args:
+            wrapper (Callable[[Iterable[Any]], Iterable[Any]]): Takes the current
+                stream and returns a stream of the same chunks.
+
+        Returns:
+            GenerationHandle: This handle.
+        """
+        self._stream = wrapper(self._stream)
+        return self
+
+    def add_done_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a callback run once the generation finished or was cancelled.
+
+        Args:
+            callback (Callable[[], None]): Called without arguments, e.g. to
+                release the model for the next request.
+        """
+        self._done_callbacks.append(callback)
+
+    def _run_done_callbacks(self) -> None:
+        _run_callbacks(self._lock, self._done_callbacks)
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            for chunk in self._stream:
+                if self._cancelled.is_set():
+                    break
+                if chunk["message"]["content"]:
+                    self.output_tokens += 1
+                yield chunk
+            else:
+                self._finish()
+        except Exception:
+            # Closing the client from another thread breaks the pending read
+            if not self._cancelled.is_set():
+                raise
+        finally:
+            self.cancel()
+            self._close_client()
+            self._run_done_callbacks()
+
+    def _finish(self) -> None:
+        with self._lock:
+            self.finished = True
+        if self._client is None:
+            # Replayed answers did not occupy the model
+            return
+        with _stats_lock:
+            _stats["completed"] += 1
+            _stats["completed_tokens"] += self.output_tokens
+
+    def cancel(self) -> None:
+        """
+        Stops the generation. Does nothing once it finished or was cancelled.
+        """
+        with self._lock:
+            if self.finished or self._cancelled.is_set():
+                return
+            self._cancelled.set()
+        if self._client is None:
+            self._run_done_callbacks()
+            return
+
+        with _stats_lock:
+            average = (
+                _stats["completed_tokens"] / _stats["completed"]
+                if _stats["completed"]
+                else 0
+            )
+            saved = max(0, round(average) - self.output_tokens)
+            _stats["cancelled"] += 1
+            _stats["tokens_saved"] += saved
+        logger.info(
+            f"Generation cancelled after {self.output_tokens} tokens "
+            f"(~{saved} tokens saved)."
+        )
+
+        close = getattr(self._raw, "close", None)
+        try:
+            if close is not None:
+                close()
+        except ValueError:
+            # The stream is being read in another thread; abort its connection
+            pass
+        self._close_client()
+        self._run_done_callbacks()
+
+    def _close_client(self) -> None:
+        _close_client(self._client)
+
+
+def _run_callbacks(lock: threading.Lock, callbacks: List[Callable[[], None]]) -> None:
+    # The list is emptied in place, as the finalizer of the handle shares it
+    with lock:
+        pending = list(callbacks)
+        callbacks.clear()
+    for callback in pending:
+        callback()
+
+
+def _close_client(client: Optional[ollama.Client]) -> None:
+    http_client = getattr(client, "_client", None)
+    if http_client is not None:
+        http_client.close()
+
+
+def _release_abandoned(
+    lock: threading.Lock,
+    callbacks: List[Callable[[], None]],
+    client: Optional[ollama.Client],
+) -> None:
+    """Finalizer of a GenerationHandle: stops the stream and frees its resources."""
+    with lock:
+        abandoned = bool(callbacks)
+    if abandoned:
+        logger.info("Generation handle dropped before it finished; releasing it.")
+    _close_client(client)
+    _run_callbacks(lock, callbacks)
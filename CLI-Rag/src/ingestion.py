@@ -1,10 +1,24 @@
 import json
 import logging
-from typing import Any, Dict, List, Tuple
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from opensearchpy import OpenSearch, helpers
 
-from src.constants import ASSYMETRIC_EMBEDDING, EMBEDDING_DIMENSION, OPENSEARCH_INDEX
+from src.cache import bump_index_generation
+from src.constants import (
+    ASSYMETRIC_EMBEDDING,
+    DELETE_REQUESTS_PER_SECOND,
+    DELETE_SLICES,
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL_PATH,
+    OPENSEARCH_INDEX,
+    RETRIEVAL_BACKEND,
+    TEXT_CHUNK_OVERLAP,
+    TEXT_CHUNK_SIZE,
+)
+from src.local_store import get_local_store
 from src.opensearch import get_opensearch_client
 from src.utils import setup_logging
 
@@ -25,51 +39,167 @@ def load_index_config() -> Dict[str, Any]:
 
     # Replace the placeholder with the actual embedding dimension
     config["mappings"]["properties"]["embedding"]["dimension"] = EMBEDDING_DIMENSION
+    # Record how the index is built so a reindex can tell what changed
+    config["mappings"]["_meta"] = get_index_meta()
     logger.info("Index configuration loaded from src/index_config.json.")
     return config if isinstance(config, dict) else {}
 
 
-def create_index(client: OpenSearch) -> None:
+def get_index_meta() -> Dict[str, Any]:
+    """
+    Returns the settings that determine the contents of an index built now.
+
+    Returns:
+        Dict[str, Any]: Embedding model, dimension and chunking settings.
+    """
+    return {
+        "embedding_model": EMBEDDING_MODEL_PATH,
+        "embedding_dimension": EMBEDDING_DIMENSION,
+        "asymmetric_embedding": ASSYMETRIC_EMBEDDING,
+        "text_chunk_size": TEXT_CHUNK_SIZE,
+        "text_chunk_overlap": TEXT_CHUNK_OVERLAP,
+    }
+
+
+def versioned_index_name(version: int, alias: str = OPENSEARCH_INDEX) -> str:
+    """
+    Returns the name of a version of the documents index, e.g. "documents_v3".
+
+    Args:
+        version (int): Version number.
+        alias (str, optional): Alias the version sits behind. Defaults to OPENSEARCH_INDEX.
+
+    Returns:
+        str: Name of the concrete index behind the alias.
+    """
+    return f"{alias}_v{version}"
+
+
+def get_index_versions(client: OpenSearch, alias: str = OPENSEARCH_INDEX) -> List[int]:
+    """
+    Lists the version numbers of the existing documents_vN indexes.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        alias (str, optional): Alias the versions sit behind. Defaults to OPENSEARCH_INDEX.
+
+    Returns:
+        List[int]: Sorted version numbers.
+    """
+    prefix = f"{alias}_v"
+    indices = client.indices.get(index=f"{prefix}*")
+    return sorted(
+        int(name[len(prefix) :])
+        for name in indices
+        if name[len(prefix) :].isdigit()
+    )
+
+
+def get_live_index(client: OpenSearch) -> Optional[str]:
+    """
+    Resolves the concrete index that searches against OPENSEARCH_INDEX hit.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+
+    Returns:
+        Optional[str]: The index the alias points at, OPENSEARCH_INDEX itself for
+            an unversioned index created before aliases were used, or None.
+    """
+    if client.indices.exists_alias(name=OPENSEARCH_INDEX):
+        live_index: str = next(iter(client.indices.get_alias(name=OPENSEARCH_INDEX)))
+        return live_index
+    if client.indices.exists(index=OPENSEARCH_INDEX):
+        return OPENSEARCH_INDEX
+    return None
+
+
+def create_index(client: OpenSearch, alias: str = OPENSEARCH_INDEX) -> None:
     """
     Creates an index in OpenSearch using settings and mappings from the configuration file.
 
+    The index is created as the next documents_vN version together with the
+    alias that all reads and writes go through.
+
     Args:
         client (OpenSearch): OpenSearch client instance.
+        alias (str, optional): Alias to create the index behind. Defaults to OPENSEARCH_INDEX.
     """
+    if RETRIEVAL_BACKEND == "local":
+        get_local_store(alias)
+        return
     index_body = load_index_config()
-    if not client.indices.exists(index=OPENSEARCH_INDEX):
-        response = client.indices.create(index=OPENSEARCH_INDEX, body=index_body)
-        logger.info(f"Created index {OPENSEARCH_INDEX}: {response}")
+    if not client.indices.exists(index=alias):
+        next_version = max(get_index_versions(client, alias), default=0) + 1
+        index_name = versioned_index_name(next_version, alias)
+        index_body["aliases"] = {alias: {}}
+        response = client.indices.create(index=index_name, body=index_body)
+        bump_index_generation(alias)
+        logger.info(f"Created index {index_name} as {alias}: {response}")
     else:
-        logger.info(f"Index {OPENSEARCH_INDEX} already exists.")
+        logger.info(f"Index {alias} already exists.")
 
 
 def delete_index(client: OpenSearch) -> None:
     """
-    Deletes the index in OpenSearch if it exists.
+    Deletes the live index in OpenSearch if it exists.
+
+    Older versions kept for rollback are left alone; see `gc_index_versions`.
 
     Args:
         client (OpenSearch): OpenSearch client instance.
     """
-    if client.indices.exists(index=OPENSEARCH_INDEX):
-        response = client.indices.delete(index=OPENSEARCH_INDEX)
-        logger.info(f"Deleted index {OPENSEARCH_INDEX}: {response}")
+    if RETRIEVAL_BACKEND == "local":
+        get_local_store(OPENSEARCH_INDEX).clear()
+        bump_index_generation(OPENSEARCH_INDEX)
+        return
+    live_index = get_live_index(client)
+    if live_index is not None:
+        response = client.indices.delete(index=live_index)
+        bump_index_generation(OPENSEARCH_INDEX)
+        logger.info(f"Deleted index {live_index}: {response}")
     else:
         logger.info(f"Index {OPENSEARCH_INDEX} does not exist.")
 
 
-def bulk_index_documents(documents: List[Dict[str, Any]]) -> Tuple[int, List[Any]]:
+def bulk_index_documents(
+    documents: List[Dict[str, Any]],
+    index_name: str = OPENSEARCH_INDEX,
+    thread_count: int = 1,
+    refresh: bool = True,
+) -> Tuple[int, List[Any]]:
     """
     Indexes multiple documents into OpenSearch in bulk.
 
+    The index is refreshed before its search cache generation is bumped, so the
+    documents are visible to every search that is cached under the new one.
+
     Args:
-        documents (List[Dict[str, Any]]): List of document dictionaries with 'doc_id', 'text', 'embedding', and 'document_name'.
+        documents (List[Dict[str, Any]]): List of document dictionaries with 'doc_id', 'text', 'embedding', and 'document_name',
+            and optionally 'collection' and 'tenant' for filtered retrieval, and 'indexed_at'
+            in epoch milliseconds (defaults to now).
+        index_name (str, optional): Index or alias to write to. Defaults to OPENSEARCH_INDEX.
+        thread_count (int, optional): Number of threads sending bulk requests. Defaults to 1.
+        refresh (bool, optional): Refresh the index and bump its generation. Loaders
+            that pause refreshes pass False and do both once they are done.
 
     Returns:
         Tuple[int, List[Any]]: Tuple with the number of successfully indexed documents and a list of any errors.
     """
+    if RETRIEVAL_BACKEND == "local":
+        # Prefix each document's text with "passage: " for the asymmetric embedding model
+        if ASSYMETRIC_EMBEDDING:
+            documents = [
+                {**doc, "text": f"passage: {doc['text']}"} for doc in documents
+            ]
+        success, errors = get_local_store(index_name).index_documents(documents)
+        bump_index_generation(index_name)
+        return success, errors
+
     actions = []
     client = get_opensearch_client()
+    # Lets a reindex find the documents written while it was building
+    indexed_at = int(time.time() * 1000)
 
     for doc in documents:
         doc_id = doc["doc_id"]
@@ -83,7 +213,7 @@ def bulk_index_documents(documents: List[Dict[str, Any]]) -> Tuple[int, List[Any
             prefixed_text = f"{doc['text']}"
 
         action = {
-            "_index": OPENSEARCH_INDEX,
+            "_index": index_name,
             "_id": doc_id,
             "_source": {
                 "text": prefixed_text,
@@ -91,12 +221,33 @@ def bulk_index_documents(documents: List[Dict[str, Any]]) -> Tuple[int, List[Any
                 "document_name": document_name,
             },
         }
+        # Optional keyword fields used to scope retrieval to a collection or tenant
+        for field in ("collection", "tenant"):
+            if doc.get(field):
+                action["_source"][field] = doc[field]
+        # Copies made by a reindex keep the time of their source, None if unknown
+        stamp = doc.get("indexed_at", indexed_at)
+        if stamp is not None:
+            action["_source"]["indexed_at"] = stamp
         actions.append(action)
 
     # Perform bulk indexing and capture response details explicitly
-    success, errors = helpers.bulk(client, actions)
+    if thread_count > 1:
+        results = list(
+            helpers.parallel_bulk(
+                client, actions, thread_count=thread_count, raise_on_error=False
+            )
+        )
+        success = sum(1 for ok, _ in results if ok)
+        errors = [item for ok, item in results if not ok]
+    else:
+        success, errors = helpers.bulk(client, actions)
+    if refresh:
+        # Searches served before the refresh would be cached under the new generation
+        client.indices.refresh(index=index_name)
+        bump_index_generation(index_name)
     logger.info(
-        f"Bulk indexed {len(documents)} documents into index {OPENSEARCH_INDEX} with {len(errors)} errors."
+        f"Bulk indexed {len(documents)} documents into index {index_name} with {len(errors)} errors."
     )
     return success, errors
 
@@ -111,12 +262,148 @@ def delete_documents_by_document_name(document_name: str) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: Response from the delete-by-query operation.
     """
+    if RETRIEVAL_BACKEND == "local":
+        local_response = get_local_store(OPENSEARCH_INDEX).delete_by_document_name(
+            document_name
+        )
+        bump_index_generation(OPENSEARCH_INDEX)
+        return local_response
+
     client = get_opensearch_client()
     query = {"query": {"term": {"document_name": document_name}}}
     response: Dict[str, Any] = client.delete_by_query(
         index=OPENSEARCH_INDEX, body=query
     )
+    # Searches served before the refresh would be cached under the new generation
+    client.indices.refresh(index=OPENSEARCH_INDEX)
+    bump_index_generation(OPENSEARCH_INDEX)
     logger.info(
         f"Deleted documents with name '{document_name}' from index {OPENSEARCH_INDEX}."
     )
     return response
+
+
+# Results of deletions on the local backend, which complete synchronously
+_local_deletion_results: Dict[str, Dict[str, Any]] = {}
+# Deletion tasks seen completed, whose removals are already visible to searches
+_completed_deletions: Set[str] = set()
+_completed_deletions_lock = threading.Lock()
+
+
+def start_document_deletion(
+    document_name: str,
+    requests_per_second: Optional[float] = DELETE_REQUESTS_PER_SECOND,
+    slices: Union[int, str] = DELETE_SLICES,
+) -> str:
+    """
+    Starts deleting a document's chunks as a background task and returns immediately.
+
+    The delete-by-query runs with `wait_for_completion=false`, split into
+    `slices` parallel slices and throttled to `requests_per_second`, so large
+    deletions neither block the caller nor flood the cluster.
+
+    Args:
+        document_name (str): Name of the document to delete.
+        requests_per_second (Optional[float]): Throttle for the deletion, None for unthrottled.
+        slices (Union[int, str]): Number of slices, or "auto" to use one per shard.
+
+    Returns:
+        str: Task ID to pass to `get_deletion_status`.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        task_id = f"local:{document_name}"
+        _local_deletion_results[task_id] = delete_documents_by_document_name(
+            document_name
+        )
+        return task_id
+
+    client = get_opensearch_client()
+    query = {"query": {"term": {"document_name": document_name}}}
+    params: Dict[str, Any] = {
+        "wait_for_completion": "false",
+        "slices": slices,
+        "conflicts": "proceed",
+    }
+    if requests_per_second is not None:
+        params["requests_per_second"] = requests_per_second
+    response = client.delete_by_query(index=OPENSEARCH_INDEX, body=query, params=params)
+    task_id = str(response["task"])
+    # Results start disappearing as soon as the task runs
+    bump_index_generation(OPENSEARCH_INDEX)
+    logger.info(
+        f"Started deletion of '{document_name}' from index {OPENSEARCH_INDEX} "
+        f"as task {task_id}."
+    )
+    return task_id
+
+
+def get_deletion_status(task_id: str) -> Dict[str, Any]:
+    """
+    Reports the progress of a deletion started with `start_document_deletion`.
+
+    The first poll that sees the task completed refreshes the index and bumps
+    its search cache generation; later polls leave both alone.
+
+    Args:
+        task_id (str): Task ID returned by `start_document_deletion`.
+
+    Returns:
+        Dict[str, Any]: 'completed', 'deleted', 'total' and 'failures' of the task,
+            plus 'error' if the task failed.
+    """
+    if task_id.startswith("local:"):
+        result = _local_deletion_results.get(task_id, {"deleted": 0, "total": 0})
+        return {
+            "completed": True,
+            "deleted": result["deleted"],
+            "total": result["total"],
+            "failures": [],
+        }
+
+    client = get_opensearch_client()
+    response = client.tasks.get(task_id=task_id)
+    completed = bool(response.get("completed"))
+    task_status = response.get("task", {}).get("status", {})
+    result = response.get("response", {}) if completed else task_status
+    status: Dict[str, Any] = {
+        "completed": completed,
+        "deleted": result.get("deleted", 0),
+        "total": result.get("total", 0),
+        "failures": result.get("failures", []),
+    }
+    if "error" in response:
+        status["error"] = response["error"]
+
+    with _completed_deletions_lock:
+        first_completion = completed and task_id not in _completed_deletions
+        if first_completion:
+            _completed_deletions.add(task_id)
+    if first_completion:
+        client.indices.refresh(index=OPENSEARCH_INDEX)
+        bump_index_generation(OPENSEARCH_INDEX)
+        logger.info(
+            f"Deletion task {task_id} completed: {status['deleted']} chunks deleted."
+        )
+    return status
+
+
+def expunge_deleted_documents() -> Optional[str]:
+    """
+    Force-merges away deleted documents so their kNN graph memory is reclaimed.
+
+    The merge runs in the background; this returns once it has been started.
+
+    Returns:
+        Optional[str]: Task ID of the force merge, or None if it ran synchronously.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        return None
+
+    client = get_opensearch_client()
+    response = client.indices.forcemerge(
+        index=OPENSEARCH_INDEX,
+        params={"only_expunge_deletes": "true", "wait_for_completion": "false"},
+    )
+    task_id: Optional[str] = response.get("task")
+    logger.info(f"Started expunging deleted documents from index {OPENSEARCH_INDEX}.")
+    return task_id
@@ -0,0 +1,493 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import streamlit as st
+from PyPDF2 import PdfReader
+
+from src.constants import (
+    INGESTION_EMBED_BATCH_SIZE,
+    INGESTION_JOB_LEASE_SECONDS,
+    INGESTION_JOBS_PATH,
+    INGESTION_MAX_ATTEMPTS,
+    INGESTION_POLL_SECONDS,
+    INGESTION_RETRY_BACKOFF_SECONDS,
+    INGESTION_WORKERS,
+    TEXT_CHUNK_OVERLAP,
+    TEXT_CHUNK_SIZE,
+)
+from src.embeddings import generate_embeddings
+from src.ingestion import bulk_index_documents
+from src.utils import chunk_text, setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# States of an ingestion job
+JOB_STATES = ("queued", "running", "done", "failed")
+ACTIVE_JOB_STATES = ("queued", "running")
+# Share of a job's progress spent extracting text and embedding chunks
+EXTRACT_PROGRESS_SHARE = 0.1
+EMBED_PROGRESS_SHARE = 0.8
+# Minimum interval between two progress updates written for a job
+PROGRESS_WRITE_SECONDS = 0.5
+# Share of the lease after which the heartbeat of a running job renews it
+LEASE_RENEWAL_SHARE = 0.25
+
+JOB_COLUMNS = (
+    "job_id",
+    "document_name",
+    "file_path",
+    "collection",
+    "tenant",
+    "status",
+    "stage",
+    "progress",
+    "attempts",
+    "chunks",
+    "error",
+    "created_at",
+    "updated_at",
+)
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a connection to the job database, creating the table if needed.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+
+    Returns:
+        sqlite3.Connection: Open database connection.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        "job_id TEXT PRIMARY KEY, document_name TEXT NOT NULL, "
+        "file_path TEXT NOT NULL, collection TEXT, tenant TEXT, "
+        "status TEXT NOT NULL, stage TEXT NOT NULL DEFAULT '', "
+        "progress REAL NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, "
+        "chunks INTEGER NOT NULL DEFAULT 0, error TEXT NOT NULL DEFAULT '', "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+        "not_before REAL NOT NULL DEFAULT 0, lease_until REAL NOT NULL DEFAULT 0, "
+        "owner TEXT NOT NULL DEFAULT '')"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at)"
+    )
+    return conn
+
+
+def ingest_document(
+    file_path: str,
+    document_name: str,
+    collection: Optional[str] = None,
+    tenant: Optional[str] = None,
+    on_progress: Optional[Callable[[str, float], None]] = None,
+) -> int:
+    """
+    Extracts, chunks, embeds and indexes a PDF document.
+
+    Chunk IDs are derived from the document name, so ingesting a document
+    again overwrites its chunks instead of duplicating them.
+
+    Args:
+        file_path (str): Path to the PDF file.
+        document_name (str): Name the chunks are indexed under.
+        collection (Optional[str]): Collection to file the document under.
+        tenant (Optional[str]): Tenant that owns the document.
+        on_progress (Optional[Callable[[str, float], None]]): Called with the
+            current stage and the fraction of the work done.
+
+    Returns:
+        int: The number of chunks indexed.
+
+    Raises:
+        ValueError: If the document contains no text.
+        RuntimeError: If some chunks could not be indexed.
+    """
+
+    def report(stage: str, progress: float) -> None:
+        if on_progress is not None:
+            on_progress(stage, progress)
+
+    reader = PdfReader(file_path)
+    pages = []
+    for i, page in enumerate(reader.pages, 1):
+        pages.append(page.extract_text() or "")
+        report("extracting", EXTRACT_PROGRESS_SHARE * i / len(reader.pages))
+    text = "".join(pages)
+
+    chunks = chunk_text(text, chunk_size=TEXT_CHUNK_SIZE, overlap=TEXT_CHUNK_OVERLAP)
+    if not chunks:
+        raise ValueError("no text could be extracted from the document")
+    embeddings = []
+    for start in range(0, len(chunks), INGESTION_EMBED_BATCH_SIZE):
+        embeddings.extend(
+            generate_embeddings(
+                chunks[start : start + INGESTION_EMBED_BATCH_SIZE],
+                batch_size=INGESTION_EMBED_BATCH_SIZE,
+            )
+        )
+        report(
+            "embedding",
+            EXTRACT_PROGRESS_SHARE
+            + EMBED_PROGRESS_SHARE * len(embeddings) / len(chunks),
+        )
+
+    documents = [
+        {
+            "doc_id": f"{document_name}_{i}",
+            "text": chunk,
+            "embedding": embedding,
+            "document_name": document_name,
+            "collection": collection,
+            "tenant": tenant,
+        }
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+    ]
+    report("indexing", EXTRACT_PROGRESS_SHARE + EMBED_PROGRESS_SHARE)
+    _, errors = bulk_index_documents(documents)
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(documents)} chunks failed to index")
+    return len(documents)
+
+
+class IngestionQueue:
+    """
+    Persistent queue of documents ingested by background worker threads.
+
+    Jobs live in SQLite, so they survive a restart of the app and can be
+    submitted or watched from another process. Each running job holds a lease
+    that a heartbeat thread renews while the job runs, including during long
+    bulk requests that report no progress; a job whose worker died is picked up
+    again once its lease expires. Failed attempts are retried with an exponential
+    backoff, up to INGESTION_MAX_ATTEMPTS.
+    """
+
+    def __init__(
+        self,
+        db_path: str = INGESTION_JOBS_PATH,
+        workers: int = INGESTION_WORKERS,
+        max_attempts: int = INGESTION_MAX_ATTEMPTS,
+    ) -> None:
+        """
+        Args:
+            db_path (str, optional): Path to the SQLite database file.
+            workers (int, optional): Number of worker threads.
+            max_attempts (int, optional): Attempts made at a job before it fails.
+        """
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        # Create the table once instead of on the first request
+        _connect(db_path).close()
+
+    def start(self) -> None:
+        """
+        Starts the worker threads, unless they are already running.
+        """
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"ingest-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} ingestion workers.")
+
+    def submit(
+        self,
+        file_path: str,
+        document_name: Optional[str] = None,
+        collection: Optional[str] = None,
+        tenant: Optional[str] = None,
+    ) -> str:
+        """
+        Queues a document for ingestion. A document that is already queued or
+        running is not queued twice.
+
+        Args:
+            file_path (str): Path to the PDF file; it must stay in place until
+                the job is done.
+            document_name (Optional[str]): Name the chunks are indexed under.
+                Defaults to the file name.
+            collection (Optional[str]): Collection to file the document under.
+            tenant (Optional[str]): Tenant that owns the document.
+
+        Returns:
+            str: The ID of the job.
+        """
+        document_name = document_name or os.path.basename(file_path)
+        now = time.time()
+        with closing(_connect(self.db_path)) as conn, conn:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE document_name = ? "
+                "AND status IN ('queued', 'running')",
+                (document_name,),
+            ).fetchone()
+            if row:
+                return str(row[0])
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (job_id, document_name, file_path, collection, "
+                "tenant, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, document_name, file_path, collection, tenant, now, now),
+            )
+        logger.info(f"Queued '{document_name}' for ingestion as job {job_id}.")
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the state of a job.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            Optional[Dict[str, Any]]: The job with the fields of JOB_COLUMNS, or
+                None for an unknown ID.
+        """
+        jobs = self._select("WHERE job_id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def list_jobs(
+        self, statuses: Sequence[str] = JOB_STATES, limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the jobs in the given states, oldest first.
+
+        Args:
+            statuses (Sequence[str], optional): States to include.
+            limit (int, optional): Maximum number of jobs.
+
+        Returns:
+            List[Dict[str, Any]]: Jobs with the fields of JOB_COLUMNS.
+        """
+        placeholders = ", ".join("?" for _ in statuses)
+        return self._select(
+            f"WHERE status IN ({placeholders}) ORDER BY created_at LIMIT ?",
+            (*statuses, limit),
+        )
+
+    def retry(self, job_id: str) -> None:
+        """
+        Queues a failed job again with a fresh set of attempts.
+
+        Args:
+            job_id (str): The ID of the job.
+        """
+        with closing(_connect(self.db_path)) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, error = '', "
+                "stage = '', progress = 0, not_before = 0, updated_at = ? "
+                "WHERE job_id = ? AND status = 'failed'",
+                (time.time(), job_id),
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def forget(self, job_id: str) -> None:
+        """
+        Removes a finished job from the queue.
+
+        Args:
+            job_id (str): The ID of the job.
+        """
+        with closing(_connect(self.db_path)) as conn, conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE job_id = ? AND status IN ('done', 'failed')",
+                (job_id,),
+            )
+
+    def _select(self, where: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        with closing(_connect(self.db_path)) as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs {where}", params
+            ).fetchall()
+        return [dict(zip(JOB_COLUMNS, row)) for row in rows]
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Takes the oldest job that is due, or whose lease has expired.
+        """
+        now = time.time()
+        owner = uuid.uuid4().hex
+        with closing(_connect(self.db_path)) as conn, conn:
+            # Lock the database so two workers never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE (status = 'queued' AND not_before <= ?) "
+                "OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, "
+                "attempts = attempts + 1, stage = '', progress = 0, updated_at = ? "
+                "WHERE job_id = ?",
+                (owner, now + INGESTION_JOB_LEASE_SECONDS, now, row[0]),
+            )
+        job = self.get_job(row[0])
+        if job is not None:
+            job["owner"] = owner
+        return job
+
+    def _update(
+        self, job: Dict[str, Any], assignments: str, params: Sequence[Any]
+    ) -> bool:
+        """
+        Updates a running job, unless another worker has taken it over.
+        """
+        with closing(_connect(self.db_path)) as conn, conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? "
+                "WHERE job_id = ? AND owner = ? AND status = 'running'",
+                (*params, time.time(), job["job_id"], job["owner"]),
+            )
+        return cursor.rowcount > 0
+
+    def _heartbeat(self, job: Dict[str, Any], stop: threading.Event) -> None:
+        """
+        Renews the lease of a running job until `stop` is set or the job is
+        taken over by another worker.
+        """
+        while not stop.wait(INGESTION_JOB_LEASE_SECONDS * LEASE_RENEWAL_SHARE):
+            try:
+                renewed = self._update(
+                    job,
+                    "lease_until = ?",
+                    (time.time() + INGESTION_JOB_LEASE_SECONDS,),
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"Could not renew the lease of job {job['job_id']}: {e}")
+                continue
+            if not renewed:
+                return
+
+    def _work(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read the ingestion queue: {e}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(INGESTION_POLL_SECONDS)
+                continue
+            try:
+                self._run(job)
+            except Exception:
+                # Keep the worker alive; the job is retried once its lease expires
+                logger.exception(f"Ingestion worker failed on job {job['job_id']}.")
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        name = job["document_name"]
+        last_write = 0.0
+
+        def on_progress(stage: str, progress: float) -> None:
+            nonlocal last_write
+            now = time.monotonic()
+            if stage == job["stage"] and now - last_write < PROGRESS_WRITE_SECONDS:
+                return
+            job["stage"] = stage
+            last_write = now
+            renewed = self._update(
+                job,
+                "stage = ?, progress = ?, lease_until = ?",
+                (stage, progress, time.time() + INGESTION_JOB_LEASE_SECONDS),
+            )
+            if not renewed:
+                raise RuntimeError("the job was taken over by another worker")
+
+        start = time.perf_counter()
+        logger.info(f"Ingesting '{name}' (attempt {job['attempts']}).")
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat,
+            args=(job, stop_heartbeat),
+            name=f"{threading.current_thread().name}-heartbeat",
+            daemon=True,
+        )
+        heartbeat.start()
+        try:
+            chunks = ingest_document(
+                job["file_path"],
+                name,
+                collection=job["collection"],
+                tenant=job["tenant"],
+                on_progress=on_progress,
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] < self.max_attempts:
+                delay = INGESTION_RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1)
+                updated = self._update(
+                    job,
+                    "status = 'queued', error = ?, not_before = ?",
+                    (error, time.time() + delay),
+                )
+                if updated:
+                    logger.warning(
+                        f"Ingesting '{name}' failed, retrying in {delay}s: {error}"
+                    )
+            else:
+                updated = self._update(job, "status = 'failed', error = ?", (error,))
+                if updated:
+                    logger.error(
+                        f"Ingesting '{name}' failed after {job['attempts']} attempts: {error}"
+                    )
+            if not updated:
+                logger.warning(
+                    f"Ingesting '{name}' failed after the job was taken over by "
+                    f"another worker: {error}"
+                )
+            return
+        finally:
+            stop_heartbeat.set()
+        if not self._update(
+            job,
+            "status = 'done', stage = '', progress = 1, chunks = ?, error = ''",
+            (chunks,),
+        ):
+            logger.warning(
+                f"Ingested '{name}' ({chunks} chunks), but the job was taken over "
+                "by another worker, which reports its outcome."
+            )
+            return
+        logger.info(
+            f"Ingested '{name}' ({chunks} chunks) in "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms."
+        )
+
+
+@st.cache_resource(show_spinner=False)
+def get_ingestion_queue() -> IngestionQueue:
+    """
+    Creates and caches the ingestion queue of the process and starts its
+    workers, which also resume the jobs left unfinished by a previous run.
+
+    Returns:
+        IngestionQueue: The ingestion queue at INGESTION_JOBS_PATH.
+    """
+    queue = IngestionQueue()
+    queue.start()
+    return queue
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from src.constants import CHAT_METRICS_ENABLED, CHAT_METRICS_PATH
+from src.utils import setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Duration fields of Ollama's final stream chunk, in nanoseconds
+OLLAMA_DURATIONS = {
+    "load_duration": "load_ms",
+    "prompt_eval_duration": "prefill_ms",
+    "eval_duration": "decode_ms",
+}
+# Stages shown by `format_timings`, in pipeline order
+STAGE_LABELS = {
+    "embed_ms": "embed",
+    "answer_cache_ms": "cache",
+    "search_ms": "search",
+    "rerank_ms": "rerank",
+    "assemble_ms": "assemble",
+    "pack_ms": "pack",
+    "warmup_ms": "warm-up",
+    "queue_ms": "queue",
+    "load_ms": "load",
+    "prefill_ms": "prefill",
+    "ttft_ms": "ttft",
+    "decode_ms": "decode",
+    "total_ms": "total",
+}
+
+
+@contextmanager
+def timed(timings: Dict[str, Any], stage: str) -> Iterator[None]:
+    """
+    Adds the wall-clock duration of the enclosed block to `timings["<stage>_ms"]`.
+
+    Args:
+        timings (Dict[str, Any]): Timings of the current chat turn.
+        stage (str): Name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        timings[f"{stage}_ms"] = timings.get(f"{stage}_ms", 0.0) + elapsed_ms
+
+
+def ollama_timings(chunk: Any) -> Dict[str, Any]:
+    """
+    Extracts Ollama's own counts and durations from the final stream chunk.
+
+    Args:
+        chunk (Any): The chunk with done=True of a streaming chat response.
+
+    Returns:
+        Dict[str, Any]: Model load, prefill and decode times in milliseconds,
+            prompt and output token counts and the token rates.
+    """
+    timings: Dict[str, Any] = {}
+    for field, name in OLLAMA_DURATIONS.items():
+        if chunk.get(field) is not None:
+            timings[name] = chunk[field] / 1e6
+    timings["prompt_tokens"] = chunk.get("prompt_eval_count") or 0
+    timings["output_tokens"] = chunk.get("eval_count") or 0
+    if timings.get("prefill_ms"):
+        timings["prefill_tokens_per_second"] = (
+            timings["prompt_tokens"] / timings["prefill_ms"] * 1000
+        )
+    if timings.get("decode_ms"):
+        timings["tokens_per_second"] = (
+            timings["output_tokens"] / timings["decode_ms"] * 1000
+        )
+    return timings
+
+
+def instrument_stream(
+    stream: Iterable[Any],
+    timings: Dict[str, Any],
+    start: float,
+    on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Iterator[Any]:
+    """
+    Passes a response stream through while recording time to first token,
+    total time and Ollama's counters from the final chunk.
+
+    Args:
+        stream (Iterable[Any]): Ollama's streaming chat response.
+        timings (Dict[str, Any]): Timings of the current chat turn, updated in place.
+        start (float): `time.perf_counter()` at the start of the turn.
+        on_complete (Optional[Callable[[Dict[str, Any]], None]]): Called with the
+            timings once the stream is exhausted.
+
+    Yields:
+        Any: The chunks of the response stream.
+    """
+    for chunk in stream:
+        if "ttft_ms" not in timings and chunk["message"]["content"]:
+            timings["ttft_ms"] = (time.perf_counter() - start) * 1000
+        if chunk.get("done"):
+            timings.update(ollama_timings(chunk))
+        yield chunk
+    timings["total_ms"] = (time.perf_counter() - start) * 1000
+    if on_complete is not None:
+        on_complete(timings)
+
+
+def record_chat_metrics(timings: Dict[str, Any], path: str = CHAT_METRICS_PATH) -> None:
+    """
+    Appends the timings of a chat turn as one JSON line to the metrics file.
+
+    Args:
+        timings (Dict[str, Any]): Timings of the chat turn.
+        path (str, optional): Metrics file. Defaults to CHAT_METRICS_PATH.
+    """
+    if not CHAT_METRICS_ENABLED:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"timestamp": time.time(), **timings}) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not write chat metrics to {path}: {e}")
+
+
+def format_timings(timings: Dict[str, Any]) -> str:
+    """
+    Formats the timings of a chat turn as a single line.
+
+    Args:
+        timings (Dict[str, Any]): Timings of the chat turn.
+
+    Returns:
+        str: e.g. "embed 12 ms · search 40 ms · prefill 310 ms (812 tok) · ...".
+    """
+    parts = []
+    for key, label in STAGE_LABELS.items():
+        if key not in timings:
+            continue
+        part = f"{label} {timings[key]:.0f} ms"
+        if key == "queue_ms" and timings.get("queue_depth"):
+            part += f" ({timings['queue_depth']} waiting)"
+        elif key == "prefill_ms" and timings.get("prompt_tokens"):
+            part += f" ({timings['prompt_tokens']} tok)"
+        elif key == "decode_ms" and timings.get("tokens_per_second"):
+            part += (
+                f" ({timings['output_tokens']} tok,"
+                f" {timings['tokens_per_second']:.1f} tok/s)"
+            )
+        parts.append(part)
+    return " · ".join(parts)
@@ -1,9 +1,29 @@
 import logging
-from typing import Any, Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
 
+import streamlit as st
 from opensearchpy import OpenSearch
 
-from src.constants import OPENSEARCH_HOST, OPENSEARCH_INDEX, OPENSEARCH_PORT
+from src.cache import SearchResultCache, get_index_generation, get_search_cache
+from src.constants import (
+    EMBEDDING_MODEL_PATH,
+    FILTERABLE_FIELDS,
+    FORCE_MERGE_MAX_SEGMENTS,
+    HYBRID_SEARCH_PIPELINE,
+    HYBRID_SEARCH_WEIGHTS,
+    MSEARCH_PAGE_SIZE,
+    OPENSEARCH_HOST,
+    OPENSEARCH_INDEX,
+    OPENSEARCH_PORT,
+    RETRIEVAL_BACKEND,
+    SEARCH_CACHE_ENABLED,
+    TASK_POLL_SECONDS,
+    WARMUP_ON_STARTUP,
+)
+from src.embeddings import embed_queries, embed_query
+from src.local_store import get_local_store
 from src.utils import setup_logging
 
 # Initialize logger
@@ -29,47 +49,454 @@ def get_opensearch_client() -> OpenSearch:
     return client
 
 
-def hybrid_search(
-    query_text: str, query_embedding: List[float], top_k: int = 5
-) -> List[Dict[str, Any]]:
+def warmup_knn_index(
+    client: OpenSearch, index_name: str = OPENSEARCH_INDEX
+) -> Dict[str, Any]:
     """
-    Performs a hybrid search combining text-based and vector-based queries.
+    Loads the kNN graphs of an index into native memory, so that the first
+    searches do not pay for loading them lazily.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str, optional): Index to warm up. Defaults to OPENSEARCH_INDEX.
+
+    Returns:
+        Dict[str, Any]: Shard summary of the warmup request.
+    """
+    response: Dict[str, Any] = client.transport.perform_request(
+        "GET", f"/_plugins/_knn/warmup/{index_name}"
+    )
+    logger.info(f"Warmed up kNN graphs of index {index_name}: {response}")
+    return response
+
+
+@st.cache_resource(show_spinner=False)
+def _warm_up_once(index_name: str) -> None:
+    """
+    Warms up the kNN graphs of an index. Only a successful warmup is cached,
+    since Streamlit does not cache a call that raises.
+
+    Args:
+        index_name (str): Index to warm up.
+
+    Raises:
+        ValueError: If the index does not exist.
+    """
+    client = get_opensearch_client()
+    if not client.indices.exists(index=index_name):
+        raise ValueError(f"index {index_name} does not exist")
+    warmup_knn_index(client, index_name)
+
+
+def warmup_search_index(index_name: str = OPENSEARCH_INDEX) -> bool:
+    """
+    Warms up the kNN graphs of the searched index once per process when
+    WARMUP_ON_STARTUP is set. Failures are logged and never block searching;
+    a failed warmup is tried again by the next session.
+
+    Args:
+        index_name (str, optional): Index to warm up. Defaults to OPENSEARCH_INDEX.
+
+    Returns:
+        bool: Whether the index is warmed up.
+    """
+    if not WARMUP_ON_STARTUP or RETRIEVAL_BACKEND == "local":
+        return False
+    try:
+        _warm_up_once(index_name)
+        return True
+    except Exception as e:
+        logger.warning(f"Warmup of index {index_name} failed: {e}")
+        return False
+
+
+def wait_for_task(client: OpenSearch, task_id: str) -> Dict[str, Any]:
+    """
+    Polls a background task until it completes.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        task_id (str): ID of the task.
+
+    Returns:
+        Dict[str, Any]: The task's final response.
+    """
+    while True:
+        task = client.tasks.get(task_id=task_id)
+        if task.get("completed"):
+            if "error" in task:
+                raise RuntimeError(f"Task {task_id} failed: {task['error']}")
+            response: Dict[str, Any] = task.get("response", {})
+            return response
+        time.sleep(TASK_POLL_SECONDS)
+
+
+def force_merge_index(
+    client: OpenSearch,
+    index_name: str = OPENSEARCH_INDEX,
+    max_num_segments: int = FORCE_MERGE_MAX_SEGMENTS,
+) -> None:
+    """
+    Merges the segments of an index, so that each kNN query searches fewer
+    and larger HNSW graphs. Waits for the merge, which runs as a background task.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str, optional): Index to merge. Defaults to OPENSEARCH_INDEX.
+        max_num_segments (int, optional): Target number of segments per shard.
+    """
+    response = client.indices.forcemerge(
+        index=index_name,
+        params={"max_num_segments": max_num_segments, "wait_for_completion": "false"},
+    )
+    if "task" in response:
+        wait_for_task(client, response["task"])
+    logger.info(f"Force-merged index {index_name} to {max_num_segments} segments.")
+
+
+def get_segment_count(client: OpenSearch, index_name: str = OPENSEARCH_INDEX) -> int:
+    """
+    Counts the Lucene segments of an index across its shards.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str, optional): Index to inspect. Defaults to OPENSEARCH_INDEX.
+
+    Returns:
+        int: Number of segments.
+    """
+    return len(client.cat.segments(index=index_name, format="json"))
+
+
+def get_knn_graph_memory(client: OpenSearch) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the native memory used by loaded kNN graphs from the k-NN stats API.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Per node its graph memory in KB, the share of
+            the graph cache in use, whether the cache is full and the graph
+            memory of each index in the cache.
+    """
+    stats = client.transport.perform_request("GET", "/_plugins/_knn/stats")
+    return {
+        node.get("name", node_id): {
+            "graph_memory_kb": node.get("graph_memory_usage", 0),
+            "graph_memory_percent": node.get("graph_memory_usage_percentage", 0.0),
+            "cache_capacity_reached": node.get("cache_capacity_reached", False),
+            "indices": {
+                name: index.get("graph_memory_usage", 0)
+                for name, index in node.get("indices_in_cache", {}).items()
+            },
+        }
+        for node_id, node in stats.get("nodes", {}).items()
+    }
+
+
+def get_fusion_params(
+    filters: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Returns the parameters that determine which hits a hybrid search returns and
+    how their scores are combined.
+
+    Args:
+        filters (Optional[Dict[str, List[str]]]): Field filters of the search.
+
+    Returns:
+        Dict[str, Any]: Search pipeline, combination weights, embedding model and filters.
+    """
+    return {
+        "pipeline": HYBRID_SEARCH_PIPELINE,
+        "weights": list(HYBRID_SEARCH_WEIGHTS),
+        "embedding_model": EMBEDDING_MODEL_PATH,
+        "filters": {
+            field: sorted(values) for field, values in (filters or {}).items() if values
+        },
+    }
+
+
+def build_search_filter(
+    filters: Optional[Dict[str, List[str]]],
+) -> Optional[Dict[str, Any]]:
+    """
+    Translates field filters into an OpenSearch bool filter.
+
+    Args:
+        filters (Optional[Dict[str, List[str]]]): Allowed values per keyword field,
+            e.g. {"document_name": ["manual.pdf"], "collection": ["support"]}.
+
+    Returns:
+        Optional[Dict[str, Any]]: The filter clause, or None when nothing is filtered.
+    """
+    if not filters:
+        return None
+    clauses = []
+    for field, values in sorted(filters.items()):
+        if field not in FILTERABLE_FIELDS:
+            raise ValueError(
+                f"Cannot filter on '{field}'; expected one of {FILTERABLE_FIELDS}."
+            )
+        if values:
+            clauses.append({"terms": {field: list(values)}})
+    if not clauses:
+        return None
+    return {"bool": {"filter": clauses}}
+
+
+def build_hybrid_query(
+    query_text: str,
+    query_embedding: List[float],
+    top_k: int,
+    filters: Optional[Dict[str, List[str]]] = None,
+    with_embeddings: bool = False,
+) -> Dict[str, Any]:
+    """
+    Builds the body of a hybrid query combining a BM25 match and a kNN query.
+
+    Filters are applied inside the kNN query, so the k-NN plugin's efficient
+    filtering restricts the graph traversal instead of post-filtering the top k.
 
     Args:
         query_text (str): The text query for text-based search.
         query_embedding (List[float]): Embedding vector for vector-based search.
-        top_k (int, optional): Number of top results to retrieve. Defaults to 5.
+        top_k (int): Number of top results to retrieve.
+        filters (Optional[Dict[str, List[str]]]): Allowed values per keyword field.
+        with_embeddings (bool, optional): Return the stored embeddings of the hits.
 
     Returns:
-        List[Dict[str, Any]]: List of search results from OpenSearch.
+        Dict[str, Any]: The search request body.
     """
-    client = get_opensearch_client()
+    text_query: Dict[str, Any] = {"match": {"text": {"query": query_text}}}
+    knn_query: Dict[str, Any] = {"vector": query_embedding, "k": top_k}
+    search_filter = build_search_filter(filters)
+    if search_filter is not None:
+        text_query = {"bool": {"must": [text_query], "filter": [search_filter]}}
+        knn_query["filter"] = search_filter
 
-    query_body = {
-        "_source": {"exclude": ["embedding"]},  # Exclude embeddings from the results
+    body: Dict[str, Any] = {
         "query": {
             "hybrid": {
                 "queries": [
-                    {"match": {"text": {"query": query_text}}},  # Text-based search
-                    {
-                        "knn": {
-                            "embedding": {
-                                "vector": query_embedding,
-                                "k": top_k,
-                            }
-                        }
-                    },
+                    text_query,  # Text-based search
+                    {"knn": {"embedding": knn_query}},  # Vector-based search
                 ]
             }
         },
         "size": top_k,
     }
+    if not with_embeddings:
+        # Exclude embeddings from the results
+        body["_source"] = {"exclude": ["embedding"]}
+    return body
+
+
+def hybrid_search(
+    query_text: str,
+    query_embedding: Optional[List[float]] = None,
+    top_k: int = 5,
+    index_name: str = OPENSEARCH_INDEX,
+    filters: Optional[Dict[str, List[str]]] = None,
+    with_embeddings: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Performs a hybrid search combining text-based and vector-based queries.
+
+    Results are served from the search result cache when the same query was
+    already answered against the current generation of the index. The query is
+    only embedded on a cache miss when no embedding is passed in. When
+    RETRIEVAL_BACKEND is "local" the query runs against the in-process store.
+
+    Args:
+        query_text (str): The text query for text-based search.
+        query_embedding (Optional[List[float]]): Embedding vector for vector-based search.
+            Computed from `query_text` when omitted.
+        top_k (int, optional): Number of top results to retrieve. Defaults to 5.
+        index_name (str, optional): Index to search. Defaults to OPENSEARCH_INDEX.
+        filters (Optional[Dict[str, List[str]]]): Restricts results to chunks whose
+            keyword fields (document_name, collection, tenant) match the given values.
+        with_embeddings (bool, optional): Include the stored 'embedding' of each
+            hit in its '_source'. The search cache drops embeddings, so hits
+            served from it come without them.
+
+    Returns:
+        List[Dict[str, Any]]: List of search results.
+    """
+    cache: Optional[SearchResultCache] = None
+    cache_key = ""
+    generation = 0
+    if SEARCH_CACHE_ENABLED:
+        cache = get_search_cache()
+        cache_key = cache.make_key(
+            query_text, top_k, index_name, get_fusion_params(filters)
+        )
+        cached_hits = cache.get(cache_key, index_name)
+        if cached_hits is not None:
+            logger.info(f"Search cache hit for query '{query_text}'.")
+            return cached_hits
+        # Read before searching, see `SearchResultCache.put`
+        generation = get_index_generation(index_name)
+
+    if query_embedding is None:
+        query_embedding = embed_query(query_text)
+
+    if RETRIEVAL_BACKEND == "local":
+        local_hits = get_local_store(index_name).hybrid_search(
+            query_text,
+            query_embedding,
+            top_k=top_k,
+            index_name=index_name,
+            filters=filters,
+            with_embeddings=with_embeddings,
+        )
+        logger.info(f"Local hybrid search completed for query '{query_text}'.")
+        if cache is not None:
+            cache.put(cache_key, index_name, local_hits, generation)
+        return local_hits
+
+    client = get_opensearch_client()
+
+    query_body = build_hybrid_query(
+        query_text, query_embedding, top_k, filters, with_embeddings
+    )
 
     response = client.search(
-        index=OPENSEARCH_INDEX, body=query_body, search_pipeline="nlp-search-pipeline"
+        index=index_name, body=query_body, search_pipeline=HYBRID_SEARCH_PIPELINE
     )
     logger.info(f"Hybrid search completed for query '{query_text}' with top_k={top_k}.")
 
     # Type casting for compatibility with expected return type
     hits: List[Dict[str, Any]] = response["hits"]["hits"]
+    if cache is not None:
+        cache.put(cache_key, index_name, hits, generation)
     return hits
+
+
+def hybrid_search_many(
+    query_texts: List[str],
+    top_k: int = 5,
+    index_name: str = OPENSEARCH_INDEX,
+    page_size: int = MSEARCH_PAGE_SIZE,
+    concurrency: int = 1,
+    filters: Optional[Dict[str, List[str]]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Runs hybrid searches for many queries at once.
+
+    Cached queries are answered from the search result cache. The remaining
+    queries are embedded in a single batch and sent to OpenSearch through
+    `_msearch` in pages of `page_size` queries, with up to `concurrency` pages
+    in flight.
+
+    Args:
+        query_texts (List[str]): The text queries.
+        top_k (int, optional): Number of top results per query. Defaults to 5.
+        index_name (str, optional): Index to search. Defaults to OPENSEARCH_INDEX.
+        page_size (int, optional): Number of queries per `_msearch` request.
+        concurrency (int, optional): Number of `_msearch` requests run in parallel.
+        filters (Optional[Dict[str, List[str]]]): Field filters applied to every query.
+
+    Returns:
+        List[List[Dict[str, Any]]]: Search results for each query, in input order.
+    """
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(query_texts)
+    cache: Optional[SearchResultCache] = None
+    cache_keys: List[str] = [""] * len(query_texts)
+    generation = 0
+    if SEARCH_CACHE_ENABLED:
+        cache = get_search_cache()
+        fusion = get_fusion_params(filters)
+        for i, query_text in enumerate(query_texts):
+            cache_keys[i] = cache.make_key(query_text, top_k, index_name, fusion)
+            results[i] = cache.get(cache_keys[i], index_name)
+        # Read before searching, see `SearchResultCache.put`
+        generation = get_index_generation(index_name)
+
+    pending = [i for i, hits in enumerate(results) if hits is None]
+    logger.info(
+        f"Batched hybrid search for {len(query_texts)} queries, "
+        f"{len(query_texts) - len(pending)} served from cache."
+    )
+    if pending:
+        pending_texts = [query_texts[i] for i in pending]
+        embeddings = dict(zip(pending, embed_queries(pending_texts)))
+        failed: Set[int] = set()
+
+        if RETRIEVAL_BACKEND == "local":
+            store = get_local_store(index_name)
+            for i, embedding in embeddings.items():
+                results[i] = store.hybrid_search(
+                    query_texts[i],
+                    embedding,
+                    top_k=top_k,
+                    index_name=index_name,
+                    filters=filters,
+                )
+        else:
+            client = get_opensearch_client()
+
+            def run_page(page: List[int]) -> None:
+                body: List[Dict[str, Any]] = []
+                for i in page:
+                    body.append({"index": index_name})
+                    body.append(
+                        build_hybrid_query(
+                            query_texts[i], embeddings[i], top_k, filters
+                        )
+                    )
+                response = client.msearch(
+                    body=body, params={"search_pipeline": HYBRID_SEARCH_PIPELINE}
+                )
+                for i, item in zip(page, response["responses"]):
+                    if "error" in item:
+                        logger.error(
+                            f"Search failed for query '{query_texts[i]}': "
+                            f"{item['error']}"
+                        )
+                        failed.add(i)
+                        results[i] = []
+                    else:
+                        results[i] = item["hits"]["hits"]
+
+            pages = [
+                pending[start : start + page_size]
+                for start in range(0, len(pending), page_size)
+            ]
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+                list(executor.map(run_page, pages))
+
+        if cache is not None:
+            for i in pending:
+                if i not in failed:
+                    cache.put(cache_keys[i], index_name, results[i] or [], generation)
+
+    logger.info(f"Batched hybrid search completed for {len(query_texts)} queries.")
+    return [hits or [] for hits in results]
+
+
+def list_field_values(
+    field: str = "document_name", index_name: str = OPENSEARCH_INDEX
+) -> List[str]:
+    """
+    Lists the distinct values of a keyword field, e.g. to offer them as filters.
+
+    Args:
+        field (str, optional): Keyword field to aggregate. Defaults to "document_name".
+        index_name (str, optional): Index to inspect. Defaults to OPENSEARCH_INDEX.
+
+    Returns:
+        List[str]: Sorted distinct values of the field.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        return get_local_store(index_name).field_values(field)
+
+    client = get_opensearch_client()
+    query = {
+        "size": 0,
+        "aggs": {"values": {"terms": {"field": field, "size": 10000}}},
+    }
+    response = client.search(index=index_name, body=query)
+    buckets = response["aggregations"]["values"]["buckets"]
+    return sorted(bucket["key"] for bucket in buckets)
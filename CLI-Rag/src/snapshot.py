@@ -0,0 +1,311 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from opensearchpy import helpers
+
+from src.cache import bump_index_generation
+from src.constants import (
+    ASSYMETRIC_EMBEDDING,
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL_PATH,
+    OPENSEARCH_INDEX,
+    RETRIEVAL_BACKEND,
+    SNAPSHOT_IMPORT_THREADS,
+    SNAPSHOT_SHARD_ROWS,
+    SNAPSHOT_SLICES,
+)
+from src.ingestion import (
+    bulk_index_documents,
+    create_index,
+    get_index_meta,
+    get_live_index,
+)
+from src.opensearch import get_opensearch_client
+from src.utils import setup_logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+# Per-chunk columns stored next to the embeddings
+SNAPSHOT_FIELDS = ("doc_id", "text", "document_name", "collection", "tenant")
+
+
+def default_snapshot_format() -> str:
+    """
+    Returns the snapshot format used when none is requested.
+
+    Returns:
+        str: "parquet" when pyarrow is installed, otherwise "npy".
+    """
+    return "parquet" if PARQUET_AVAILABLE else "npy"
+
+
+def _write_shard(
+    directory: str,
+    name: str,
+    file_format: str,
+    rows: List[Dict[str, Any]],
+    embeddings: np.ndarray[Any, Any],
+) -> Dict[str, Any]:
+    """
+    Writes one shard of a snapshot.
+
+    Parquet shards hold every column in one file. npy shards store the
+    embedding matrix in `<name>.npy` and the other columns in `<name>.jsonl`.
+
+    Args:
+        directory (str): Snapshot directory.
+        name (str): Shard name without extension.
+        file_format (str): "parquet" or "npy".
+        rows (List[Dict[str, Any]]): Per chunk its SNAPSHOT_FIELDS.
+        embeddings (np.ndarray[Any, Any]): float32 matrix with one row per chunk.
+
+    Returns:
+        Dict[str, Any]: Manifest entry with the shard name and row count.
+    """
+    if file_format == "parquet":
+        columns = {
+            field: pa.array([row.get(field) for row in rows], pa.string())
+            for field in SNAPSHOT_FIELDS
+        }
+        columns["embedding"] = pa.FixedSizeListArray.from_arrays(
+            pa.array(embeddings.ravel(), pa.float32()), embeddings.shape[1]
+        )
+        table = pa.table(columns)
+        pq.write_table(table, os.path.join(directory, f"{name}.parquet"))
+    else:
+        np.save(os.path.join(directory, f"{name}.npy"), embeddings)
+        with open(os.path.join(directory, f"{name}.jsonl"), "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return {"name": name, "rows": len(rows)}
+
+
+def _read_shard(directory: str, name: str, file_format: str) -> List[Dict[str, Any]]:
+    """
+    Reads one shard of a snapshot back into documents for `bulk_index_documents`.
+
+    Args:
+        directory (str): Snapshot directory.
+        name (str): Shard name without extension.
+        file_format (str): "parquet" or "npy".
+
+    Returns:
+        List[Dict[str, Any]]: Documents with their fields and embedding.
+    """
+    if file_format == "parquet":
+        if not PARQUET_AVAILABLE:
+            raise ImportError("Reading Parquet snapshots requires pyarrow.")
+        table = pq.read_table(os.path.join(directory, f"{name}.parquet"))
+        column = table.column("embedding").combine_chunks()
+        embeddings = np.asarray(column.flatten(), dtype=np.float32).reshape(
+            len(table), -1
+        )
+        rows = table.drop(["embedding"]).to_pylist()
+    else:
+        embeddings = np.load(os.path.join(directory, f"{name}.npy"))
+        with open(os.path.join(directory, f"{name}.jsonl"), "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+    return [{**row, "embedding": embedding} for row, embedding in zip(rows, embeddings)]
+
+
+def export_index(
+    output_dir: str,
+    index_name: str = OPENSEARCH_INDEX,
+    file_format: Optional[str] = None,
+    slices: int = SNAPSHOT_SLICES,
+    shard_rows: int = SNAPSHOT_SHARD_ROWS,
+) -> Dict[str, Any]:
+    """
+    Exports the text, fields and embedding of every chunk to local shard files.
+
+    The index is read with parallel sliced scrolls, one thread per slice, and
+    each slice writes its own shards. A manifest records the shards and the
+    settings the embeddings were built with.
+
+    Args:
+        output_dir (str): Directory to write the snapshot to.
+        index_name (str, optional): Index or alias to export. Defaults to OPENSEARCH_INDEX.
+        file_format (Optional[str]): "parquet" or "npy". Defaults to Parquet when
+            pyarrow is installed.
+        slices (int, optional): Number of parallel sliced scrolls.
+        shard_rows (int, optional): Maximum number of chunks per shard.
+
+    Returns:
+        Dict[str, Any]: The snapshot manifest.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        raise ValueError("Snapshots are exported from the OpenSearch backend.")
+    file_format = file_format or default_snapshot_format()
+    if file_format == "parquet" and not PARQUET_AVAILABLE:
+        raise ImportError("Writing Parquet snapshots requires pyarrow.")
+
+    client = get_opensearch_client()
+    mapping = client.indices.get_mapping(index=index_name)
+    meta = next(iter(mapping.values()))["mappings"].get("_meta") or get_index_meta()
+    strip_prefix = meta.get("asymmetric_embedding", ASSYMETRIC_EMBEDDING)
+    os.makedirs(output_dir, exist_ok=True)
+
+    def export_slice(slice_id: int) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"query": {"match_all": {}}}
+        if slices > 1:
+            query["slice"] = {"id": slice_id, "max": slices}
+        shards: List[Dict[str, Any]] = []
+        rows: List[Dict[str, Any]] = []
+        vectors: List[List[float]] = []
+
+        def flush() -> None:
+            name = f"shard-{slice_id:03d}-{len(shards):05d}"
+            matrix = np.asarray(vectors, dtype=np.float32)
+            shards.append(_write_shard(output_dir, name, file_format, rows, matrix))
+            rows.clear()
+            vectors.clear()
+
+        for hit in helpers.scan(client, index=index_name, query=query, size=1000):
+            source = hit["_source"]
+            text = source["text"]
+            # Store the raw chunk; bulk_index_documents adds the prefix on import
+            if strip_prefix and text.startswith("passage: "):
+                text = text[len("passage: ") :]
+            rows.append(
+                {
+                    "doc_id": hit["_id"],
+                    "text": text,
+                    "document_name": source["document_name"],
+                    "collection": source.get("collection"),
+                    "tenant": source.get("tenant"),
+                }
+            )
+            vectors.append(source["embedding"])
+            if len(rows) >= shard_rows:
+                flush()
+        if rows:
+            flush()
+        return shards
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, slices)) as executor:
+        shards = [
+            shard
+            for slice_shards in executor.map(export_slice, range(max(1, slices)))
+            for shard in slice_shards
+        ]
+
+    manifest = {
+        "format": file_format,
+        "source_index": index_name,
+        "created_at": time.time(),
+        "meta": meta,
+        "chunks": sum(shard["rows"] for shard in shards),
+        "shards": shards,
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(
+        f"Exported {manifest['chunks']} chunks from {index_name} to {output_dir} "
+        f"in {time.perf_counter() - start:.1f}s."
+    )
+    return manifest
+
+
+def import_snapshot(
+    input_dir: str,
+    index_name: str = OPENSEARCH_INDEX,
+    thread_count: int = SNAPSHOT_IMPORT_THREADS,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Loads a snapshot written by `export_index` without re-embedding anything.
+
+    Into OpenSearch, shards are sent with parallel bulk requests while index
+    refreshes are paused. With the local backend, the snapshot seeds the local
+    store in a single write.
+
+    Args:
+        input_dir (str): Snapshot directory.
+        index_name (str, optional): Index or alias to load into. Defaults to OPENSEARCH_INDEX.
+        thread_count (int, optional): Threads sending bulk requests.
+        progress_callback (Optional[Callable[[int, int], None]]): Called with the
+            number of chunks loaded and the total after each shard.
+
+    Returns:
+        Dict[str, Any]: Number of chunks loaded and the indexing errors.
+    """
+    with open(os.path.join(input_dir, MANIFEST_FILENAME), "r") as f:
+        manifest = json.load(f)
+    meta = manifest.get("meta", {})
+    dimension = meta.get("embedding_dimension", EMBEDDING_DIMENSION)
+    if dimension != EMBEDDING_DIMENSION:
+        raise ValueError(
+            f"Snapshot embeddings have dimension {dimension}, "
+            f"expected {EMBEDDING_DIMENSION}."
+        )
+    if meta.get("embedding_model", EMBEDDING_MODEL_PATH) != EMBEDDING_MODEL_PATH:
+        logger.warning(
+            f"Snapshot was embedded with {meta['embedding_model']}, "
+            f"but queries use {EMBEDDING_MODEL_PATH}."
+        )
+
+    total = manifest["chunks"]
+    loaded = 0
+    errors: List[Any] = []
+    start = time.perf_counter()
+
+    if RETRIEVAL_BACKEND == "local":
+        documents = [
+            document
+            for shard in manifest["shards"]
+            for document in _read_shard(input_dir, shard["name"], manifest["format"])
+        ]
+        loaded, errors = bulk_index_documents(documents, index_name=index_name)
+        if progress_callback is not None:
+            progress_callback(loaded, total)
+    else:
+        client = get_opensearch_client()
+        target: Optional[str] = index_name
+        if index_name == OPENSEARCH_INDEX:
+            create_index(client)
+            target = get_live_index(client)
+        client.indices.put_settings(
+            index=target, body={"index": {"refresh_interval": "-1"}}
+        )
+        try:
+            for shard in manifest["shards"]:
+                documents = _read_shard(input_dir, shard["name"], manifest["format"])
+                success, shard_errors = bulk_index_documents(
+                    documents,
+                    index_name=index_name,
+                    thread_count=thread_count,
+                    refresh=False,
+                )
+                loaded += success
+                errors.extend(shard_errors)
+                if progress_callback is not None:
+                    progress_callback(loaded, total)
+        finally:
+            client.indices.put_settings(
+                index=target, body={"index": {"refresh_interval": None}}
+            )
+            client.indices.refresh(index=target)
+            bump_index_generation(index_name)
+
+    logger.info(
+        f"Imported {loaded} chunks from {input_dir} into {index_name} "
+        f"in {time.perf_counter() - start:.1f}s with {len(errors)} errors."
+    )
+    return {"chunks": loaded, "errors": errors}
@@ -3,6 +3,7 @@ import os
 
 import streamlit as st
 
+from src.ingestion_jobs import get_ingestion_queue
 from src.utils import setup_logging
 
 # Initialize logger
@@ -134,8 +135,19 @@ def display_sidebar_content() -> None:
     logger.info("Displayed sidebar content.")
 
 
+# Function to resume ingestion
+def start_ingestion_workers() -> None:
+    """Starts the ingestion workers, so jobs left queued by a previous run resume
+    when the app starts instead of when the upload page is first opened."""
+    try:
+        get_ingestion_queue()
+    except Exception as e:
+        logger.error(f"Could not start the ingestion workers: {e}")
+
+
 # Main execution
 if __name__ == "__main__":
+    start_ingestion_workers()
     apply_custom_css()
     display_logo("images/karan.png")
     display_sidebar_content()
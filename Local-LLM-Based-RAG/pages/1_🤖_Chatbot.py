@@ -1,15 +1,24 @@
 import logging
 import os
+from typing import Any, Dict, Optional
 
 import streamlit as st
 
 from src.chat import (  # type: ignore
-    ensure_model_pulled,
+    chat_models,
     generate_response_streaming,
     get_embedding_model,
 )
 from src.ingestion import create_index, get_opensearch_client
-from src.constants import OLLAMA_MODEL_NAME, OPENSEARCH_INDEX
+from src.constants import OPENSEARCH_INDEX, RERANK_ENABLED, SESSION_RENDER_MESSAGES
+from src.generation import GenerationHandle, get_generation_stats
+from src.metrics import format_timings
+from src.model_readiness import get_model_readiness
+from src.opensearch import list_field_values, warmup_search_index
+from src.rendering import RenderCoalescer
+from src.rerank import get_reranker
+from src.scheduler import get_generation_scheduler
+from src.session_store import get_session_store
 from src.utils import setup_logging
 
 # Initialize logger
@@ -41,6 +50,21 @@ st.markdown(
 logger.info("Custom CSS applied.")
 
 
+def open_session(session_id: str) -> None:
+    """
+    Makes a stored conversation the current one, restoring the history sent to
+    the model from its summary and the messages the summary does not cover.
+
+    Args:
+        session_id (str): The session ID.
+    """
+    st.session_state["session_id"] = session_id
+    st.session_state["conversation"] = get_session_store().open_conversation(session_id)
+    st.session_state["shown_messages"] = SESSION_RENDER_MESSAGES
+    st.query_params["session"] = session_id
+    logger.info(f"Opened chat session {session_id}.")
+
+
 # Main chatbot page rendering function
 def render_chatbot_page() -> None:
     # Set up a placeholder at the very top of the main content area
@@ -50,10 +74,26 @@ def render_chatbot_page() -> None:
     # Initialize session state variables for chatbot settings
     if "use_hybrid_search" not in st.session_state:
         st.session_state["use_hybrid_search"] = True
+    if "use_rerank" not in st.session_state:
+        st.session_state["use_rerank"] = RERANK_ENABLED
+    if "chat_model" not in st.session_state:
+        st.session_state["chat_model"] = "Auto"
     if "num_results" not in st.session_state:
         st.session_state["num_results"] = 5
     if "temperature" not in st.session_state:
         st.session_state["temperature"] = 0.7
+    if "filter_documents" not in st.session_state:
+        st.session_state["filter_documents"] = []
+    if "filter_collections" not in st.session_state:
+        st.session_state["filter_collections"] = []
+    # The conversation is stored; its ID also identifies it in the model's queue
+    store = get_session_store()
+    if "session_id" not in st.session_state:
+        resumed = st.query_params.get("session")
+        if resumed and store.count_messages(resumed):
+            open_session(resumed)
+        else:
+            open_session(store.create_session())
 
     # Initialize OpenSearch client
     with st.spinner("Connecting to OpenSearch..."):
@@ -63,10 +103,42 @@ def render_chatbot_page() -> None:
     # Ensure the index exists
     create_index(client)
 
+    # Sidebar conversation picker; the current conversation is listed first
+    current = st.session_state["session_id"]
+    titles = {
+        session["session_id"]: session["title"] or "Untitled"
+        for session in store.list_sessions()
+    }
+    titles.setdefault(current, "New conversation")
+    selected = st.sidebar.selectbox(
+        "Conversation",
+        [current] + [session_id for session_id in titles if session_id != current],
+        format_func=lambda session_id: titles[session_id],
+    )
+    if st.sidebar.button("New conversation"):
+        open_session(store.create_session())
+        st.rerun()
+    elif selected != current:
+        open_session(selected)
+        st.rerun()
+
     # Sidebar settings for hybrid search toggle, result count, and temperature
     st.session_state["use_hybrid_search"] = st.sidebar.checkbox(
         "Enable RAG mode", value=st.session_state["use_hybrid_search"]
     )
+    st.session_state["use_rerank"] = st.sidebar.checkbox(
+        "Rerank Results with Cross-Encoder",
+        value=st.session_state["use_rerank"],
+        help="Retrieves more candidates and keeps the most relevant ones.",
+    )
+    model_options = ["Auto"] + chat_models()
+    st.session_state["chat_model"] = st.sidebar.selectbox(
+        "Chat Model",
+        model_options,
+        index=model_options.index(st.session_state["chat_model"]),
+        help="Auto picks the model per question from its length and the"
+        " retrieval scores.",
+    )
     st.session_state["num_results"] = st.sidebar.number_input(
         "Number of Results in Context Window",
         min_value=1,
@@ -82,6 +154,52 @@ def render_chatbot_page() -> None:
         step=0.1,
     )
 
+    # Sidebar filters to scope retrieval to specific documents or collections
+    available_documents = list_field_values("document_name", index_name)
+    st.session_state["filter_documents"] = st.sidebar.multiselect(
+        "Limit RAG to Documents",
+        options=available_documents,
+        default=[
+            name
+            for name in st.session_state["filter_documents"]
+            if name in available_documents
+        ],
+    )
+    available_collections = list_field_values("collection", index_name)
+    if available_collections:
+        st.session_state["filter_collections"] = st.sidebar.multiselect(
+            "Limit RAG to Collections",
+            options=available_collections,
+            default=[
+                name
+                for name in st.session_state["filter_collections"]
+                if name in available_collections
+            ],
+        )
+
+    # Pull and load the chat models in the background, so the first question
+    # does not wait for them; only cold models are warmed up
+    readiness = get_model_readiness()
+    readiness.warm_up(chat_models())
+    readiness.refresh()
+    st.sidebar.caption(
+        " · ".join(f"{model}: {readiness.status(model)}" for model in chat_models())
+    )
+
+    generation_stats = get_generation_stats()
+    if generation_stats["cancelled"]:
+        st.sidebar.caption(
+            f"Stopped {generation_stats['cancelled']} abandoned answers,"
+            f" ~{generation_stats['tokens_saved']} tokens saved"
+        )
+    queue_stats = get_generation_scheduler().stats()
+    if queue_stats["served"] or queue_stats["queued"]:
+        st.sidebar.caption(
+            f"Model queue: {queue_stats['in_flight']} running,"
+            f" {queue_stats['queued']} waiting"
+            f" · p95 wait {queue_stats['wait_p95_ms'] / 1000:.1f} s"
+        )
+
     # Display logo or placeholder
     logo_path = "images/jamwithai_logo.png"
     if os.path.exists(logo_path):
@@ -118,61 +236,145 @@ def render_chatbot_page() -> None:
     # Load models if not already loaded
     if "embedding_models_loaded" not in st.session_state:
         with model_loading_placeholder:
-            with st.spinner("Loading Embedding and Ollama models for Hybrid Search..."):
+            with st.spinner("Loading Embedding model for Hybrid Search..."):
                 get_embedding_model()
-                ensure_model_pulled(OLLAMA_MODEL_NAME)
+                # Load the kNN graphs now instead of during the first search
+                warmup_search_index(index_name)
                 st.session_state["embedding_models_loaded"] = True
         logger.info("Embedding model loaded.")
         model_loading_placeholder.empty()
 
-    # Initialize chat history in session state if not already present
-    if "chat_history" not in st.session_state:
-        st.session_state["chat_history"] = []
+    if st.session_state["use_rerank"]:
+        with st.spinner("Loading reranker model..."):
+            get_reranker()
 
-    # Display chat history
-    for message in st.session_state["chat_history"]:
+    # Display only the most recent messages; older ones are loaded on request
+    session_id = st.session_state["session_id"]
+    hidden = store.count_messages(session_id) - st.session_state["shown_messages"]
+    if hidden > 0 and st.button(f"Show older messages ({hidden} hidden)"):
+        st.session_state["shown_messages"] += SESSION_RENDER_MESSAGES
+    for message in store.load_messages(session_id, st.session_state["shown_messages"]):
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
     # Process user input and generate response
     if prompt := st.chat_input("Type your message here..."):
+        # A new message stops an answer still streaming from an earlier run
+        previous_generation = st.session_state.get("generation")
+        if previous_generation is not None:
+            previous_generation.cancel()
         with st.chat_message("user"):
             st.markdown(prompt)
-        st.session_state["chat_history"].append({"role": "user", "content": prompt})
         logger.info("User input received.")
 
         # Generate response from assistant
-        with st.chat_message("assistant"):
-            with st.spinner("Generating response..."):
-                response_placeholder = st.empty()
-                response_text = ""
-
-                response_stream = generate_response_streaming(
-                    prompt,
-                    use_hybrid_search=st.session_state["use_hybrid_search"],
-                    num_results=st.session_state["num_results"],
-                    temperature=st.session_state["temperature"],
-                    chat_history=st.session_state["chat_history"],
-                )
+        response_stream: Optional[GenerationHandle] = None
+        response_text = ""
+        try:
+            with st.chat_message("assistant"):
+                try:
+                    with st.spinner("Generating response..."):
+                        response_placeholder = st.empty()
+                        prompt_report: Dict[str, Any] = {}
+
+                        response_stream = generate_response_streaming(
+                            prompt,
+                            use_hybrid_search=st.session_state["use_hybrid_search"],
+                            num_results=st.session_state["num_results"],
+                            temperature=st.session_state["temperature"],
+                            chat_history=st.session_state[
+                                "conversation"
+                            ].prompt_messages(),
+                            filters={
+                                "document_name": st.session_state["filter_documents"],
+                                "collection": st.session_state["filter_collections"],
+                            },
+                            report=prompt_report,
+                            rerank=st.session_state["use_rerank"],
+                            session_id=session_id,
+                            model=(
+                                None
+                                if st.session_state["chat_model"] == "Auto"
+                                else st.session_state["chat_model"]
+                            ),
+                            on_queue_position=lambda ahead: response_placeholder.caption(
+                                f"Waiting for the model: {ahead} request(s) ahead..."
+                            ),
+                        )
+                        if response_stream is not None:
+                            # Stored as soon as the answer starts, so a rerun
+                            # mid-answer does not lose the question
+                            store.add_messages(
+                                session_id, [{"role": "user", "content": prompt}]
+                            )
+                except BaseException:
+                    # A rerun or stop before streaming starts must free the model slot
+                    if response_stream is not None:
+                        response_stream.cancel()
+                    raise
 
-            # Stream response content if response_stream is valid
+                # Stream response content if response_stream is valid
+                if response_stream is not None:
+                    st.session_state["generation"] = response_stream
+                    # Re-rendering the growing answer per token floods the websocket
+                    coalescer = RenderCoalescer(
+                        lambda text, _: response_placeholder.markdown(text + "▌")
+                    )
+                    try:
+                        for chunk in response_stream:
+                            if (
+                                isinstance(chunk, dict)
+                                and "message" in chunk
+                                and "content" in chunk["message"]
+                            ):
+                                coalescer.add(chunk["message"]["content"])
+                            else:
+                                logger.error(
+                                    "Unexpected chunk format in response stream."
+                                )
+                    finally:
+                        # Stops Ollama when the user leaves the page mid-answer
+                        response_stream.cancel()
+                        coalescer.flush()
+                        response_text = coalescer.text
+
+                response_placeholder.markdown(response_text)
+                if prompt_report.get("error"):
+                    st.warning(prompt_report["error"])
+                if prompt_report.get("answer_cache") == "hit":
+                    st.caption(
+                        "Answered from the cache of similar questions"
+                        f" · {prompt_report['hit_rate']:.0%} hit rate"
+                    )
+                elif prompt_report:
+                    st.caption(
+                        f"Prompt: {prompt_report['used']} / {prompt_report['budget']} tokens"
+                        f" · {prompt_report['chunks_used']} chunks"
+                        f" ({prompt_report['chunks_truncated']} truncated,"
+                        f" {prompt_report['chunks_dropped']} dropped)"
+                        f" · {prompt_report['history_messages']} history messages"
+                        f" · {prompt_report['model']} ({prompt_report['route']})"
+                        + (
+                            f" · reranked {prompt_report['rerank_candidates']} hits"
+                            f" in {prompt_report['rerank_ms']:.0f} ms"
+                            if "rerank_ms" in prompt_report
+                            else ""
+                        )
+                    )
+                if prompt_report.get("timings"):
+                    with st.expander("Latency breakdown"):
+                        st.text(format_timings(prompt_report["timings"]))
+                        st.json(prompt_report["timings"])
+                logger.info("Response generated and displayed.")
+        finally:
+            # An interrupted answer is stored as far as it got; a request that
+            # never started answering is not stored, so no empty turn is sent
+            # to the model later
             if response_stream is not None:
-                for chunk in response_stream:
-                    if (
-                        isinstance(chunk, dict)
-                        and "message" in chunk
-                        and "content" in chunk["message"]
-                    ):
-                        response_text += chunk["message"]["content"]
-                        response_placeholder.markdown(response_text + "▌")
-                    else:
-                        logger.error("Unexpected chunk format in response stream.")
-
-            response_placeholder.markdown(response_text)
-            st.session_state["chat_history"].append(
-                {"role": "assistant", "content": response_text}
-            )
-            logger.info("Response generated and displayed.")
+                store.add_messages(
+                    session_id, [{"role": "assistant", "content": response_text}]
+                )
+                st.session_state["conversation"].add_turn(prompt, response_text)
 
 
 # Main execution
@@ -1,19 +1,20 @@
 import logging
 import os
-import time
 
 import streamlit as st
 from PyPDF2 import PdfReader
 
-from src.constants import OPENSEARCH_INDEX, TEXT_CHUNK_SIZE
-from src.embeddings import generate_embeddings, get_embedding_model
+from src.constants import EXPUNGE_AFTER_DELETE, OPENSEARCH_INDEX
+from src.embeddings import get_embedding_model
 from src.ingestion import (
-    bulk_index_documents,
     create_index,
-    delete_documents_by_document_name,
+    expunge_deleted_documents,
+    get_deletion_status,
+    start_document_deletion,
 )
+from src.ingestion_jobs import ACTIVE_JOB_STATES, get_ingestion_queue
 from src.opensearch import get_opensearch_client
-from src.utils import chunk_text, setup_logging
+from src.utils import setup_logging
 
 # Initialize logger
 setup_logging()  # Set up centralized logging configuration
@@ -102,6 +103,16 @@ def render_upload_page() -> None:
 
     # Initialize or clear the documents list in session state
     st.session_state["documents"] = []
+    if "deletion_tasks" not in st.session_state:
+        st.session_state["deletion_tasks"] = {}
+    queue = get_ingestion_queue()
+    if "ingestion_jobs" not in st.session_state:
+        # Follow the jobs left unfinished by an earlier session or app run
+        st.session_state["ingestion_jobs"] = {
+            job["job_id"]: job["document_name"]
+            for job in queue.list_jobs(statuses=ACTIVE_JOB_STATES)
+        }
+        st.session_state["submitted_uploads"] = set()
 
     # Query OpenSearch to get the list of unique document names
     query = {
@@ -133,6 +144,26 @@ def render_upload_page() -> None:
             f"The file '{st.session_state['deleted_file']}' was successfully deleted."
         )
         del st.session_state["deleted_file"]
+    if "ingested_files" in st.session_state:
+        st.success(
+            f"The file(s) '{st.session_state['ingested_files']}' were uploaded "
+            "and indexed successfully!"
+        )
+        del st.session_state["ingested_files"]
+
+    # Poll background ingestions without blocking the rest of the page
+    if st.session_state["ingestion_jobs"]:
+        render_ingestion_progress()
+
+    # Poll background deletions without blocking the rest of the page
+    if st.session_state["deletion_tasks"]:
+        render_deletion_progress()
+
+    # Optional collection used to scope retrieval to a group of documents
+    collection = st.text_input(
+        "Collection (optional)",
+        help="Documents in the same collection can be searched together in the chatbot.",
+    )
 
     # Allow users to upload PDF files
     uploaded_files = st.file_uploader(
@@ -140,41 +171,30 @@ def render_upload_page() -> None:
     )
 
     if uploaded_files:
-        with st.spinner("Uploading and processing documents. Please wait..."):
-            for uploaded_file in uploaded_files:
-                if uploaded_file.name in document_names:
-                    st.warning(
-                        f"The file '{uploaded_file.name}' already exists in the index."
-                    )
-                    continue
-
-                file_path = save_uploaded_file(uploaded_file)
-                reader = PdfReader(file_path)
-                text = "".join([page.extract_text() for page in reader.pages])
-                chunks = chunk_text(text, chunk_size=TEXT_CHUNK_SIZE, overlap=100)
-                embeddings = generate_embeddings(chunks)
-
-                documents_to_index = [
-                    {
-                        "doc_id": f"{uploaded_file.name}_{i}",
-                        "text": chunk,
-                        "embedding": embedding,
-                        "document_name": uploaded_file.name,
-                    }
-                    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
-                ]
-                bulk_index_documents(documents_to_index)
-                st.session_state["documents"].append(
-                    {
-                        "filename": uploaded_file.name,
-                        "content": text,
-                        "file_path": file_path,
-                    }
+        submitted = st.session_state["submitted_uploads"]
+        queued = []
+        for uploaded_file in uploaded_files:
+            # The uploader keeps its files across reruns; queue each one once
+            if uploaded_file.file_id in submitted:
+                continue
+            submitted.add(uploaded_file.file_id)
+            if uploaded_file.name in document_names:
+                st.warning(
+                    f"The file '{uploaded_file.name}' already exists in the index."
                 )
-                document_names.append(uploaded_file.name)
-                logger.info(f"File '{uploaded_file.name}' uploaded and indexed.")
+                continue
+
+            file_path = save_uploaded_file(uploaded_file)
+            job_id = queue.submit(
+                file_path,
+                uploaded_file.name,
+                collection=collection.strip() or None,
+            )
+            st.session_state["ingestion_jobs"][job_id] = uploaded_file.name
+            queued.append(uploaded_file.name)
 
-        st.success("Files uploaded and indexed successfully!")
+        if queued:
+            st.rerun()
 
     if st.session_state["documents"]:
         st.markdown("### Uploaded Documents")
@@ -186,6 +206,9 @@ def render_upload_page() -> None:
                         f"{idx}. {doc['filename']} - {len(doc['content'])} characters extracted"
                     )
                 with col2:
+                    if doc["filename"] in st.session_state["deletion_tasks"]:
+                        st.write("Deleting...")
+                        continue
                     delete_button = st.button(
                         "Delete",
                         key=f"delete_{doc['filename']}_{idx}",
@@ -205,13 +228,87 @@ def render_upload_page() -> None:
                                 logger.error(
                                     f"File '{doc['filename']}' not found during deletion."
                                 )
-                        delete_documents_by_document_name(doc["filename"])
-                        st.session_state["documents"].pop(idx - 1)
-                        st.session_state["deleted_file"] = doc["filename"]
-                        time.sleep(0.5)
+                        task_id = start_document_deletion(doc["filename"])
+                        st.session_state["deletion_tasks"][doc["filename"]] = task_id
                         st.rerun()
 
 
+@st.fragment(run_every=1)
+def render_deletion_progress() -> None:
+    """
+    Shows the progress of background document deletions, refreshing every second.
+    Triggers a full page rerun once a deletion has finished.
+    """
+    tasks = st.session_state["deletion_tasks"]
+    finished = []
+    for document_name, task_id in tasks.items():
+        status = get_deletion_status(task_id)
+        if status["completed"]:
+            finished.append(document_name)
+            continue
+        total = status["total"] or 1
+        st.progress(
+            min(status["deleted"] / total, 1.0),
+            text=f"Deleting '{document_name}': {status['deleted']}/{total} chunks",
+        )
+
+    if finished:
+        for document_name in finished:
+            del tasks[document_name]
+            logger.info(f"Background deletion of '{document_name}' finished.")
+        if EXPUNGE_AFTER_DELETE:
+            expunge_deleted_documents()
+        st.session_state["deleted_file"] = ", ".join(finished)
+        st.rerun()
+
+
+@st.fragment(run_every=1)
+def render_ingestion_progress() -> None:
+    """
+    Shows the progress of background document ingestions, refreshing every
+    second. Triggers a full page rerun once a document has been indexed.
+    """
+    queue = get_ingestion_queue()
+    jobs = st.session_state["ingestion_jobs"]
+    finished = []
+    for job_id, document_name in list(jobs.items()):
+        job = queue.get_job(job_id)
+        if job is None:
+            del jobs[job_id]
+            continue
+        if job["status"] == "done":
+            finished.append(job_id)
+        elif job["status"] == "failed":
+            col1, col2, col3 = st.columns([4, 1, 1])
+            with col1:
+                st.error(f"Processing '{document_name}' failed: {job['error']}")
+            with col2:
+                if st.button("Retry", key=f"retry_{job_id}"):
+                    queue.retry(job_id)
+                    st.rerun(scope="fragment")
+            with col3:
+                if st.button("Dismiss", key=f"dismiss_{job_id}"):
+                    queue.forget(job_id)
+                    del jobs[job_id]
+                    st.rerun(scope="fragment")
+        elif job["status"] == "queued":
+            retry_note = f", retrying after: {job['error']}" if job["error"] else ""
+            st.progress(0.0, text=f"'{document_name}' is waiting{retry_note}")
+        else:
+            st.progress(
+                min(job["progress"], 1.0),
+                text=f"Processing '{document_name}': {job['stage'] or 'starting'}",
+            )
+
+    if finished:
+        names = [jobs.pop(job_id) for job_id in finished]
+        for job_id, document_name in zip(finished, names):
+            queue.forget(job_id)
+            logger.info(f"Background ingestion of '{document_name}' finished.")
+        st.session_state["ingested_files"] = ", ".join(names)
+        st.rerun()
+
+
 def save_uploaded_file(uploaded_file) -> str:  # type: ignore
     """
     Saves an uploaded file to the local file system.
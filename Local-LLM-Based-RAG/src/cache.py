@@ -0,0 +1,514 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import streamlit as st
+
+from src.constants import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL_SECONDS,
+    SEARCH_CACHE_DIR,
+    SEARCH_CACHE_DISK_ENABLED,
+    SEARCH_CACHE_MAX_DISK_BYTES,
+    SEARCH_CACHE_MAX_MEMORY_ENTRIES,
+    SEARCH_CACHE_TTL_SECONDS,
+)
+from src.utils import setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+CACHE_DB_FILENAME = "search_cache.sqlite3"
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a connection to the cache database, creating the tables if needed.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+
+    Returns:
+        sqlite3.Connection: Open database connection.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS index_generations "
+        "(index_name TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS search_results ("
+        "cache_key TEXT PRIMARY KEY, index_name TEXT NOT NULL, "
+        "generation INTEGER NOT NULL, created_at REAL NOT NULL, "
+        "accessed_at REAL NOT NULL, size INTEGER NOT NULL, payload TEXT NOT NULL)"
+    )
+    return conn
+
+
+def get_cache_db_path() -> str:
+    """
+    Returns the path of the SQLite file backing the search cache.
+
+    Returns:
+        str: Path to the cache database.
+    """
+    return os.path.join(SEARCH_CACHE_DIR, CACHE_DB_FILENAME)
+
+
+def get_index_generation(index_name: str) -> int:
+    """
+    Reads the current generation counter of an index.
+
+    Args:
+        index_name (str): Name of the index.
+
+    Returns:
+        int: The generation counter, 0 if the index was never modified.
+    """
+    with closing(_connect(get_cache_db_path())) as conn:
+        row = conn.execute(
+            "SELECT generation FROM index_generations WHERE index_name = ?",
+            (index_name,),
+        ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_index_generation(index_name: str) -> int:
+    """
+    Increments the generation counter of an index so that cached search results
+    computed against its previous contents are no longer served.
+
+    Args:
+        index_name (str): Name of the index that was modified.
+
+    Returns:
+        int: The new generation counter.
+    """
+    with closing(_connect(get_cache_db_path())) as conn, conn:
+        conn.execute(
+            "INSERT INTO index_generations (index_name, generation) VALUES (?, 1) "
+            "ON CONFLICT(index_name) DO UPDATE SET generation = generation + 1",
+            (index_name,),
+        )
+        row = conn.execute(
+            "SELECT generation FROM index_generations WHERE index_name = ?",
+            (index_name,),
+        ).fetchone()
+    generation = int(row[0])
+    logger.info(f"Index {index_name} moved to generation {generation}.")
+    return generation
+
+
+def normalize_query(query_text: str) -> str:
+    """
+    Normalizes a query so that trivially different spellings share a cache entry.
+
+    Args:
+        query_text (str): The raw query text.
+
+    Returns:
+        str: Lower-cased query with collapsed whitespace.
+    """
+    return " ".join(query_text.lower().split())
+
+
+class SearchResultCache:
+    """
+    Two-tier (memory and disk) cache of hybrid search results.
+
+    Entries are tagged with the index generation they were computed against and
+    are ignored once the generation moves on, so results never outlive an
+    ingest or a delete.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: float,
+        max_memory_entries: int,
+        max_disk_bytes: int,
+        disk_enabled: bool = True,
+    ) -> None:
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_enabled = disk_enabled
+        self._memory: "OrderedDict[str, Tuple[int, float, List[Dict[str, Any]]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        query_text: str, top_k: int, index_name: str, fusion: Dict[str, Any]
+    ) -> str:
+        """
+        Builds the cache key for a search request.
+
+        Args:
+            query_text (str): The text query.
+            top_k (int): Number of results requested.
+            index_name (str): Index the search runs against.
+            fusion (Dict[str, Any]): Parameters that influence scoring and ranking.
+
+        Returns:
+            str: Hex digest identifying the request.
+        """
+        payload = json.dumps(
+            {
+                "query": normalize_query(query_text),
+                "top_k": top_k,
+                "index": index_name,
+                "fusion": fusion,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_fresh(self, generation: int, created_at: float, current: int) -> bool:
+        return generation == current and time.time() - created_at < self.ttl_seconds
+
+    def get(self, key: str, index_name: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Looks up cached hits for a key, checking the memory tier before the disk tier.
+
+        Args:
+            key (str): Cache key built with `make_key`.
+            index_name (str): Index the key belongs to.
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: Cached hits, or None on a miss.
+        """
+        current = get_index_generation(index_name)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                generation, created_at, hits = entry
+                if self._is_fresh(generation, created_at, current):
+                    self._memory.move_to_end(key)
+                    return hits
+                del self._memory[key]
+
+        if not self.disk_enabled:
+            return None
+
+        with closing(_connect(self.db_path)) as conn, conn:
+            row = conn.execute(
+                "SELECT generation, created_at, payload FROM search_results "
+                "WHERE cache_key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            generation, created_at, payload = row
+            if not self._is_fresh(generation, created_at, current):
+                conn.execute("DELETE FROM search_results WHERE cache_key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE search_results SET accessed_at = ? WHERE cache_key = ?",
+                (time.time(), key),
+            )
+
+        stored_hits: List[Dict[str, Any]] = json.loads(payload)
+        self._remember(key, generation, created_at, stored_hits)
+        return stored_hits
+
+    def put(
+        self, key: str, index_name: str, hits: List[Dict[str, Any]], generation: int
+    ) -> None:
+        """
+        Stores the hit IDs, scores and sources of a search response.
+
+        Args:
+            key (str): Cache key built with `make_key`.
+            index_name (str): Index the results came from.
+            hits (List[Dict[str, Any]]): Hits as returned by OpenSearch.
+            generation (int): Generation of the index read before the search ran,
+                so results of a search that overlapped a write are not tagged
+                with the generation that write moved the index to.
+        """
+        compact = [
+            {
+                "_id": hit.get("_id"),
+                "_score": hit.get("_score"),
+                "_source": {
+                    k: v for k, v in hit.get("_source", {}).items() if k != "embedding"
+                },
+            }
+            for hit in hits
+        ]
+        now = time.time()
+        self._remember(key, generation, now, compact)
+
+        if not self.disk_enabled:
+            return
+
+        payload = json.dumps(compact)
+        with closing(_connect(self.db_path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_results (cache_key, index_name, "
+                "generation, created_at, accessed_at, size, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, index_name, generation, now, now, len(payload), payload),
+            )
+            self._evict_disk(conn)
+
+    def clear(self) -> None:
+        """
+        Removes every cached result from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+        if self.disk_enabled:
+            with closing(_connect(self.db_path)) as conn, conn:
+                conn.execute("DELETE FROM search_results")
+        logger.info("Search result cache cleared.")
+
+    def _remember(
+        self, key: str, generation: int, created_at: float, hits: List[Dict[str, Any]]
+    ) -> None:
+        with self._lock:
+            self._memory[key] = (generation, created_at, hits)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self, conn: sqlite3.Connection) -> None:
+        # Drop expired rows and rows from superseded generations first
+        conn.execute(
+            "DELETE FROM search_results WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        conn.execute(
+            "DELETE FROM search_results WHERE generation < ("
+            "SELECT generation FROM index_generations "
+            "WHERE index_generations.index_name = search_results.index_name)"
+        )
+        # Then evict least recently used rows until the tier fits its size limit
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM search_results"
+        ).fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = conn.execute(
+            "SELECT cache_key, size FROM search_results ORDER BY accessed_at ASC"
+        ).fetchall()
+        evicted = []
+        for cache_key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            evicted.append((cache_key,))
+            total -= size
+        conn.executemany("DELETE FROM search_results WHERE cache_key = ?", evicted)
+        logger.info(f"Evicted {len(evicted)} entries from the on-disk search cache.")
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_cache() -> SearchResultCache:
+    """
+    Creates and caches the process-wide search result cache.
+
+    Returns:
+        SearchResultCache: The configured search result cache.
+    """
+    logger.info(f"Initializing search result cache in {SEARCH_CACHE_DIR}.")
+    return SearchResultCache(
+        db_path=get_cache_db_path(),
+        ttl_seconds=SEARCH_CACHE_TTL_SECONDS,
+        max_memory_entries=SEARCH_CACHE_MAX_MEMORY_ENTRIES,
+        max_disk_bytes=SEARCH_CACHE_MAX_DISK_BYTES,
+        disk_enabled=SEARCH_CACHE_DISK_ENABLED,
+    )
+
+
+class SemanticAnswerCache:
+    """
+    In-memory cache of generated answers, looked up by query similarity.
+
+    A query reuses the answer of the most similar cached query when their
+    embeddings have at least `threshold` cosine similarity, both were asked with
+    the same retrieval scope, and the index has not changed since the answer
+    was generated. Cached query embeddings are kept in one matrix, so a lookup
+    is a single matrix-vector product.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int) -> None:
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Row-aligned with the embedding matrix; a None entry is a free row
+        self._embeddings: Optional[np.ndarray[Any, Any]] = None
+        self._entries: List[Optional[Tuple[str, int, float, str]]] = []
+        self._accessed_at = np.zeros(max_entries)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_scope(
+        index_name: str,
+        top_k: int,
+        filters: Optional[Dict[str, List[str]]],
+        model: str,
+        reranker: Optional[str] = None,
+    ) -> str:
+        """
+        Builds the scope of an answer; only answers of the same scope are reused.
+
+        Args:
+            index_name (str): Index the context was retrieved from.
+            top_k (int): Number of chunks retrieved.
+            filters (Optional[Dict[str, List[str]]]): Retrieval filters.
+            model (str): Chat model that generated the answer.
+            reranker (Optional[str]): Reranker that chose the chunks, if any.
+
+        Returns:
+            str: Hex digest identifying the scope.
+        """
+        payload = json.dumps(
+            {
+                "index": index_name,
+                "top_k": top_k,
+                "filters": {k: sorted(v) for k, v in (filters or {}).items() if v},
+                "model": model,
+                "reranker": reranker,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray[Any, Any]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(
+        self, embedding: Sequence[float], scope: str, generation: int
+    ) -> Optional[str]:
+        """
+        Returns the answer of the most similar cached query, if similar enough.
+
+        Args:
+            embedding (Sequence[float]): Embedding of the new query.
+            scope (str): Scope built with `make_scope`.
+            generation (int): Current generation of the index.
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss.
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._embeddings is not None:
+                usable = np.array(
+                    [
+                        entry is not None
+                        and entry[0] == scope
+                        and entry[1] == generation
+                        and now - entry[2] < self.ttl_seconds
+                        for entry in self._entries
+                    ]
+                )
+                if usable.any():
+                    # Rows past the stored entries have not been filled yet
+                    filled = self._embeddings[: len(self._entries)]
+                    similarities = np.where(usable, filled @ query, -np.inf)
+                    row = int(np.argmax(similarities))
+                    entry = self._entries[row]
+                    if similarities[row] >= self.threshold and entry is not None:
+                        self.hits += 1
+                        self._accessed_at[row] = now
+                        logger.info(
+                            f"Answer cache hit (similarity {similarities[row]:.3f})."
+                        )
+                        return entry[3]
+            self.misses += 1
+        return None
+
+    def put(
+        self, embedding: Sequence[float], scope: str, generation: int, answer: str
+    ) -> None:
+        """
+        Stores an answer, evicting the least recently used one when full.
+
+        Args:
+            embedding (Sequence[float]): Embedding of the query.
+            scope (str): Scope built with `make_scope`.
+            generation (int): Index generation the answer was grounded on.
+            answer (str): The generated answer.
+        """
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros(
+                    (self.max_entries, len(vector)), dtype=np.float32
+                )
+            if len(self._entries) < self.max_entries:
+                row = len(self._entries)
+                self._entries.append(None)
+            else:
+                # Reuse a free or expired row before the least recently used one
+                free = [
+                    i
+                    for i, entry in enumerate(self._entries)
+                    if entry is None or now - entry[2] >= self.ttl_seconds
+                ]
+                row = free[0] if free else int(np.argmin(self._accessed_at))
+            self._embeddings[row] = vector
+            self._entries[row] = (scope, generation, now, answer)
+            self._accessed_at[row] = now
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the hit and miss counts of the cache.
+
+        Returns:
+            Dict[str, Any]: Hits, misses, hit rate and number of cached answers.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": sum(entry is not None for entry in self._entries),
+            }
+
+    def clear(self) -> None:
+        """
+        Removes every cached answer.
+        """
+        with self._lock:
+            self._entries = [None] * len(self._entries)
+        logger.info("Answer cache cleared.")
+
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache() -> SemanticAnswerCache:
+    """
+    Creates and caches the process-wide semantic answer cache.
+
+    Returns:
+        SemanticAnswerCache: The configured answer cache.
+    """
+    return SemanticAnswerCache(
+        threshold=ANSWER_CACHE_SIMILARITY,
+        ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    )
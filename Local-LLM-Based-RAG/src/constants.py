@@ -2,10 +2,85 @@ EMBEDDING_MODEL_PATH = "sentence-transformers/all-mpnet-base-v2"  # OR Path of l
 ASSYMETRIC_EMBEDDING = False  # Flag for asymmetric embedding
 EMBEDDING_DIMENSION = 768  # Embedding model settings
 TEXT_CHUNK_SIZE = 300  # Maximum number of characters in each text chunk for
+TEXT_CHUNK_OVERLAP = 100  # Number of tokens shared by consecutive text chunks
 
 OLLAMA_MODEL_NAME = (
     "llama3.2:1b"  # Name of the model used in Ollama for chat functionality
 )
+OLLAMA_NUM_CTX = 4096  # Context window (tokens) requested from Ollama for chat
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps the chat model and its KV cache loaded between turns
+OLLAMA_LARGE_MODEL_NAME = "llama3.2:3b"  # Larger chat model used for the queries routed away from OLLAMA_MODEL_NAME
+MODEL_ROUTING_ENABLED = False  # Route each query to OLLAMA_MODEL_NAME or OLLAMA_LARGE_MODEL_NAME; Ollama must keep both loaded (OLLAMA_MAX_LOADED_MODELS >= 2)
+ROUTE_SHORT_QUERY_WORDS = 16  # Queries with more words than this go to the large model
+ROUTE_MIN_RETRIEVAL_SCORE = 0.9  # Best hybrid search score (0-1, agreement of BM25 and kNN) needed to answer from context with the small model
+MODEL_AVAILABILITY_TTL_SECONDS = 24 * 3600  # Seconds the cached list of pulled Ollama models is trusted before Ollama is asked again
+MODEL_STATUS_REFRESH_SECONDS = 10  # Minimum interval between checks of which models Ollama has in memory
+OLLAMA_MAX_CONCURRENT_GENERATIONS = 1  # Generations sent to Ollama at once; match the server's OLLAMA_NUM_PARALLEL
+GENERATION_QUEUE_MAX = 32  # Requests allowed to wait for the model; further requests are rejected
+GENERATION_QUEUE_TIMEOUT_SECONDS = 120  # Requests waiting longer than this for the model are rejected
+TOKENIZER_PATH = "unsloth/Llama-3.2-1B-Instruct"  # Tokenizer of the chat model (HF name or local path) used to budget prompts; an ungated copy of meta-llama/Llama-3.2-1B-Instruct, which needs an approved Hugging Face token
+RESPONSE_TOKEN_RESERVE = 512  # Tokens of the context window kept free for the response
+HISTORY_TOKEN_SHARE = 0.25  # Maximum share of the prompt budget used by conversation history
+MIN_CHUNK_TOKENS = 64  # Retrieved chunks are truncated down to this size before being dropped
+CHAT_METRICS_ENABLED = True  # Append per-stage timings of every chat turn to CHAT_METRICS_PATH
+CHAT_METRICS_PATH = "logs/chat_metrics.jsonl"  # JSON lines file of chat turn timings
+CONTEXT_ASSEMBLY_ENABLED = True  # Merge adjacent chunks of a document and drop near-duplicate passages before prompting
+CONTEXT_MMR_LAMBDA = 0.7  # MMR trade-off between relevance (1.0) and diversity (0.0) of context passages
+CONTEXT_DUPLICATE_SIMILARITY = 0.9  # Passages at least this similar to an already chosen passage are dropped
+RERANK_ENABLED = False  # Rerank over-fetched hits with a cross-encoder before building the prompt
+RERANKER_MODEL_PATH = "BAAI/bge-reranker-base"  # Cross-encoder used for reranking (HF name or local path)
+RERANK_CANDIDATES = 20  # Hits fetched from hybrid search for the reranker to choose from
+RERANK_BATCH_SIZE = 32  # (query, chunk) pairs scored per cross-encoder forward pass
+RERANK_DEVICE = "cpu"  # Device the cross-encoder runs on
+RERANK_SCORE_CACHE_SIZE = 4096  # (query, chunk) scores kept in memory for repeated queries
+HISTORY_VERBATIM_TURNS = 3  # Most recent conversation turns sent verbatim; older turns are summarized
+HISTORY_SUMMARY_BATCH_TURNS = 3  # Turns collected beyond the verbatim ones before they are folded into the summary
+HISTORY_SUMMARY_MAX_TOKENS = 256  # Token ceiling of the running conversation summary
+STREAM_RENDER_FPS = 10  # Maximum screen updates per second while an answer streams; 0 renders every token
+STREAM_RENDER_MAX_PENDING_CHARS = 400  # Streamed characters that trigger an update before the next frame is due
+SESSION_STORE_PATH = "sessions/chat_sessions.sqlite3"  # SQLite file holding the chat conversations of the app and the CLI
+SESSION_RENDER_MESSAGES = 40  # Most recent messages shown with a conversation; older ones are loaded on demand
+SESSION_LIST_LIMIT = 20  # Recent conversations offered for resuming
+
+# Background document ingestion
+INGESTION_JOBS_PATH = "jobs/ingestion_jobs.sqlite3"  # SQLite file holding the queue of documents waiting to be ingested
+INGESTION_WORKERS = 2  # Documents extracted, embedded and indexed at the same time per process
+INGESTION_MAX_ATTEMPTS = 3  # Attempts made at ingesting a document before its job is marked as failed
+INGESTION_RETRY_BACKOFF_SECONDS = 5  # Delay before the first retry of a failed job, doubled after each attempt
+INGESTION_JOB_LEASE_SECONDS = 120  # Running jobs whose worker stops renewing their lease for this long are taken over, e.g. after a crash
+INGESTION_POLL_SECONDS = 2  # Interval at which idle workers look for jobs queued by other processes
+INGESTION_EMBED_BATCH_SIZE = 32  # Chunks embedded per forward pass of the model, and between two progress updates
+UPLOAD_WORKERS = 4  # Processes extracting text (with OCR) from PDFs during `rag upload`
+UPLOAD_EMBED_BATCH_SIZE = 64  # Chunks of several files embedded together per forward pass during `rag upload`
+UPLOAD_CHECKPOINT_FILE = ".upload_checkpoint.jsonl"  # File in uploaded_files/ recording the files `rag upload` has finished, to resume an interrupted run
+
+# Retrieval backend
+RETRIEVAL_BACKEND = "opensearch"  # "opensearch" or "local" for the in-process vector + BM25 engine
+LOCAL_INDEX_DIR = "local_index"  # Directory where the local backend persists its indexes
+LOCAL_VECTOR_SEARCH = "exact"  # "exact" brute-force kNN or "ivf" approximate kNN for the local backend
+LOCAL_IVF_NPROBE = 8  # Number of IVF lists scanned per query when LOCAL_VECTOR_SEARCH is "ivf"
+LOCAL_COMPACT_DEAD_RATIO = 0.25  # Share of deleted or replaced rows at which the local backend rewrites its files without them
+
+# Search result cache
+SEARCH_CACHE_ENABLED = True  # Cache hybrid search results per (query, top_k, index, fusion params)
+SEARCH_CACHE_DIR = "cache"  # Directory holding the on-disk cache and index generation counters
+SEARCH_CACHE_TTL_SECONDS = 3600  # Seconds before a cached search result expires
+SEARCH_CACHE_MAX_MEMORY_ENTRIES = 256  # Maximum number of results kept in the in-memory tier
+SEARCH_CACHE_DISK_ENABLED = True  # Persist cached results to disk so they survive restarts
+SEARCH_CACHE_MAX_DISK_BYTES = 50 * 1024 * 1024  # Size limit of the on-disk tier
+
+# Semantic answer cache
+ANSWER_CACHE_ENABLED = True  # Reuse the answer of a near-identical earlier question (RAG mode, no conversation history)
+ANSWER_CACHE_SIMILARITY = 0.95  # Minimum cosine similarity between query embeddings to reuse an answer
+ANSWER_CACHE_TTL_SECONDS = 3600  # Seconds before a cached answer expires
+ANSWER_CACHE_MAX_ENTRIES = 1024  # Maximum number of cached answers; the least recently used is evicted
+
+# Index maintenance
+WARMUP_ON_STARTUP = True  # Load the kNN graphs into memory when the app or CLI starts searching
+FORCE_MERGE_MAX_SEGMENTS = 1  # Target segment count of `rag manage optimize`
+CAPACITY_GROWTH_FACTORS = (2, 5, 10)  # Corpus growth factors projected by `rag manage stats`
+STATS_SAMPLE_SIZE = 200  # Chunks sampled by `rag manage stats` for chunk lengths
+STATS_LATENCY_QUERIES = 20  # kNN queries timed by `rag manage stats`
 
 ####################################################################################################
 # Dont change the following settings
@@ -16,4 +91,16 @@ LOG_FILE_PATH = "logs/app.log"  # File path for the application log file
 # OpenSearch settings
 OPENSEARCH_HOST = "localhost"  # Hostname for the OpenSearch instance
 OPENSEARCH_PORT = 9200  # Port number for OpenSearch
-OPENSEARCH_INDEX = "documents"  # Index name for storing documents in OpenSearch
+OPENSEARCH_INDEX = "documents"  # Alias searched by the app, pointing at the live documents_vN index
+HYBRID_SEARCH_PIPELINE = "nlp-search-pipeline"  # Search pipeline that normalizes and combines scores
+HYBRID_SEARCH_WEIGHTS = (0.3, 0.7)  # (BM25, kNN) weights configured in the search pipeline
+FILTERABLE_FIELDS = ("document_name", "collection", "tenant")  # Keyword fields usable as search filters
+MSEARCH_PAGE_SIZE = 32  # Number of queries sent per _msearch request by hybrid_search_many
+DELETE_REQUESTS_PER_SECOND = 500  # Throttle for background document deletions (None for unthrottled)
+DELETE_SLICES = "auto"  # Parallel slices for background document deletions
+EXPUNGE_AFTER_DELETE = False  # Force-merge deleted chunks away after a deletion to reclaim kNN memory
+TASK_POLL_SECONDS = 2  # Interval between progress checks of background OpenSearch tasks
+REINDEX_CATCHUP_PASSES = 3  # Passes copying documents changed during an index build before its alias is swapped
+SNAPSHOT_SLICES = 4  # Parallel sliced scrolls used to export an index snapshot
+SNAPSHOT_SHARD_ROWS = 10000  # Maximum number of chunks per snapshot shard file
+SNAPSHOT_IMPORT_THREADS = 4  # Threads sending bulk requests when importing a snapshot
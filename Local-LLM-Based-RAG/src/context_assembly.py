@@ -0,0 +1,177 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.constants import (
+    ASSYMETRIC_EMBEDDING,
+    CONTEXT_DUPLICATE_SIMILARITY,
+    CONTEXT_MMR_LAMBDA,
+)
+from src.embeddings import get_embedding_model
+from src.utils import merge_chunks, setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def hit_position(hit: Dict[str, Any]) -> Optional[int]:
+    """
+    Returns the position of a chunk in its document, from its "<name>_<i>" ID.
+
+    Args:
+        hit (Dict[str, Any]): A search hit.
+
+    Returns:
+        Optional[int]: The chunk index, or None if the ID does not carry one.
+    """
+    suffix = str(hit.get("_id", "")).rsplit("_", 1)[-1]
+    return int(suffix) if suffix.isdigit() else None
+
+
+def merge_adjacent_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merges hits that are overlapping or adjacent chunks of the same document
+    into single spans, with each overlap included once.
+
+    Args:
+        hits (List[Dict[str, Any]]): Search hits, best ranked first.
+
+    Returns:
+        List[Dict[str, Any]]: Spans with their 'document_name', chunk
+            'positions', merged 'text', the 'rank' of their best hit and the
+            stored 'embedding' of a span made of a single chunk, or None,
+            ordered by that rank.
+    """
+    spans: List[Dict[str, Any]] = []
+    runs: Dict[str, List[Dict[str, Any]]] = {}
+    for rank, hit in enumerate(hits):
+        text = hit["_source"]["text"].removeprefix("passage: ")
+        span = {
+            "document_name": hit["_source"].get("document_name"),
+            "positions": [hit_position(hit)],
+            "chunks": [text],
+            "rank": rank,
+            "embedding": hit["_source"].get("embedding"),
+        }
+        if span["positions"][0] is None:
+            spans.append(span)
+        else:
+            runs.setdefault(span["document_name"], []).append(span)
+
+    for document_spans in runs.values():
+        document_spans.sort(key=lambda span: span["positions"][0])
+        current = document_spans[0]
+        for span in document_spans[1:]:
+            if span["positions"][0] - current["positions"][-1] <= 1:
+                if span["positions"][0] != current["positions"][-1]:
+                    current["positions"].append(span["positions"][0])
+                    current["chunks"].append(span["chunks"][0])
+                    # The merged text no longer matches any stored embedding
+                    current["embedding"] = None
+                current["rank"] = min(current["rank"], span["rank"])
+            else:
+                spans.append(current)
+                current = span
+        spans.append(current)
+
+    for span in spans:
+        span["text"] = merge_chunks(span.pop("chunks"))
+    spans.sort(key=lambda span: span["rank"])
+    return spans
+
+
+def mmr_order(
+    query_embedding: Sequence[float],
+    embeddings: np.ndarray[Any, Any],
+    lambda_: float = CONTEXT_MMR_LAMBDA,
+    duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY,
+) -> List[int]:
+    """
+    Orders candidates by maximal marginal relevance and drops near duplicates.
+
+    Each step picks the candidate maximizing
+    `lambda_ * sim(query, c) - (1 - lambda_) * max sim(c, selected)`. Candidates
+    at least `duplicate_similarity` similar to a selected one are dropped.
+
+    Args:
+        query_embedding (Sequence[float]): Embedding of the query.
+        embeddings (np.ndarray[Any, Any]): One candidate embedding per row.
+        lambda_ (float, optional): Relevance (1.0) versus diversity (0.0).
+        duplicate_similarity (float, optional): Cosine similarity from which a
+            candidate counts as redundant.
+
+    Returns:
+        List[int]: Indices of the kept candidates, in MMR order.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    remaining = np.ones(len(vectors), dtype=bool)
+    selected: List[int] = []
+    while remaining.any():
+        scores = np.where(
+            remaining, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf
+        )
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        remaining &= redundancy < duplicate_similarity
+    return selected
+
+
+def assemble_context(
+    query_embedding: Sequence[float],
+    hits: List[Dict[str, Any]],
+    report: Optional[Dict[str, Any]] = None,
+) -> List[str]:
+    """
+    Turns retrieved hits into context passages without repeated text.
+
+    Overlapping or adjacent chunks of a document are merged into one span, then
+    spans are ordered by MMR and near-duplicate spans are dropped. Spans of a
+    single chunk reuse the embedding returned with their hit; only merged spans,
+    and hits returned without an embedding, are encoded.
+
+    Args:
+        query_embedding (Sequence[float]): Embedding of the query.
+        hits (List[Dict[str, Any]]): Search hits, best ranked first.
+        report (Optional[Dict[str, Any]]): When given, filled with the number of
+            hits, of merged spans and of spans dropped as duplicates.
+
+    Returns:
+        List[str]: Passage texts, most useful first.
+    """
+    spans = merge_adjacent_hits(hits)
+    order = list(range(len(spans)))
+    missing: List[int] = []
+    if len(spans) > 1:
+        missing = [i for i, span in enumerate(spans) if span["embedding"] is None]
+        if missing:
+            prefix = "passage: " if ASSYMETRIC_EMBEDDING else ""
+            encoded = get_embedding_model().encode(
+                [f"{prefix}{spans[i]['text']}" for i in missing]
+            )
+            for i, embedding in zip(missing, encoded):
+                spans[i]["embedding"] = embedding
+        embeddings = np.array([span["embedding"] for span in spans], dtype=np.float32)
+        order = mmr_order(query_embedding, embeddings)
+
+    logger.info(
+        f"Assembled {len(hits)} hits into {len(spans)} spans, "
+        f"{len(spans) - len(order)} dropped as duplicates, "
+        f"{len(missing)} encoded."
+    )
+    if report is not None:
+        report["context_hits"] = len(hits)
+        report["context_spans"] = len(spans)
+        report["context_duplicates"] = len(spans) - len(order)
+    return [spans[i]["text"] for i in order]
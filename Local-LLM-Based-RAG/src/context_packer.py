@@ -0,0 +1,184 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import streamlit as st
+
+from src.constants import (
+    HISTORY_TOKEN_SHARE,
+    MIN_CHUNK_TOKENS,
+    OLLAMA_NUM_CTX,
+    RESPONSE_TOKEN_RESERVE,
+    TOKENIZER_PATH,
+)
+from src.utils import setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Rough characters per token used when the model's tokenizer is unavailable
+CHARS_PER_TOKEN = 4
+# Tokens the chat template adds around each message
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+@st.cache_resource(show_spinner=False)
+def get_tokenizer() -> Optional[Any]:
+    """
+    Loads and caches the tokenizer of the chat model.
+
+    Returns:
+        Optional[Any]: The Hugging Face tokenizer, or None if it cannot be loaded,
+            in which case token counts are estimated from the text length.
+    """
+    try:
+        from transformers import AutoTokenizer
+
+        logger.info(f"Loading tokenizer from path: {TOKENIZER_PATH}")
+        return AutoTokenizer.from_pretrained(TOKENIZER_PATH)
+    except (ImportError, OSError, ValueError) as e:
+        logger.warning(
+            f"Tokenizer {TOKENIZER_PATH} unavailable ({e}); estimating token counts "
+            f"as {CHARS_PER_TOKEN} characters per token."
+        )
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of a text with the chat model's tokenizer.
+
+    Args:
+        text (str): The text to count.
+
+    Returns:
+        int: Number of tokens.
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """
+    Cuts a text down to its first, or last, `max_tokens` tokens.
+
+    Args:
+        text (str): The text to truncate.
+        max_tokens (int): Maximum number of tokens to keep.
+        keep_end (bool, optional): Keep the last tokens instead of the first.
+
+    Returns:
+        str: The truncated text.
+    """
+    max_tokens = max(0, max_tokens)
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        return text[len(text) - max_chars :] if keep_end else text[:max_chars]
+    tokens = tokenizer.encode(text, add_special_tokens=False)
+    tokens = tokens[len(tokens) - max_tokens :] if keep_end else tokens[:max_tokens]
+    truncated: str = tokenizer.decode(tokens)
+    return truncated
+
+
+def get_prompt_token_budget() -> int:
+    """
+    Returns the number of prompt tokens that fit in the model's context window
+    while leaving room for the response.
+
+    Returns:
+        int: The prompt token budget.
+    """
+    return OLLAMA_NUM_CTX - RESPONSE_TOKEN_RESERVE
+
+
+def pack_context(
+    fixed_text: str,
+    history: List[Dict[str, str]],
+    chunks: List[str],
+    budget: Optional[int] = None,
+    history_share: float = HISTORY_TOKEN_SHARE,
+) -> Tuple[List[Dict[str, str]], List[str], Dict[str, Any]]:
+    """
+    Fits conversation history and retrieved chunks into a prompt token budget.
+
+    The fixed text (instructions and query) is always kept. History gets up to
+    `history_share` of the remaining budget, its system messages (the running
+    conversation summary) first and then the newest messages, and the
+    retrieved chunks get the rest in rank order. A chunk that does not fit is
+    truncated if at least MIN_CHUNK_TOKENS remain, otherwise it and every
+    lower-ranked chunk are dropped.
+
+    Args:
+        fixed_text (str): Prompt text included regardless of the budget.
+        history (List[Dict[str, str]]): Conversation messages, oldest first.
+        chunks (List[str]): Formatted retrieved chunks, best ranked first.
+        budget (Optional[int]): Prompt token budget. Defaults to the context
+            window minus RESPONSE_TOKEN_RESERVE.
+        history_share (float, optional): Maximum share of the budget left after
+            the fixed text that history may use.
+
+    Returns:
+        Tuple[List[Dict[str, str]], List[str], Dict[str, Any]]: The kept history
+            (oldest first), the kept chunks and a report of tokens used per part
+            against the budget.
+    """
+    budget = get_prompt_token_budget() if budget is None else budget
+    fixed_tokens = count_tokens(fixed_text)
+    available = max(0, budget - fixed_tokens)
+
+    # Keep the conversation summary, then the most recent messages that fit in
+    # the history share
+    history_budget = int(available * history_share)
+    history_tokens = 0
+    kept_summary: List[Dict[str, str]] = []
+    for message in history:
+        if message["role"] == "system":
+            tokens = count_tokens(message["content"]) + MESSAGE_TOKEN_OVERHEAD
+            if history_tokens + tokens <= history_budget:
+                kept_summary.append(message)
+                history_tokens += tokens
+    kept_history: List[Dict[str, str]] = []
+    for message in reversed(history):
+        if message["role"] == "system":
+            continue
+        tokens = count_tokens(message["content"]) + MESSAGE_TOKEN_OVERHEAD
+        if history_tokens + tokens > history_budget:
+            break
+        kept_history.insert(0, message)
+        history_tokens += tokens
+    kept_history = kept_summary + kept_history
+
+    # Chunks get everything history did not use
+    remaining = available - history_tokens
+    context_tokens = 0
+    kept_chunks: List[str] = []
+    truncated = 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk)
+        if tokens > remaining:
+            if remaining < MIN_CHUNK_TOKENS:
+                break
+            chunk = truncate_to_tokens(chunk, remaining)
+            tokens = count_tokens(chunk)
+            truncated += 1
+        kept_chunks.append(chunk)
+        context_tokens += tokens
+        remaining -= tokens
+
+    report = {
+        "budget": budget,
+        "used": fixed_tokens + history_tokens + context_tokens,
+        "fixed_tokens": fixed_tokens,
+        "history_tokens": history_tokens,
+        "context_tokens": context_tokens,
+        "history_messages": len(kept_history),
+        "history_dropped": len(history) - len(kept_history),
+        "chunks_used": len(kept_chunks),
+        "chunks_truncated": truncated,
+        "chunks_dropped": len(chunks) - len(kept_chunks),
+    }
+    logger.info(f"Packed prompt: {report}")
+    return kept_history, kept_chunks, report
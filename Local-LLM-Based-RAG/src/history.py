@@ -0,0 +1,241 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import ollama
+
+from src.constants import (
+    HISTORY_SUMMARY_BATCH_TURNS,
+    HISTORY_SUMMARY_MAX_TOKENS,
+    HISTORY_VERBATIM_TURNS,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MODEL_NAME,
+    OLLAMA_NUM_CTX,
+)
+from src.context_packer import (
+    count_tokens,
+    get_prompt_token_budget,
+    truncate_to_tokens,
+)
+from src.scheduler import get_generation_scheduler
+from src.utils import setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an "
+    "assistant. Update the summary with the new turns. Keep facts, names, "
+    "numbers, decisions and open questions; drop greetings and repetition. "
+    "Reply with the updated summary only."
+)
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+# Summaries of all conversations share one place in the model's queue
+SUMMARY_SESSION_ID = "conversation-summary"
+
+# Summaries of every conversation are generated one at a time, off the chat path
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+
+
+def summarize_turns(
+    summary: str,
+    turns: List[Dict[str, str]],
+    max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS,
+) -> str:
+    """
+    Folds conversation turns into a running summary with the chat model.
+
+    When the turns do not fit the prompt, the oldest are cut, since the newest
+    ones are about to leave the verbatim history. The request waits for the
+    model at low priority, so it never delays a user's question.
+
+    Args:
+        summary (str): The current summary, empty for the first update.
+        turns (List[Dict[str, str]]): Messages to fold in, oldest first.
+        max_tokens (int, optional): Token ceiling of the updated summary.
+
+    Returns:
+        str: The updated summary.
+    """
+    transcript = "\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+        for msg in turns
+    )
+    content = f"Summary so far:\n{summary}\n\n" if summary else ""
+    content += "New conversation turns:\n"
+    transcript = truncate_to_tokens(
+        transcript,
+        get_prompt_token_budget() - max_tokens - count_tokens(content),
+        keep_end=True,
+    )
+
+    with get_generation_scheduler().slot(SUMMARY_SESSION_ID, low_priority=True):
+        response = ollama.chat(
+            model=OLLAMA_MODEL_NAME,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": content + transcript},
+            ],
+            options={
+                "temperature": 0,
+                "num_ctx": OLLAMA_NUM_CTX,
+                "num_predict": max_tokens,
+            },
+            keep_alive=OLLAMA_KEEP_ALIVE,
+        )
+    return truncate_to_tokens(response["message"]["content"].strip(), max_tokens)
+
+
+class ConversationHistory:
+    """
+    Conversation history that keeps the most recent turns verbatim and folds
+    older turns into a running summary.
+
+    The summary is updated by a background thread after a response is complete,
+    so it never delays the next answer. Turns are folded in batches so that the
+    summary, and with it the KV-cache prefix, only changes every few turns.
+    Until an update finishes, the turns it covers are still sent verbatim.
+    Summarized turns are dropped from memory, so a long conversation costs no
+    more than a short one.
+    """
+
+    def __init__(
+        self,
+        verbatim_turns: int = HISTORY_VERBATIM_TURNS,
+        batch_turns: int = HISTORY_SUMMARY_BATCH_TURNS,
+        summary_max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS,
+        on_summary: Optional[Callable[[str, int], None]] = None,
+    ) -> None:
+        """
+        Args:
+            verbatim_turns (int, optional): Most recent turns never summarized.
+            batch_turns (int, optional): Turns collected beyond the verbatim ones
+                before they are folded into the summary.
+            summary_max_tokens (int, optional): Token ceiling of the summary.
+            on_summary (Optional[Callable[[str, int], None]]): Called with the
+                summary and the number of messages it covers after each
+                update, e.g. to persist it.
+        """
+        self.verbatim_turns = verbatim_turns
+        self.batch_turns = batch_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.on_summary = on_summary
+        # Messages not covered by the summary yet, oldest first
+        self.messages: List[Dict[str, str]] = []
+        self.summary = ""
+        # Number of messages of the conversation folded into the summary
+        self.summarized = 0
+        self._generation = 0
+        self._pending: Optional[Future[None]] = None
+        self._lock = threading.Lock()
+
+    def add_turn(self, query: str, response: str) -> None:
+        """
+        Records a completed turn and schedules a summary update if enough turns
+        have accumulated.
+
+        Args:
+            query (str): The user's message.
+            response (str): The assistant's answer.
+        """
+        with self._lock:
+            self.messages.append({"role": "user", "content": query})
+            self.messages.append({"role": "assistant", "content": response})
+            self._schedule_summary()
+
+    def restore(
+        self, summary: str, summarized: int, messages: List[Dict[str, str]]
+    ) -> None:
+        """
+        Continues a stored conversation; a summary update in flight is discarded.
+
+        Args:
+            summary (str): The stored summary.
+            summarized (int): Number of messages covered by the summary.
+            messages (List[Dict[str, str]]): The messages after those, oldest first.
+        """
+        with self._lock:
+            self.messages = [
+                {"role": msg["role"], "content": msg["content"]} for msg in messages
+            ]
+            self.summary = summary
+            self.summarized = summarized
+            self._generation += 1
+            self._pending = None
+            self._schedule_summary()
+
+    def prompt_messages(self) -> List[Dict[str, str]]:
+        """
+        Returns the history to send with the next query: the summary as a
+        system message, followed by the turns it does not cover yet.
+
+        Returns:
+            List[Dict[str, str]]: Chat messages, oldest first.
+        """
+        with self._lock:
+            messages = list(self.messages)
+            if self.summary:
+                messages.insert(
+                    0, {"role": "system", "content": SUMMARY_HEADER + self.summary}
+                )
+        return messages
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Blocks until the pending summary update, if any, has finished.
+
+        Args:
+            timeout (Optional[float]): Maximum number of seconds to wait.
+        """
+        pending = self._pending
+        if pending is not None:
+            pending.result(timeout=timeout)
+
+    def clear(self) -> None:
+        """Forgets the conversation; a summary update in flight is discarded."""
+        with self._lock:
+            self.messages = []
+            self.summary = ""
+            self.summarized = 0
+            self._generation += 1
+
+    def _schedule_summary(self) -> None:
+        # Called with the lock held
+        if self._pending is not None and not self._pending.done():
+            # The running update reschedules itself when it finishes
+            return
+        if len(self.messages) // 2 <= self.verbatim_turns + self.batch_turns:
+            return
+        end = len(self.messages) - 2 * self.verbatim_turns
+        self._pending = _summary_executor.submit(
+            self._update_summary,
+            self.summary,
+            self.messages[:end],
+            end,
+            self._generation,
+        )
+
+    def _update_summary(
+        self, summary: str, turns: List[Dict[str, str]], end: int, generation: int
+    ) -> None:
+        try:
+            summary = summarize_turns(summary, turns, self.summary_max_tokens)
+        except Exception as e:
+            # The turns stay verbatim; the token budget still bounds the prompt
+            logger.warning(f"Conversation summary update failed: {e}")
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            # Only appends happened since the update was scheduled
+            del self.messages[:end]
+            self.summary = summary
+            self.summarized += end
+            summarized = self.summarized
+            logger.info(f"Folded {len(turns)} messages into the conversation summary.")
+            self._pending = None
+            self._schedule_summary()
+        if self.on_summary is not None:
+            self.on_summary(summary, summarized)
@@ -0,0 +1,276 @@
+import logging
+import math
+import re
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from opensearchpy import OpenSearch
+
+from src.constants import (
+    OPENSEARCH_INDEX,
+    RETRIEVAL_BACKEND,
+    STATS_LATENCY_QUERIES,
+    STATS_SAMPLE_SIZE,
+)
+from src.opensearch import get_knn_graph_memory, get_segment_count
+from src.utils import setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# faiss HNSW defaults used when the mapping does not set them
+DEFAULT_HNSW_M = 16
+# Overhead factor of the k-NN plugin's memory estimate for faiss HNSW graphs
+HNSW_MEMORY_OVERHEAD = 1.1
+
+_SIZE_UNITS = {"b": 1, "kb": 1024, "mb": 1024**2, "gb": 1024**3, "tb": 1024**4}
+
+
+def estimate_knn_memory_bytes(
+    num_vectors: int, dimension: int, method: Dict[str, Any]
+) -> float:
+    """
+    Estimates the native memory of the faiss HNSW graphs of an index, using the
+    k-NN plugin's sizing formula: 1.1 * (vector bytes + 8 * m) per vector.
+
+    Args:
+        num_vectors (int): Number of indexed vectors.
+        dimension (int): Vector dimension.
+        method (Dict[str, Any]): The `method` of the knn_vector mapping.
+
+    Returns:
+        float: Estimated graph memory in bytes.
+    """
+    parameters = method.get("parameters", {})
+    m = parameters.get("m", DEFAULT_HNSW_M)
+    encoder = parameters.get("encoder", {})
+    encoder_parameters = encoder.get("parameters", {})
+    if encoder.get("name") == "sq":
+        # fp16 scalar quantization halves the vector storage
+        vector_bytes = 2 * dimension
+    elif encoder.get("name") == "pq":
+        code_size = encoder_parameters.get("code_size", 8)
+        vector_bytes = encoder_parameters.get("m", 1) * code_size / 8
+    else:
+        vector_bytes = 4 * dimension
+    return float(HNSW_MEMORY_OVERHEAD * (vector_bytes + 8 * m) * num_vectors)
+
+
+def parse_byte_size(value: str) -> float:
+    """
+    Parses an OpenSearch byte size such as "512mb" or "1.5gb".
+
+    Args:
+        value (str): The byte size setting.
+
+    Returns:
+        float: Size in bytes.
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kmgt]?b)?\s*", value.lower())
+    if match is None:
+        raise ValueError(f"Cannot parse byte size '{value}'.")
+    return float(match.group(1)) * _SIZE_UNITS[match.group(2) or "b"]
+
+
+def get_knn_circuit_breaker_bytes(client: OpenSearch) -> Optional[float]:
+    """
+    Computes the native memory limit of the k-NN circuit breaker on the
+    smallest node.
+
+    OpenSearch enforces the limit on each node separately, and a percentage
+    limit applies to each node's memory outside the JVM heap, so the breaker
+    trips first on the node with the lowest limit.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+
+    Returns:
+        Optional[float]: The lowest limit of any node in bytes, or None if unknown.
+    """
+    settings = client.cluster.get_settings(include_defaults=True, flat_settings=True)
+    limit = None
+    for scope in ("transient", "persistent", "defaults"):
+        limit = limit or settings.get(scope, {}).get("knn.memory.circuit_breaker.limit")
+    if limit is None:
+        return None
+
+    if not limit.endswith("%"):
+        return parse_byte_size(limit)
+    nodes = client.nodes.stats(metric="os,jvm")["nodes"].values()
+    limits = [
+        (node["os"]["mem"]["total_in_bytes"] - node["jvm"]["mem"]["heap_max_in_bytes"])
+        * float(limit[:-1])
+        / 100
+        for node in nodes
+    ]
+    return min(limits) if limits else None
+
+
+def _cache_hit_rate(cache: Dict[str, Any]) -> Optional[float]:
+    hits = cache.get("hit_count", 0)
+    lookups = hits + cache.get("miss_count", 0)
+    return hits / lookups if lookups else None
+
+
+def measure_knn_latency(
+    client: OpenSearch,
+    index_name: str,
+    vectors: Sequence[List[float]],
+    top_k: int = 5,
+) -> Optional[float]:
+    """
+    Measures the median latency of kNN queries for the given vectors.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str): Index to query.
+        vectors (Sequence[List[float]]): Query vectors.
+        top_k (int, optional): Number of neighbours per query.
+
+    Returns:
+        Optional[float]: Median latency in milliseconds, or None without vectors.
+    """
+    latencies = []
+    for vector in vectors:
+        body = {
+            "size": top_k,
+            "_source": False,
+            "query": {"knn": {"embedding": {"vector": vector, "k": top_k}}},
+        }
+        start = time.perf_counter()
+        client.search(index=index_name, body=body)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies) if latencies else None
+
+
+def collect_index_stats(
+    client: OpenSearch,
+    index_name: str = OPENSEARCH_INDEX,
+    sample_size: int = STATS_SAMPLE_SIZE,
+    latency_queries: int = STATS_LATENCY_QUERIES,
+) -> Dict[str, Any]:
+    """
+    Gathers content, memory, segment and cache statistics of an index.
+
+    Chunk lengths and query latency are measured on a random sample of chunks,
+    whose embeddings double as kNN query vectors.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str, optional): Index or alias to inspect. Defaults to OPENSEARCH_INDEX.
+        sample_size (int, optional): Number of chunks sampled for chunk lengths.
+        latency_queries (int, optional): Number of kNN queries timed.
+
+    Returns:
+        Dict[str, Any]: Chunk and document counts, chunks per document, average
+            chunk length, estimated and actual graph memory, segment count,
+            cache hit rates, median kNN latency and the circuit breaker limit.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        raise ValueError("Index statistics require the OpenSearch backend.")
+
+    mapping = client.indices.get_mapping(index=index_name)
+    concrete_index, index_mapping = next(iter(mapping.items()))
+    embedding_mapping = index_mapping["mappings"]["properties"]["embedding"]
+    dimension = int(embedding_mapping["dimension"])
+    method = embedding_mapping.get("method", {})
+
+    aggregation = client.search(
+        index=index_name,
+        body={
+            "size": 0,
+            "track_total_hits": True,
+            "aggs": {"documents": {"terms": {"field": "document_name", "size": 10000}}},
+        },
+    )
+    chunks = aggregation["hits"]["total"]["value"]
+    chunks_per_document = {
+        bucket["key"]: bucket["doc_count"]
+        for bucket in aggregation["aggregations"]["documents"]["buckets"]
+    }
+
+    sample = client.search(
+        index=index_name,
+        body={
+            "size": sample_size,
+            "_source": ["text", "embedding"],
+            "query": {"function_score": {"random_score": {}}},
+        },
+    )["hits"]["hits"]
+    lengths = [len(hit["_source"]["text"]) for hit in sample]
+    vectors = [hit["_source"]["embedding"] for hit in sample[:latency_queries]]
+
+    index_stats = client.indices.stats(
+        index=index_name, metric="query_cache,request_cache"
+    )["_all"]["total"]
+    knn_memory = get_knn_graph_memory(client)
+    actual_kb = sum(
+        node["indices"].get(concrete_index, 0) for node in knn_memory.values()
+    )
+
+    stats = {
+        "index": concrete_index,
+        "chunks": chunks,
+        "documents": len(chunks_per_document),
+        "chunks_per_document": chunks_per_document,
+        "avg_chunk_chars": statistics.mean(lengths) if lengths else 0.0,
+        "dimension": dimension,
+        "method": method,
+        "estimated_graph_bytes": estimate_knn_memory_bytes(chunks, dimension, method),
+        "actual_graph_bytes": actual_kb * 1024,
+        "segments": get_segment_count(client, index_name),
+        "query_cache_hit_rate": _cache_hit_rate(index_stats["query_cache"]),
+        "request_cache_hit_rate": _cache_hit_rate(index_stats["request_cache"]),
+        "knn_latency_ms": measure_knn_latency(client, index_name, vectors),
+        "circuit_breaker_bytes": get_knn_circuit_breaker_bytes(client),
+    }
+    logger.info(f"Collected statistics of index {concrete_index}.")
+    return stats
+
+
+def project_capacity(
+    stats: Dict[str, Any], growth_factors: Sequence[float]
+) -> List[Dict[str, Any]]:
+    """
+    Projects graph memory and kNN latency for a corpus grown by each factor.
+
+    Memory grows linearly with the number of vectors. HNSW search visits a
+    number of nodes that grows with the logarithm of the graph size, so latency
+    is scaled by log(grown size) / log(current size).
+
+    Args:
+        stats (Dict[str, Any]): Statistics from `collect_index_stats`.
+        growth_factors (Sequence[float]): Corpus growth factors, e.g. (2, 5, 10).
+
+    Returns:
+        List[Dict[str, Any]]: Per factor the projected chunk count, graph memory,
+            kNN latency and share of the circuit breaker limit of the smallest
+            node, which assumes the graphs may all be loaded on one node.
+    """
+    chunks = max(stats["chunks"], 1)
+    # Scale from the measured memory when the graphs are loaded
+    graph_bytes = stats["actual_graph_bytes"] or stats["estimated_graph_bytes"]
+    per_vector = graph_bytes / chunks
+    limit = stats["circuit_breaker_bytes"]
+    latency = stats["knn_latency_ms"]
+
+    projections = []
+    for factor in growth_factors:
+        grown = chunks * factor
+        memory = per_vector * grown
+        projections.append(
+            {
+                "factor": factor,
+                "chunks": int(grown),
+                "graph_bytes": memory,
+                "knn_latency_ms": (
+                    latency * math.log(grown + 1) / math.log(chunks + 1)
+                    if latency is not None
+                    else None
+                ),
+                "breaker_share": memory / limit if limit else None,
+            }
+        )
+    return projections
@@ -0,0 +1,789 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import streamlit as st
+
+from src.constants import (
+    EMBEDDING_DIMENSION,
+    FILTERABLE_FIELDS,
+    HYBRID_SEARCH_WEIGHTS,
+    LOCAL_COMPACT_DEAD_RATIO,
+    LOCAL_INDEX_DIR,
+    LOCAL_IVF_NPROBE,
+    LOCAL_VECTOR_SEARCH,
+)
+from src.utils import setup_logging
+
+try:
+    import fcntl
+
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # Not available on Windows, where writes of other processes are not excluded
+    FCNTL_AVAILABLE = False
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+VECTORS_FILENAME = "vectors.f32"
+LOG_FILENAME = "updates.jsonl"
+METADATA_FILENAME = "metadata.json"
+LOCK_FILENAME = ".lock"
+_SEGMENT_FILE_PATTERN = re.compile(r"^(vectors|updates)(\.\d+)?\.(f32|jsonl)$")
+
+# Lucene's BM25 defaults, so local scores rank like OpenSearch's `match` query
+BM25_K1 = 1.2
+BM25_B = 0.75
+# OpenSearch's min_max normalization never scores a hit below this value
+MIN_NORMALIZED_SCORE = 0.001
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lower-cased word tokens, approximating OpenSearch's standard analyzer.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        List[str]: List of tokens.
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def min_max_normalize(scores: Dict[int, float]) -> Dict[int, float]:
+    """
+    Applies the min_max normalization used by the hybrid search pipeline.
+
+    Args:
+        scores (Dict[int, float]): Raw scores keyed by row.
+
+    Returns:
+        Dict[int, float]: Scores scaled to the [0.001, 1] range.
+    """
+    if not scores:
+        return {}
+    low = min(scores.values())
+    high = max(scores.values())
+    if high == low:
+        return {row: 1.0 for row in scores}
+    return {
+        row: max(MIN_NORMALIZED_SCORE, (score - low) / (high - low))
+        for row, score in scores.items()
+    }
+
+
+def combine_scores(
+    text_scores: Dict[int, float],
+    vector_scores: Dict[int, float],
+    weights: Sequence[float] = HYBRID_SEARCH_WEIGHTS,
+) -> Dict[int, float]:
+    """
+    Combines normalized BM25 and kNN scores with a weighted arithmetic mean.
+
+    Args:
+        text_scores (Dict[int, float]): Raw BM25 scores keyed by row.
+        vector_scores (Dict[int, float]): Raw kNN scores keyed by row.
+        weights (Sequence[float]): (BM25, kNN) combination weights.
+
+    Returns:
+        Dict[int, float]: Combined scores keyed by row.
+    """
+    normalized = [min_max_normalize(text_scores), min_max_normalize(vector_scores)]
+    total_weight = float(sum(weights))
+    combined: Dict[int, float] = {}
+    for row in set(text_scores) | set(vector_scores):
+        combined[row] = (
+            sum(w * scores.get(row, 0.0) for w, scores in zip(weights, normalized))
+            / total_weight
+        )
+    return combined
+
+
+class LocalVectorStore:
+    """
+    In-process replacement for the OpenSearch index.
+
+    Embeddings live in a memory-mapped float32 matrix and text is scored with an
+    in-memory BM25 inverted index. Hybrid queries are fused exactly like the
+    `nlp-search-pipeline` (min_max normalization, weighted arithmetic mean).
+
+    Like a Lucene index, the files are append-only: a segment is a base written
+    at compaction (metadata.json and its vector file) plus an update log of
+    added and deleted rows. Writes append vectors and log lines, and replaced or
+    deleted rows stay in the files as dead rows until they make up
+    LOCAL_COMPACT_DEAD_RATIO of the rows, when the live rows are rewritten into
+    a new segment. Writers in other processes are excluded with a file lock.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        dimension: int,
+        vector_search: str = "exact",
+        nprobe: int = 8,
+    ) -> None:
+        self.directory = directory
+        self.dimension = dimension
+        self.vector_search = vector_search
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._segment = 0
+        self._metadata_signature: Optional[Tuple[int, int]] = None
+        self._log_offset = 0
+        self._doc_ids: List[str] = []
+        self._texts: List[str] = []
+        self._fields: Dict[str, List[str]] = {}
+        self._live: List[bool] = []
+        self._rows: Dict[str, int] = {}
+        self._dead = 0
+        self._vectors: np.ndarray = np.zeros((0, dimension), dtype=np.float32)
+        self._norms: np.ndarray = np.zeros(0, dtype=np.float32)
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._doc_lengths: List[int] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+        self._ivf_trained_size = 0
+        os.makedirs(directory, exist_ok=True)
+        with self._file_lock(exclusive=False):
+            self._load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return self._segment_path(VECTORS_FILENAME, self._segment)
+
+    @property
+    def _log_path(self) -> str:
+        return self._segment_path(LOG_FILENAME, self._segment)
+
+    @property
+    def _metadata_path(self) -> str:
+        return os.path.join(self.directory, METADATA_FILENAME)
+
+    def _segment_path(self, filename: str, segment: int) -> str:
+        # Segment 0 keeps the file names of indexes written before segments existed
+        if segment:
+            stem, extension = os.path.splitext(filename)
+            filename = f"{stem}.{segment}{extension}"
+        return os.path.join(self.directory, filename)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _empty_vectors(self) -> np.ndarray:
+        return np.zeros((0, self.dimension), dtype=np.float32)
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """
+        Holds a lock on the index directory, shared by readers and exclusive to writers.
+        """
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILENAME), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load(self) -> None:
+        """
+        Loads the base of the current segment and replays its update log.
+        """
+        self._reset()
+        if os.path.exists(self._metadata_path):
+            with open(self._metadata_path, "r") as f:
+                metadata = json.load(f)
+            if metadata["dimension"] != self.dimension:
+                raise ValueError(
+                    f"Local index in {self.directory} has dimension "
+                    f"{metadata['dimension']}, expected {self.dimension}."
+                )
+            self._segment = metadata.get("segment", 0)
+            self._metadata_signature = self._signature()
+            # Indexes written before filtering stored only the document names
+            fields = metadata.get("fields") or {
+                "document_name": metadata.get("document_names", [])
+            }
+            for row, (doc_id, text) in enumerate(
+                zip(metadata["doc_ids"], metadata["texts"])
+            ):
+                self._add_row(
+                    doc_id,
+                    text,
+                    {field: values[row] for field, values in fields.items()},
+                )
+        self._replay_log()
+        logger.info(f"Loaded {len(self)} chunks from local index {self.directory}.")
+
+    def _reset(self) -> None:
+        self._segment = 0
+        self._metadata_signature = None
+        self._log_offset = 0
+        self._doc_ids = []
+        self._texts = []
+        self._fields = {field: [] for field in FILTERABLE_FIELDS}
+        self._live = []
+        self._rows = {}
+        self._dead = 0
+        self._vectors = self._empty_vectors()
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._postings = defaultdict(dict)
+        self._doc_lengths = []
+        self._centroids = None
+        self._assignments = None
+        self._ivf_trained_size = 0
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        # Compaction replaces metadata.json, which gives it a new inode
+        if not os.path.exists(self._metadata_path):
+            return None
+        stat = os.stat(self._metadata_path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _add_row(
+        self, doc_id: str, text: str, fields: Dict[str, str], live: bool = True
+    ) -> None:
+        row = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        self._texts.append(text)
+        for field in FILTERABLE_FIELDS:
+            self._fields[field].append(fields.get(field) or "")
+        self._live.append(live)
+        if live:
+            self._rows[doc_id] = row
+        else:
+            self._dead += 1
+        self._add_postings(row, text)
+
+    def _kill(self, row: int) -> None:
+        if not self._live[row]:
+            return
+        self._live[row] = False
+        self._dead += 1
+        if self._rows.get(self._doc_ids[row]) == row:
+            del self._rows[self._doc_ids[row]]
+
+    def _add_postings(self, row: int, text: str) -> None:
+        tokens = tokenize(text)
+        self._doc_lengths.append(len(tokens))
+        for term, frequency in Counter(tokens).items():
+            self._postings[term][row] = frequency
+
+    def _replay_log(self) -> None:
+        """
+        Applies the update log entries written since it was last read.
+        """
+        first = len(self._doc_ids)
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+            # A line without its newline was cut short by a crashed writer
+            complete = data.rfind(b"\n") + 1
+            self._log_offset += complete
+            for line in data[:complete].splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "delete" in entry:
+                    for row in entry["delete"]:
+                        self._kill(row)
+                    continue
+                # Vectors of a writer that crashed before logging them are skipped
+                while len(self._doc_ids) < entry["row"]:
+                    self._add_row("", "", {}, live=False)
+                if entry["doc_id"] in self._rows:
+                    self._kill(self._rows[entry["doc_id"]])
+                self._add_row(entry["doc_id"], entry["text"], entry["fields"])
+
+        count = len(self._doc_ids)
+        if count == first and len(self._vectors) == count:
+            return
+        if count:
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(count, self.dimension),
+            )
+        else:
+            self._vectors = self._empty_vectors()
+        added = np.asarray(self._vectors[len(self._norms) :])
+        self._norms = np.concatenate(
+            [self._norms, np.einsum("ij,ij->i", added, added).astype(np.float32)]
+        )
+
+    def _refresh_if_changed(self) -> None:
+        # Another process (e.g. `rag upload`) may have written to the same directory
+        if self._signature() != self._metadata_signature:
+            self._load()
+            return
+        size = os.path.getsize(self._log_path) if os.path.exists(self._log_path) else 0
+        if size < self._log_offset:
+            self._load()
+        elif size > self._log_offset:
+            self._replay_log()
+
+    def _sync(self) -> None:
+        with self._file_lock(exclusive=False):
+            self._refresh_if_changed()
+
+    def _append_log(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Appends entries to the update log and applies them. Requires the exclusive lock.
+        """
+        with open(self._log_path, "ab") as f:
+            if f.tell() > self._log_offset:
+                # End the partial line of a crashed writer, which replay skips
+                f.write(b"\n")
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries).encode())
+        self._replay_log()
+
+    def _compact_if_needed(self) -> None:
+        if self._dead and self._dead >= LOCAL_COMPACT_DEAD_RATIO * len(self._doc_ids):
+            self._compact()
+
+    def _compact(self) -> None:
+        """
+        Rewrites the live rows into the base of a new segment. Requires the exclusive lock.
+        """
+        live = [row for row, alive in enumerate(self._live) if alive]
+        segment = self._segment + 1
+        vectors = np.asarray(self._vectors)[live] if live else self._empty_vectors()
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(
+            self._segment_path(VECTORS_FILENAME, segment)
+        )
+        metadata_tmp = self._metadata_path + ".tmp"
+        with open(metadata_tmp, "w") as f:
+            json.dump(
+                {
+                    "dimension": self.dimension,
+                    "segment": segment,
+                    "doc_ids": [self._doc_ids[row] for row in live],
+                    "texts": [self._texts[row] for row in live],
+                    "fields": {
+                        field: [values[row] for row in live]
+                        for field, values in self._fields.items()
+                    },
+                },
+                f,
+            )
+        # Release the current memory map before its file is removed
+        self._vectors = self._empty_vectors()
+        os.replace(metadata_tmp, self._metadata_path)
+        dead = self._dead
+        self._load()
+        self._remove_stale_segments()
+        logger.info(
+            f"Compacted local index {self.directory} into segment {segment}, "
+            f"dropping {dead} dead rows."
+        )
+
+    def _remove_stale_segments(self) -> None:
+        current = {
+            os.path.basename(self._vectors_path),
+            os.path.basename(self._log_path),
+        }
+        for filename in os.listdir(self.directory):
+            if _SEGMENT_FILE_PATTERN.match(filename) and filename not in current:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError as e:
+                    # Still mapped by a reader on Windows; removed at the next compaction
+                    logger.warning(
+                        f"Could not remove stale segment file {filename}: {e}"
+                    )
+
+    def index_documents(self, documents: List[Dict[str, Any]]) -> Tuple[int, List[Any]]:
+        """
+        Adds or replaces chunks, mirroring `bulk_index_documents`.
+
+        The vectors are appended to the vector file and the chunks to the update
+        log, so the cost of a call depends on its documents, not on the index size.
+
+        Args:
+            documents (List[Dict[str, Any]]): Dictionaries with 'doc_id', 'text',
+                'embedding', 'document_name' and optionally 'collection' and 'tenant'.
+
+        Returns:
+            Tuple[int, List[Any]]: Number of indexed chunks and a list of errors.
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh_if_changed()
+            errors: List[Any] = []
+            accepted = []
+            embeddings = []
+            for doc in documents:
+                embedding = np.asarray(doc["embedding"], dtype=np.float32).reshape(-1)
+                if embedding.shape[0] != self.dimension:
+                    errors.append(
+                        {"doc_id": doc["doc_id"], "error": "dimension mismatch"}
+                    )
+                    continue
+                accepted.append(doc)
+                embeddings.append(embedding)
+
+            if accepted:
+                row_bytes = self.dimension * 4
+                with open(self._vectors_path, "ab") as f:
+                    size = f.tell()
+                    # Pad a row cut short by a crashed writer
+                    if size % row_bytes:
+                        f.write(b"\0" * (row_bytes - size % row_bytes))
+                    first = f.tell() // row_bytes
+                    f.write(np.stack(embeddings).tobytes())
+                self._append_log(
+                    [
+                        {
+                            "row": first + i,
+                            "doc_id": doc["doc_id"],
+                            "text": doc["text"],
+                            "fields": {
+                                field: doc[field]
+                                for field in FILTERABLE_FIELDS
+                                if doc.get(field)
+                            },
+                        }
+                        for i, doc in enumerate(accepted)
+                    ]
+                )
+                self._compact_if_needed()
+
+        success = len(documents) - len(errors)
+        logger.info(f"Indexed {success} chunks into local index {self.directory}.")
+        return success, errors
+
+    def delete_by_document_name(self, document_name: str) -> Dict[str, Any]:
+        """
+        Deletes every chunk of a document, mirroring `delete_documents_by_document_name`.
+
+        Args:
+            document_name (str): Name of the document to delete.
+
+        Returns:
+            Dict[str, Any]: Delete-by-query style response with a 'deleted' count.
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh_if_changed()
+            rows = [
+                row
+                for row, name in enumerate(self._fields["document_name"])
+                if name == document_name and self._live[row]
+            ]
+            if rows:
+                self._append_log([{"delete": rows}])
+                self._compact_if_needed()
+        logger.info(
+            f"Deleted {len(rows)} chunks of '{document_name}' from local index "
+            f"{self.directory}."
+        )
+        return {"deleted": len(rows), "total": len(rows), "failures": []}
+
+    def clear(self) -> None:
+        """
+        Removes every chunk from the local index.
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh_if_changed()
+            for row in range(len(self._doc_ids)):
+                self._kill(row)
+            self._compact()
+        logger.info(f"Cleared local index {self.directory}.")
+
+    def field_values(self, field: str = "document_name") -> List[str]:
+        """
+        Lists the distinct non-empty values of a keyword field.
+
+        Args:
+            field (str, optional): One of FILTERABLE_FIELDS. Defaults to "document_name".
+
+        Returns:
+            List[str]: Sorted distinct values.
+        """
+        with self._lock:
+            self._sync()
+            return sorted(
+                set(
+                    value
+                    for value, live in zip(self._fields[field], self._live)
+                    if live and value
+                )
+            )
+
+    def _live_rows(self) -> Optional[np.ndarray]:
+        return np.flatnonzero(np.asarray(self._live)) if self._dead else None
+
+    def doc_ids_for(self, rows: Iterable[int]) -> List[str]:
+        """
+        Maps row numbers, as returned by the kNN helpers, to chunk IDs.
+
+        Args:
+            rows (Iterable[int]): Row numbers.
+
+        Returns:
+            List[str]: The chunk IDs of those rows.
+        """
+        return [self._doc_ids[row] for row in rows]
+
+    def filter_rows(
+        self, filters: Optional[Dict[str, List[str]]]
+    ) -> Optional[np.ndarray]:
+        """
+        Resolves field filters to the live rows that satisfy all of them.
+
+        Args:
+            filters (Optional[Dict[str, List[str]]]): Allowed values per keyword field.
+
+        Returns:
+            Optional[np.ndarray]: Matching row numbers, or None when every row matches.
+        """
+        # Dead rows are excluded like deleted documents are
+        mask: Optional[np.ndarray] = np.asarray(self._live) if self._dead else None
+        for field, values in (filters or {}).items():
+            if not values:
+                continue
+            if field not in self._fields:
+                raise ValueError(
+                    f"Cannot filter on '{field}'; expected one of {FILTERABLE_FIELDS}."
+                )
+            field_mask = np.isin(np.asarray(self._fields[field], dtype=object), values)
+            mask = field_mask if mask is None else mask & field_mask
+        return None if mask is None else np.flatnonzero(mask)
+
+    def bm25_scores(
+        self, query_text: str, rows: Optional[np.ndarray] = None
+    ) -> Dict[int, float]:
+        """
+        Scores every chunk containing at least one query term with BM25.
+
+        Args:
+            query_text (str): The text query.
+            rows (Optional[np.ndarray]): Restricts scoring to these rows.
+
+        Returns:
+            Dict[int, float]: BM25 scores keyed by row.
+        """
+        # Dead rows count in the statistics until compaction, as in Lucene
+        num_docs = len(self._doc_ids)
+        if not num_docs:
+            return {}
+        if rows is None:
+            rows = self._live_rows()
+        avg_length = sum(self._doc_lengths) / num_docs or 1.0
+        allowed = None if rows is None else set(rows.tolist())
+        scores: Dict[int, float] = defaultdict(float)
+        for term in tokenize(query_text):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, frequency in postings.items():
+                if allowed is not None and row not in allowed:
+                    continue
+                length_norm = 1 - BM25_B + BM25_B * self._doc_lengths[row] / avg_length
+                scores[row] += (
+                    idf
+                    * frequency
+                    * (BM25_K1 + 1)
+                    / (frequency + BM25_K1 * length_norm)
+                )
+        return dict(scores)
+
+    def _l2_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        # Squared L2 distance via ||x||^2 - 2 x.q + ||q||^2, scored like faiss (1 / (1 + d))
+        vectors = self._vectors if rows is None else self._vectors[rows]
+        norms = self._norms if rows is None else self._norms[rows]
+        distances = norms - 2.0 * (vectors @ query) + float(query @ query)
+        scores: np.ndarray = 1.0 / (1.0 + np.maximum(distances, 0.0))
+        return scores
+
+    def exact_knn(
+        self,
+        query_embedding: Sequence[float],
+        k: int,
+        rows: Optional[np.ndarray] = None,
+    ) -> Dict[int, float]:
+        """
+        Brute-force k nearest neighbours; the ground truth for recall benchmarks.
+
+        Args:
+            query_embedding (Sequence[float]): Query vector.
+            k (int): Number of neighbours.
+            rows (Optional[np.ndarray]): Restricts the search to these rows.
+
+        Returns:
+            Dict[int, float]: kNN scores keyed by row.
+        """
+        if not len(self._doc_ids):
+            return {}
+        if rows is None:
+            rows = self._live_rows()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self._l2_scores(query, rows)
+        return self._top(scores, np.arange(len(scores)) if rows is None else rows, k)
+
+    def ivf_knn(
+        self,
+        query_embedding: Sequence[float],
+        k: int,
+        rows: Optional[np.ndarray] = None,
+    ) -> Dict[int, float]:
+        """
+        Approximate k nearest neighbours over the `nprobe` closest IVF lists.
+
+        Args:
+            query_embedding (Sequence[float]): Query vector.
+            k (int): Number of neighbours.
+            rows (Optional[np.ndarray]): Restricts the search to these rows.
+
+        Returns:
+            Dict[int, float]: kNN scores keyed by row.
+        """
+        if not len(self._doc_ids):
+            return {}
+        self._ensure_ivf()
+        assert self._centroids is not None and self._assignments is not None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        centroid_distances = np.sum((self._centroids - query) ** 2, axis=1)
+        probes = np.argsort(centroid_distances)[: self.nprobe]
+        candidates = np.flatnonzero(np.isin(self._assignments, probes))
+        if rows is None:
+            rows = self._live_rows()
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        if not len(candidates):
+            return {}
+        return self._top(self._l2_scores(query, candidates), candidates, k)
+
+    def _ensure_ivf(self, iterations: int = 10) -> None:
+        count = len(self._doc_ids)
+        if self._centroids is not None and count == self._ivf_trained_size:
+            return
+        # k-means with sqrt(N) lists, seeded from a deterministic sample of rows
+        num_lists = max(1, int(math.sqrt(count)))
+        rng = np.random.default_rng(0)
+        vectors = np.asarray(self._vectors)
+        centroids = vectors[rng.choice(count, num_lists, replace=False)].copy()
+        for _ in range(iterations):
+            distances = (
+                np.sum(centroids**2, axis=1)[None, :]
+                - 2.0 * vectors @ centroids.T
+                + self._norms[:, None]
+            )
+            assignments = np.argmin(distances, axis=1)
+            for cluster in range(num_lists):
+                members = vectors[assignments == cluster]
+                if len(members):
+                    centroids[cluster] = members.mean(axis=0)
+        self._centroids = centroids
+        self._assignments = assignments
+        self._ivf_trained_size = count
+        logger.info(f"Trained IVF with {num_lists} lists over {count} vectors.")
+
+    @staticmethod
+    def _top(scores: np.ndarray, rows: np.ndarray, k: int) -> Dict[int, float]:
+        k = min(k, len(scores))
+        if k < 1:
+            return {}
+        best = np.argpartition(-scores, k - 1)[:k]
+        return {int(rows[i]): float(scores[i]) for i in best}
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_embedding: Sequence[float],
+        top_k: int = 5,
+        index_name: str = "",
+        filters: Optional[Dict[str, List[str]]] = None,
+        with_embeddings: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs a hybrid BM25 + kNN query and returns OpenSearch-shaped hits.
+
+        Filters restrict both sub-queries before the top k are taken, matching
+        OpenSearch's efficient kNN filtering.
+
+        Args:
+            query_text (str): The text query for BM25 scoring.
+            query_embedding (Sequence[float]): Embedding vector for kNN search.
+            top_k (int, optional): Number of results. Defaults to 5.
+            index_name (str, optional): Index name reported in the hits.
+            filters (Optional[Dict[str, List[str]]]): Allowed values per keyword field.
+            with_embeddings (bool, optional): Include each hit's 'embedding' in
+                its '_source'.
+
+        Returns:
+            List[Dict[str, Any]]: Hits with '_index', '_id', '_score' and '_source'.
+        """
+        with self._lock:
+            self._sync()
+            rows = self.filter_rows(filters)
+            if rows is not None and not len(rows):
+                return []
+            # Like each hybrid sub-query, collect the top_k hits of BM25 and kNN
+            text_scores = self.bm25_scores(query_text, rows)
+            text_top = dict(
+                sorted(text_scores.items(), key=lambda item: -item[1])[:top_k]
+            )
+            if self.vector_search == "ivf":
+                vector_top = self.ivf_knn(query_embedding, top_k, rows)
+            else:
+                vector_top = self.exact_knn(query_embedding, top_k, rows)
+            combined = combine_scores(text_top, vector_top)
+            ranked = sorted(combined.items(), key=lambda item: -item[1])[:top_k]
+            hits: List[Dict[str, Any]] = [
+                {
+                    "_index": index_name,
+                    "_id": self._doc_ids[row],
+                    "_score": score,
+                    "_source": {
+                        "text": self._texts[row],
+                        **{
+                            field: values[row]
+                            for field, values in self._fields.items()
+                            if values[row]
+                        },
+                    },
+                }
+                for row, score in ranked
+            ]
+            if with_embeddings:
+                for hit, (row, _) in zip(hits, ranked):
+                    hit["_source"]["embedding"] = self._vectors[row].tolist()
+            return hits
+
+
+@st.cache_resource(show_spinner=False)
+def get_local_store(index_name: str) -> LocalVectorStore:
+    """
+    Opens and caches the local retrieval backend for an index.
+
+    Args:
+        index_name (str): Name of the index, used as a subdirectory of LOCAL_INDEX_DIR.
+
+    Returns:
+        LocalVectorStore: The local store for the index.
+    """
+    directory = os.path.join(LOCAL_INDEX_DIR, index_name)
+    logger.info(f"Opening local index in {directory}.")
+    return LocalVectorStore(
+        directory,
+        EMBEDDING_DIMENSION,
+        vector_search=LOCAL_VECTOR_SEARCH,
+        nprobe=LOCAL_IVF_NPROBE,
+    )
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Sequence, Set
+
+import ollama
+import streamlit as st
+
+from src.constants import (
+    MODEL_AVAILABILITY_TTL_SECONDS,
+    MODEL_STATUS_REFRESH_SECONDS,
+    OLLAMA_KEEP_ALIVE,
+    SEARCH_CACHE_DIR,
+)
+from src.utils import setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+MODEL_LIST_FILENAME = "ollama_models.json"
+# States reported by `ModelReadiness.status`
+MODEL_STATES = ("cold", "pulling", "loading", "loaded", "unavailable")
+
+# Models are pulled and loaded one at a time, off the request path
+_warmup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+
+
+def normalize_model_name(model: str) -> str:
+    """
+    Returns the name Ollama lists a model under, with its tag.
+
+    Args:
+        model (str): Model name, e.g. "llama3.2:1b" or "mistral".
+
+    Returns:
+        str: The name with ":latest" added if it has no tag.
+    """
+    return model if ":" in model else f"{model}:latest"
+
+
+def _model_names(response: Any) -> Set[str]:
+    """Extracts the model names from the response of `ollama.list` or `ollama.ps`."""
+    return {
+        normalize_model_name(entry.get("model") or entry.get("name"))
+        for entry in response.get("models", [])
+    }
+
+
+class ModelReadiness:
+    """
+    Tracks whether the chat models are pulled and loaded in Ollama.
+
+    The list of pulled models is cached on disk for `ttl_seconds`, so new
+    processes do not list Ollama's models on every start. `warm_up` pulls and
+    loads models in a background thread with OLLAMA_KEEP_ALIVE, so the first
+    question does not pay the model load.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = MODEL_AVAILABILITY_TTL_SECONDS,
+        cache_path: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            ttl_seconds (float, optional): How long the cached list of pulled
+                models is trusted.
+            cache_path (Optional[str]): JSON file holding the list. Defaults to
+                MODEL_LIST_FILENAME in SEARCH_CACHE_DIR.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.cache_path = cache_path or os.path.join(
+            SEARCH_CACHE_DIR, MODEL_LIST_FILENAME
+        )
+        self._lock = threading.Lock()
+        self._states: Dict[str, str] = {}
+        self._pending: Dict[str, Future[None]] = {}
+        self._refreshed_at = 0.0
+
+    def _read_cache(self) -> Optional[Set[str]]:
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - data.get("checked_at", 0) >= self.ttl_seconds:
+            return None
+        return set(data.get("models", []))
+
+    def _write_cache(self, models: Set[str]) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"checked_at": time.time(), "models": sorted(models)}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not cache the list of Ollama models: {e}")
+
+    def available_models(self, refresh: bool = False) -> Set[str]:
+        """
+        Returns the models pulled in Ollama, from the cache while it is fresh.
+
+        Args:
+            refresh (bool, optional): Ask Ollama even if the cache is fresh.
+
+        Returns:
+            Set[str]: Model names with their tags.
+        """
+        models = None if refresh else self._read_cache()
+        if models is None:
+            models = _model_names(ollama.list())
+            self._write_cache(models)
+        return models
+
+    def ensure_available(self, model: str) -> bool:
+        """
+        Pulls a model unless it is already available locally.
+
+        Args:
+            model (str): The name of the model.
+
+        Returns:
+            bool: True if the model is available or was pulled, False if an
+                error occurs.
+        """
+        name = normalize_model_name(model)
+        try:
+            models = self.available_models()
+            if name not in models:
+                # The cached list may predate a pull made outside of the app
+                models = self.available_models(refresh=True)
+            if name in models:
+                logger.info(f"Model {model} is already available locally.")
+                return True
+            logger.info(f"Model {model} not found locally. Pulling the model...")
+            self._set_state(model, "pulling")
+            ollama.pull(model)
+            self._write_cache(models | {name})
+            self._set_state(model, "cold")
+            logger.info(f"Model {model} has been pulled and is now available locally.")
+        except ollama.ResponseError as e:
+            logger.error(f"Error checking or pulling model: {e.error}")
+            self._set_state(model, "unavailable")
+            return False
+        return True
+
+    def warm_up(self, models: Sequence[str]) -> None:
+        """
+        Pulls and loads models in the background. Only cold models are warmed
+        up, so this can be called on every run.
+
+        Args:
+            models (Sequence[str]): Names of the models.
+        """
+        for model in models:
+            name = normalize_model_name(model)
+            with self._lock:
+                if self._states.get(name, "cold") != "cold":
+                    continue
+                self._states[name] = "loading"
+                self._pending[name] = _warmup_executor.submit(self._warm_up, model)
+
+    def _warm_up(self, model: str) -> None:
+        start = time.perf_counter()
+        try:
+            if not self.ensure_available(model):
+                return
+            self._set_state(model, "loading")
+            ollama.generate(model=model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+        except Exception as e:
+            logger.warning(f"Could not load model {model}: {e}")
+            self._set_state(model, "cold")
+            return
+        self._set_state(model, "loaded")
+        logger.info(
+            f"Model {model} loaded in {(time.perf_counter() - start) * 1000:.0f} ms."
+        )
+
+    def wait(self, model: str, timeout: Optional[float] = None) -> None:
+        """
+        Blocks until a pending warm-up of the model, if any, has finished.
+
+        Args:
+            model (str): The name of the model.
+            timeout (Optional[float]): Maximum number of seconds to wait.
+        """
+        pending = self._pending.get(normalize_model_name(model))
+        if pending is not None:
+            pending.result(timeout=timeout)
+
+    def _set_state(self, model: str, state: str) -> None:
+        with self._lock:
+            self._states[normalize_model_name(model)] = state
+
+    def refresh(self) -> None:
+        """
+        Updates the loaded and cold states from the models Ollama has in memory,
+        at most every MODEL_STATUS_REFRESH_SECONDS. Models unload by themselves
+        once OLLAMA_KEEP_ALIVE passes without a request.
+        """
+        now = time.time()
+        if now - self._refreshed_at < MODEL_STATUS_REFRESH_SECONDS:
+            return
+        self._refreshed_at = now
+        try:
+            loaded = _model_names(ollama.ps())
+        except Exception as e:
+            logger.warning(f"Could not list the models loaded in Ollama: {e}")
+            return
+        with self._lock:
+            for name, state in self._states.items():
+                if state == "loaded" and name not in loaded:
+                    self._states[name] = "cold"
+            for name in loaded:
+                if self._states.get(name) != "pulling":
+                    self._states[name] = "loaded"
+
+    def status(self, model: str) -> str:
+        """
+        Returns the readiness of a model.
+
+        Args:
+            model (str): The name of the model.
+
+        Returns:
+            str: One of MODEL_STATES.
+        """
+        with self._lock:
+            return self._states.get(normalize_model_name(model), "cold")
+
+
+@st.cache_resource(show_spinner=False)
+def get_model_readiness() -> ModelReadiness:
+    """
+    Creates and caches the model readiness tracker of the process.
+
+    Returns:
+        ModelReadiness: The readiness tracker.
+    """
+    return ModelReadiness()
@@ -0,0 +1,516 @@
+import itertools
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from opensearchpy import OpenSearch, helpers
+
+from src.cache import bump_index_generation
+from src.constants import (
+    ASSYMETRIC_EMBEDDING,
+    OPENSEARCH_INDEX,
+    REINDEX_CATCHUP_PASSES,
+    RETRIEVAL_BACKEND,
+    TEXT_CHUNK_OVERLAP,
+    TEXT_CHUNK_SIZE,
+)
+from src.embeddings import generate_embeddings
+from src.ingestion import (
+    bulk_index_documents,
+    get_index_meta,
+    get_index_versions,
+    get_live_index,
+    load_index_config,
+    versioned_index_name,
+)
+from src.opensearch import wait_for_task, warmup_knn_index
+from src.utils import chunk_text, merge_chunks, setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Settings that make stored embeddings incompatible with the current model
+EMBEDDING_META_KEYS = ("embedding_model", "embedding_dimension", "asymmetric_embedding")
+# Settings that change how documents are split into chunks
+CHUNKING_META_KEYS = ("text_chunk_size", "text_chunk_overlap")
+
+
+def read_index_meta(client: OpenSearch, index_name: str) -> Dict[str, Any]:
+    """
+    Reads the build settings recorded in the mapping of an index.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str): Concrete index name.
+
+    Returns:
+        Dict[str, Any]: The recorded settings, empty for indexes created before
+            they were recorded.
+    """
+    mapping = client.indices.get_mapping(index=index_name)
+    meta: Dict[str, Any] = mapping[index_name]["mappings"].get("_meta", {})
+    return meta
+
+
+def _document_versions(
+    client: OpenSearch, index_name: str
+) -> Dict[str, Optional[float]]:
+    """
+    Maps every document of an index to the time its newest chunk was indexed,
+    paging through a composite aggregation.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str): Index to inspect.
+
+    Returns:
+        Dict[str, Optional[float]]: Per document name, the largest 'indexed_at'
+            of its chunks, None for chunks indexed before it was recorded.
+    """
+    versions: Dict[str, Optional[float]] = {}
+    composite: Dict[str, Any] = {
+        "size": 1000,
+        "sources": [{"name": {"terms": {"field": "document_name"}}}],
+    }
+    while True:
+        response = client.search(
+            index=index_name,
+            body={
+                "size": 0,
+                "aggs": {
+                    "names": {
+                        "composite": composite,
+                        "aggs": {"indexed_at": {"max": {"field": "indexed_at"}}},
+                    }
+                },
+            },
+        )
+        aggregation = response["aggregations"]["names"]
+        for bucket in aggregation["buckets"]:
+            versions[bucket["key"]["name"]] = bucket["indexed_at"]["value"]
+        if not aggregation["buckets"] or "after_key" not in aggregation:
+            return versions
+        composite["after"] = aggregation["after_key"]
+
+
+def _iter_documents(
+    client: OpenSearch,
+    index_name: str,
+    strip_prefix: bool,
+    query: Dict[str, Any],
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streams the documents of an index one at a time, each with its chunks in order.
+
+    A single scroll sorted by document name is grouped on the fly, so only one
+    document is held in memory.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str): Index to read.
+        strip_prefix (bool): Whether stored texts carry the "passage: " prefix.
+        query (Dict[str, Any]): Selects the chunks to read.
+
+    Yields:
+        Tuple[str, Dict[str, Any]]: The document name, and its optional 'fields'
+            (collection, tenant), its 'chunks' as (position, text, embedding) and
+            the 'indexed_at' of its newest chunk.
+    """
+    hits = helpers.scan(
+        client,
+        index=index_name,
+        query={"query": query, "sort": [{"document_name": "asc"}]},
+        preserve_order=True,
+        size=500,
+    )
+    for document_name, group in itertools.groupby(
+        hits, key=lambda hit: hit["_source"]["document_name"]
+    ):
+        document: Dict[str, Any] = {"fields": {}, "chunks": [], "indexed_at": None}
+        for hit in group:
+            source = hit["_source"]
+            if source.get("indexed_at") is not None:
+                document["indexed_at"] = max(
+                    document["indexed_at"] or 0, source["indexed_at"]
+                )
+            text = source["text"]
+            if strip_prefix and text.startswith("passage: "):
+                text = text[len("passage: ") :]
+            suffix = hit["_id"].rsplit("_", 1)[-1]
+            position = int(suffix) if suffix.isdigit() else 0
+            document["fields"] = {
+                field: source[field]
+                for field in ("collection", "tenant")
+                if source.get(field)
+            }
+            document["chunks"].append((position, text, source["embedding"]))
+        document["chunks"].sort(key=lambda chunk: chunk[0])
+        yield document_name, document
+
+
+def _copy_documents(
+    client: OpenSearch,
+    source_index: str,
+    index_name: str,
+    reuse_embeddings: bool,
+    rechunk: bool,
+    strip_prefix: bool,
+    names: Optional[List[str]] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    Copies documents from the live index into a new index version.
+
+    When nothing needs recomputing, the chunks are copied with a server-side
+    reindex. Otherwise documents are streamed one at a time, re-chunked if
+    requested and re-embedded where their stored embeddings cannot be reused,
+    and bulk indexed.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        source_index (str): Index to copy from.
+        index_name (str): Index version to copy into.
+        reuse_embeddings (bool): Reuse stored embeddings.
+        rechunk (bool): Re-chunk documents.
+        strip_prefix (bool): Whether the source texts carry the "passage: " prefix.
+        names (Optional[List[str]]): Documents to copy, or None for all of them.
+        progress_callback (Optional[Callable[[int, int], None]]): Called with the
+            number of documents done and the total after each document.
+
+    Returns:
+        Dict[str, int]: Copied 'chunks', 'reused_embeddings' and 'new_embeddings'.
+    """
+    counts = {"chunks": 0, "reused_embeddings": 0, "new_embeddings": 0}
+    query = {"match_all": {}} if names is None else {"terms": {"document_name": names}}
+    if reuse_embeddings and not rechunk:
+        response = client.reindex(
+            body={
+                "source": {"index": source_index, "query": query},
+                "dest": {"index": index_name},
+            },
+            params={"slices": "auto", "wait_for_completion": "false"},
+        )
+        result = wait_for_task(client, response["task"])
+        counts["chunks"] = counts["reused_embeddings"] = result.get("created", 0)
+        return counts
+
+    total = (
+        len(names)
+        if names is not None
+        else len(_document_versions(client, source_index))
+    )
+    documents = _iter_documents(client, source_index, strip_prefix, query)
+    for done, (document_name, document) in enumerate(documents, 1):
+        chunks = [text for _, text, _ in document["chunks"]]
+        embeddings: Dict[str, Any] = {}
+        if reuse_embeddings:
+            embeddings = {
+                text: np.asarray(embedding, dtype=np.float32)
+                for _, text, embedding in document["chunks"]
+            }
+        if rechunk:
+            chunks = chunk_text(
+                merge_chunks(chunks), TEXT_CHUNK_SIZE, TEXT_CHUNK_OVERLAP
+            )
+        missing = list(dict.fromkeys(c for c in chunks if c not in embeddings))
+        if missing:
+            embeddings.update(zip(missing, generate_embeddings(missing)))
+        counts["new_embeddings"] += len(missing)
+        counts["reused_embeddings"] += len(chunks) - len(missing)
+        counts["chunks"] += len(chunks)
+
+        bulk_index_documents(
+            [
+                {
+                    "doc_id": f"{document_name}_{i}",
+                    "text": chunk,
+                    "embedding": embeddings[chunk],
+                    "document_name": document_name,
+                    # Kept from the source, so the catch-up can compare the copies
+                    "indexed_at": document["indexed_at"],
+                    **document["fields"],
+                }
+                for i, chunk in enumerate(chunks)
+            ],
+            index_name=index_name,
+            refresh=False,
+        )
+        if progress_callback is not None:
+            progress_callback(done, total)
+    return counts
+
+
+def catch_up_index_version(client: OpenSearch, index_name: str) -> int:
+    """
+    Copies the documents that changed in the live index since an index version
+    was built from it, so promoting the version does not lose writes that went
+    through the alias during the build.
+
+    Copies keep the 'indexed_at' of their source chunks, so a document changed
+    when the newest 'indexed_at' of its chunks differs between the two indexes,
+    or when it is in only one of them. Changed documents are deleted from the
+    new version and copied again, the way the build copied them. Passes repeat
+    until one finds no changes, so the last one, right before the alias is
+    swapped, is short. Versions that were not built from the live index, e.g.
+    when rolling back, are left alone.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str): The documents_vN index to bring up to date.
+
+    Returns:
+        int: Number of documents copied again or deleted.
+    """
+    meta = read_index_meta(client, index_name)
+    source_index = meta.get("source_index")
+    if source_index is None or source_index != get_live_index(client):
+        return 0
+    strip_prefix = read_index_meta(client, source_index).get(
+        "asymmetric_embedding", ASSYMETRIC_EMBEDDING
+    )
+
+    caught_up = 0
+    for _ in range(REINDEX_CATCHUP_PASSES):
+        client.indices.refresh(index=f"{source_index},{index_name}")
+        source = _document_versions(client, source_index)
+        target = _document_versions(client, index_name)
+        stale = sorted(
+            name
+            for name in source.keys() | target.keys()
+            if name not in source or name not in target or source[name] != target[name]
+        )
+        if not stale:
+            break
+        for start in range(0, len(stale), 1000):
+            page = stale[start : start + 1000]
+            client.delete_by_query(
+                index=index_name,
+                body={"query": {"terms": {"document_name": page}}},
+                params={"refresh": "true", "conflicts": "proceed"},
+            )
+            copy = [name for name in page if name in source]
+            if copy:
+                _copy_documents(
+                    client,
+                    source_index,
+                    index_name,
+                    meta["reuse_embeddings"],
+                    meta["rechunk"],
+                    strip_prefix,
+                    copy,
+                )
+        caught_up += len(stale)
+        logger.info(
+            f"Caught up {len(stale)} documents changed in {source_index} "
+            f"during the build of {index_name}."
+        )
+    client.indices.refresh(index=index_name)
+    return caught_up
+
+
+def build_index_version(
+    client: OpenSearch,
+    promote: bool = True,
+    rechunk: Optional[bool] = None,
+    reuse_embeddings: Optional[bool] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Builds the next documents_vN index from the live index with the current
+    settings, while searches keep running against the live index.
+
+    Stored embeddings are reused when the embedding settings are unchanged, and
+    documents are only re-chunked when the chunking settings changed, so OCR
+    never runs again. When nothing needs recomputing, the chunks are copied with
+    a server-side reindex. The new index is refreshed and its kNN graphs are
+    warmed up before the alias is flipped. Documents written to the live index
+    during the build are copied again by `catch_up_index_version` before the
+    alias is flipped, here or when the version is promoted later.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        promote (bool, optional): Point the alias at the new index when it is ready.
+        rechunk (Optional[bool]): Re-chunk documents. Defaults to whether the
+            recorded chunking settings differ from the current ones.
+        reuse_embeddings (Optional[bool]): Reuse stored embeddings. Defaults to
+            whether the recorded embedding settings match the current ones.
+        progress_callback (Optional[Callable[[int, int], None]]): Called with the
+            number of documents done and the total after each document.
+
+    Returns:
+        Dict[str, Any]: The new index name, the source index, chunk and embedding
+            counts, the documents caught up, and whether the new index was promoted.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        raise ValueError("Blue/green reindexing requires the OpenSearch backend.")
+
+    live_index = get_live_index(client)
+    current_meta = get_index_meta()
+    source_meta = read_index_meta(client, live_index) if live_index else {}
+    if reuse_embeddings is None:
+        reuse_embeddings = all(
+            source_meta.get(key) == current_meta[key] for key in EMBEDDING_META_KEYS
+        )
+    if rechunk is None:
+        rechunk = bool(source_meta) and any(
+            source_meta.get(key) != current_meta[key] for key in CHUNKING_META_KEYS
+        )
+
+    index_name = versioned_index_name(max(get_index_versions(client), default=0) + 1)
+    index_body = load_index_config()
+    # Skip refreshes while loading; the index is refreshed once at the end
+    index_body["settings"]["index"]["refresh_interval"] = "-1"
+    # Recorded for the catch-up of documents written during the build
+    index_body["mappings"]["_meta"].update(
+        {
+            "source_index": live_index,
+            "reuse_embeddings": reuse_embeddings,
+            "rechunk": rechunk,
+        }
+    )
+    client.indices.create(index=index_name, body=index_body)
+    logger.info(
+        f"Building index {index_name} from {live_index} "
+        f"(reuse_embeddings={reuse_embeddings}, rechunk={rechunk})."
+    )
+
+    stats: Dict[str, Any] = {
+        "index": index_name,
+        "source_index": live_index,
+        "chunks": 0,
+        "reused_embeddings": 0,
+        "new_embeddings": 0,
+        "caught_up": 0,
+        "promoted": False,
+    }
+    if live_index is not None:
+        stats.update(
+            _copy_documents(
+                client,
+                live_index,
+                index_name,
+                reuse_embeddings,
+                rechunk,
+                source_meta.get("asymmetric_embedding", ASSYMETRIC_EMBEDDING),
+                progress_callback=progress_callback,
+            )
+        )
+
+    client.indices.put_settings(
+        index=index_name, body={"index": {"refresh_interval": None}}
+    )
+    client.indices.refresh(index=index_name)
+    warmup_knn_index(client, index_name)
+    logger.info(f"Index {index_name} built: {stats}")
+
+    if promote:
+        stats["caught_up"] = promote_index_version(client, index_name)
+        stats["promoted"] = True
+    return stats
+
+
+def promote_index_version(client: OpenSearch, index_name: str) -> int:
+    """
+    Atomically points the OPENSEARCH_INDEX alias at another index version.
+
+    A version built from the live index is first brought up to date with
+    `catch_up_index_version`.
+
+    An unversioned index named OPENSEARCH_INDEX is deleted in the same request,
+    since the alias cannot be created while an index has its name.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        index_name (str): The documents_vN index to promote.
+
+    Returns:
+        int: Number of documents the catch-up copied again or deleted.
+    """
+    if index_name == OPENSEARCH_INDEX or not client.indices.exists(index=index_name):
+        raise ValueError(f"Index {index_name} does not exist.")
+
+    caught_up = catch_up_index_version(client, index_name)
+    live_index = get_live_index(client)
+    actions: List[Dict[str, Any]] = []
+    if live_index == OPENSEARCH_INDEX:
+        actions.append({"remove_index": {"index": OPENSEARCH_INDEX}})
+    elif live_index is not None:
+        actions.append({"remove": {"index": live_index, "alias": OPENSEARCH_INDEX}})
+    actions.append({"add": {"index": index_name, "alias": OPENSEARCH_INDEX}})
+    client.indices.update_aliases(body={"actions": actions})
+    bump_index_generation(OPENSEARCH_INDEX)
+    logger.info(f"Alias {OPENSEARCH_INDEX} moved from {live_index} to {index_name}.")
+    return caught_up
+
+
+def list_index_versions(client: OpenSearch) -> List[Dict[str, Any]]:
+    """
+    Describes every documents_vN index.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+
+    Returns:
+        List[Dict[str, Any]]: Per version its index name, version number, chunk
+            count, store size, creation time, recorded settings and whether it
+            is live, sorted by version.
+    """
+    pattern = f"{OPENSEARCH_INDEX}_v*"
+    live_index = get_live_index(client)
+    indices = client.indices.get(index=pattern)
+    rows = {
+        row["index"]: row for row in client.cat.indices(index=pattern, format="json")
+    }
+
+    versions = []
+    for version in get_index_versions(client):
+        index_name = versioned_index_name(version)
+        info = indices[index_name]
+        row = rows.get(index_name, {})
+        versions.append(
+            {
+                "index": index_name,
+                "version": version,
+                "chunks": int(row.get("docs.count") or 0),
+                "size": row.get("store.size", "N/A"),
+                "created": int(info["settings"]["index"]["creation_date"]) / 1000,
+                "meta": info["mappings"].get("_meta", {}),
+                "live": index_name == live_index,
+            }
+        )
+    return versions
+
+
+def gc_index_versions(client: OpenSearch, keep: int = 1) -> List[str]:
+    """
+    Deletes index versions older than the live one.
+
+    Versions newer than the live one are never deleted, since they may still
+    be building or waiting to be promoted.
+
+    Args:
+        client (OpenSearch): OpenSearch client instance.
+        keep (int, optional): Number of most recent older versions to keep for
+            rollback. Defaults to 1.
+
+    Returns:
+        List[str]: Names of the deleted indexes.
+    """
+    live_index = get_live_index(client)
+    versions = get_index_versions(client)
+    if live_index is None:
+        live_version = max(versions, default=0) + 1
+    elif live_index == OPENSEARCH_INDEX:
+        # Every version is a build that has not replaced the unversioned index yet
+        live_version = 0
+    else:
+        live_version = int(live_index[len(OPENSEARCH_INDEX) + 2 :])
+
+    older = [version for version in versions if version < live_version]
+    stale = older[: max(0, len(older) - keep)]
+    deleted = [versioned_index_name(version) for version in stale]
+    if deleted:
+        client.indices.delete(index=",".join(deleted))
+        logger.info(f"Deleted old index versions: {', '.join(deleted)}")
+    return deleted
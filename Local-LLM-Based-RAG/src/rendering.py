@@ -0,0 +1,70 @@
+import time
+from typing import Callable, List
+
+from src.constants import STREAM_RENDER_FPS, STREAM_RENDER_MAX_PENDING_CHARS
+
+
+class RenderCoalescer:
+    """
+    Batches streamed tokens into a limited number of screen updates.
+
+    Rendering every token re-sends the whole growing answer to the browser, so
+    its cost grows with the square of the answer length. Tokens are buffered
+    instead and flushed at most `fps` times per second, earlier when
+    `max_pending_chars` characters are waiting, and once more at the end.
+    """
+
+    def __init__(
+        self,
+        render: Callable[[str, str], None],
+        fps: float = STREAM_RENDER_FPS,
+        max_pending_chars: int = STREAM_RENDER_MAX_PENDING_CHARS,
+    ) -> None:
+        """
+        Args:
+            render (Callable[[str, str], None]): Called with the text so far and
+                the text added since the previous call.
+            fps (float, optional): Maximum number of updates per second; 0
+                renders every token.
+            max_pending_chars (int, optional): Buffered characters that trigger
+                an update before the next frame is due.
+        """
+        self._render = render
+        self.interval = 1 / fps if fps > 0 else 0.0
+        self.max_pending_chars = max_pending_chars
+        self.text = ""
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._last_flush = 0.0
+        self.flushes = 0
+
+    def add(self, token: str) -> None:
+        """
+        Buffers a token and renders if a frame is due.
+
+        Args:
+            token (str): Text of the next chunk.
+        """
+        if not token:
+            return
+        self._pending.append(token)
+        self._pending_chars += len(token)
+        if (
+            time.monotonic() - self._last_flush >= self.interval
+            or self._pending_chars >= self.max_pending_chars
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Renders the buffered tokens, if any.
+        """
+        if not self._pending:
+            return
+        delta = "".join(self._pending)
+        self.text += delta
+        self._pending = []
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+        self.flushes += 1
+        self._render(self.text, delta)
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import streamlit as st
+
+from src.cache import normalize_query
+from src.constants import (
+    RERANK_BATCH_SIZE,
+    RERANK_DEVICE,
+    RERANK_SCORE_CACHE_SIZE,
+    RERANKER_MODEL_PATH,
+)
+from src.utils import setup_logging
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Cross-encoder scores of (query, chunk) pairs, least recently used first
+_score_cache: "OrderedDict[str, float]" = OrderedDict()
+_score_lock = threading.Lock()
+
+
+@st.cache_resource(show_spinner=False)
+def get_reranker() -> "CrossEncoder":
+    """
+    Loads and caches the cross-encoder used to rerank retrieved chunks.
+
+    Returns:
+        CrossEncoder: The loaded reranker model.
+    """
+    from sentence_transformers import CrossEncoder
+
+    logger.info(f"Loading reranker model from path: {RERANKER_MODEL_PATH}")
+    return CrossEncoder(RERANKER_MODEL_PATH, device=RERANK_DEVICE)
+
+
+def _pair_key(query: str, text: str) -> str:
+    payload = f"{RERANKER_MODEL_PATH}\0{normalize_query(query)}\0{text}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def score_pairs(query: str, texts: List[str]) -> List[float]:
+    """
+    Scores how well each text answers the query, reusing cached pair scores.
+
+    All uncached pairs are scored in one batched cross-encoder call.
+
+    Args:
+        query (str): The user's query.
+        texts (List[str]): Candidate chunk texts.
+
+    Returns:
+        List[float]: One relevance score per text, higher is more relevant.
+    """
+    keys = [_pair_key(query, text) for text in texts]
+    scores: Dict[str, float] = {}
+    with _score_lock:
+        for key in keys:
+            if key in _score_cache:
+                _score_cache.move_to_end(key)
+                scores[key] = _score_cache[key]
+
+    missing = [i for i, key in enumerate(keys) if key not in scores]
+    if missing:
+        predictions = get_reranker().predict(
+            [(query, texts[i]) for i in missing], batch_size=RERANK_BATCH_SIZE
+        )
+        with _score_lock:
+            for i, score in zip(missing, predictions):
+                scores[keys[i]] = _score_cache[keys[i]] = float(score)
+            while len(_score_cache) > RERANK_SCORE_CACHE_SIZE:
+                _score_cache.popitem(last=False)
+    return [scores[key] for key in keys]
+
+
+def rerank_hits(
+    query: str,
+    hits: List[Dict[str, Any]],
+    top_n: int,
+    report: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Reorders search hits by cross-encoder relevance and keeps the best ones.
+
+    Args:
+        query (str): The user's query.
+        hits (List[Dict[str, Any]]): Candidate hits from hybrid search.
+        top_n (int): Number of hits to keep.
+        report (Optional[Dict[str, Any]]): When given, filled with the number of
+            candidates, of pairs scored by the model and the rerank time.
+
+    Returns:
+        List[Dict[str, Any]]: The `top_n` most relevant hits with their
+            '_rerank_score', best first.
+    """
+    start = time.perf_counter()
+    texts = [hit["_source"]["text"].removeprefix("passage: ") for hit in hits]
+    with _score_lock:
+        scored = sum(_pair_key(query, text) not in _score_cache for text in texts)
+    scores = score_pairs(query, texts)
+    ranked = sorted(zip(scores, hits), key=lambda pair: pair[0], reverse=True)
+    reranked = [{**hit, "_rerank_score": score} for score, hit in ranked[:top_n]]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    logger.info(f"Reranked {len(hits)} candidates in {elapsed_ms:.0f} ms.")
+    if report is not None:
+        report["rerank_candidates"] = len(hits)
+        report["rerank_scored"] = scored
+        report["rerank_ms"] = elapsed_ms
+    return reranked
@@ -0,0 +1,264 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+import streamlit as st
+
+from src.constants import (
+    GENERATION_QUEUE_MAX,
+    GENERATION_QUEUE_TIMEOUT_SECONDS,
+    OLLAMA_MAX_CONCURRENT_GENERATIONS,
+)
+from src.utils import setup_logging
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Queue waits kept for the wait time percentiles
+WAIT_SAMPLES = 1000
+# Longest pause between checks of a waiting request's deadline and position
+POLL_SECONDS = 0.5
+
+
+class SchedulerBusyError(RuntimeError):
+    """Raised when a request is not admitted to the model."""
+
+
+class GenerationScheduler:
+    """
+    Admission control in front of the chat model.
+
+    At most `max_in_flight` generations run at once. Further requests wait in
+    one FIFO queue per session, and free slots go to the sessions in turn, so a
+    session sending many requests cannot starve the others. Low-priority
+    requests, such as background summaries, only get a slot when no other
+    request is waiting. Requests are rejected when the queue is full or when
+    they wait longer than the timeout.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = OLLAMA_MAX_CONCURRENT_GENERATIONS,
+        max_queued: int = GENERATION_QUEUE_MAX,
+        timeout_seconds: float = GENERATION_QUEUE_TIMEOUT_SECONDS,
+    ) -> None:
+        """
+        Args:
+            max_in_flight (int, optional): Generations allowed to run at once.
+            max_queued (int, optional): Requests allowed to wait for a slot.
+            timeout_seconds (float, optional): Longest wait for a slot.
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max_queued
+        self.timeout_seconds = timeout_seconds
+        self._condition = threading.Condition()
+        # Waiting tickets per session, sessions in the order they are served
+        self._queues: "OrderedDict[str, Deque[int]]" = OrderedDict()
+        self._admitted: Set[int] = set()
+        self._low_priority: Set[int] = set()
+        self._tickets = itertools.count()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.in_flight = 0
+        self.served = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _admission_order(self) -> List[int]:
+        """Returns the waiting tickets in the order they will be admitted."""
+        queues = list(self._queues.values())
+        order: List[int] = []
+        depth = 0
+        while True:
+            row = [queue[depth] for queue in queues if len(queue) > depth]
+            if not row:
+                break
+            order.extend(row)
+            depth += 1
+        return [t for t in order if t not in self._low_priority] + [
+            t for t in order if t in self._low_priority
+        ]
+
+    def _next_session(self) -> str:
+        """Returns the next session in turn whose next request is not low priority."""
+        for session_id, queue in self._queues.items():
+            if queue[0] not in self._low_priority:
+                return session_id
+        return next(iter(self._queues))
+
+    def _dispatch(self) -> None:
+        """Admits waiting requests into free slots, one session at a time."""
+        while self.in_flight < self.max_in_flight and self._queues:
+            session_id = self._next_session()
+            queue = self._queues[session_id]
+            ticket = queue.popleft()
+            self._low_priority.discard(ticket)
+            self._admitted.add(ticket)
+            self.in_flight += 1
+            # The session goes to the back of the rotation
+            del self._queues[session_id]
+            if queue:
+                self._queues[session_id] = queue
+        self._condition.notify_all()
+
+    def _withdraw(self, session_id: str, ticket: int) -> None:
+        queue = self._queues.get(session_id)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[session_id]
+
+    def acquire(
+        self,
+        session_id: str,
+        on_position: Optional[Callable[[int], None]] = None,
+        timeout_seconds: Optional[float] = None,
+        low_priority: bool = False,
+    ) -> float:
+        """
+        Waits for a generation slot. Every acquired slot must be released.
+
+        Args:
+            session_id (str): Session the request belongs to.
+            on_position (Optional[Callable[[int], None]]): Called with the number
+                of requests ahead whenever it changes while waiting.
+            timeout_seconds (Optional[float]): Longest wait for a slot. Defaults
+                to the scheduler's timeout.
+            low_priority (bool, optional): Only admit the request when no other
+                request is waiting.
+
+        Raises:
+            SchedulerBusyError: If the queue is full or the wait timed out.
+
+        Returns:
+            float: Time spent waiting in milliseconds.
+        """
+        start = time.perf_counter()
+        deadline = start + (
+            self.timeout_seconds if timeout_seconds is None else timeout_seconds
+        )
+        with self._condition:
+            queued = sum(len(queue) for queue in self._queues.values())
+            if self.in_flight >= self.max_in_flight and queued >= self.max_queued:
+                self.rejected += 1
+                raise SchedulerBusyError(
+                    "The model is busy with too many requests. "
+                    "Please try again later."
+                )
+            ticket = next(self._tickets)
+            if low_priority:
+                self._low_priority.add(ticket)
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            self._dispatch()
+
+        position: Optional[int] = None
+        try:
+            while True:
+                with self._condition:
+                    if ticket in self._admitted:
+                        self._admitted.discard(ticket)
+                        break
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        raise SchedulerBusyError(
+                            "Timed out waiting for the model. Please try again later."
+                        )
+                    ahead = self._admission_order().index(ticket) + self.in_flight
+                    if ahead == position:
+                        self._condition.wait(min(remaining, POLL_SECONDS))
+                        continue
+                    position = ahead
+                # Called without the lock, as it may render UI
+                if on_position is not None:
+                    on_position(position)
+        except BaseException:
+            # Timed out, or the caller went away (e.g. a Streamlit rerun)
+            with self._condition:
+                if ticket in self._admitted:
+                    self._admitted.discard(ticket)
+                    self.in_flight -= 1
+                    self._dispatch()
+                else:
+                    self._withdraw(session_id, ticket)
+                    self._low_priority.discard(ticket)
+            raise
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._condition:
+            self.served += 1
+            self._waits.append(wait_ms)
+        if wait_ms >= 1000:
+            logger.info(f"Session {session_id} waited {wait_ms:.0f} ms for the model.")
+        return wait_ms
+
+    def release(self) -> None:
+        """
+        Frees a slot acquired with `acquire` and admits the next request.
+        """
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, session_id: str, low_priority: bool = False) -> Iterator[float]:
+        """
+        Holds a generation slot for the enclosed block.
+
+        Args:
+            session_id (str): Session the request belongs to.
+            low_priority (bool, optional): Only admit the request when no other
+                request is waiting.
+
+        Yields:
+            float: Time spent waiting in milliseconds.
+        """
+        wait_ms = self.acquire(session_id, low_priority=low_priority)
+        try:
+            yield wait_ms
+        finally:
+            self.release()
+
+    def queue_depth(self) -> int:
+        """Returns the number of requests waiting for a slot."""
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the load of the scheduler and its recent wait times.
+
+        Returns:
+            Dict[str, Any]: Running and waiting requests, the slot limit, served,
+                rejected and timed out requests, and the median and 95th
+                percentile wait of the recent requests in milliseconds.
+        """
+        with self._condition:
+            waits = list(self._waits)
+            stats: Dict[str, Any] = {
+                "in_flight": self.in_flight,
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "max_in_flight": self.max_in_flight,
+                "served": self.served,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+        stats["wait_p50_ms"] = float(np.percentile(waits, 50)) if waits else 0.0
+        stats["wait_p95_ms"] = float(np.percentile(waits, 95)) if waits else 0.0
+        return stats
+
+
+@st.cache_resource(show_spinner=False)
+def get_generation_scheduler() -> GenerationScheduler:
+    """
+    Creates and caches the scheduler shared by every session of the process.
+
+    Returns:
+        GenerationScheduler: The configured scheduler.
+    """
+    return GenerationScheduler()
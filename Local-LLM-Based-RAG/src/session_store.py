@@ -0,0 +1,295 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from src.constants import SESSION_LIST_LIMIT, SESSION_STORE_PATH
+from src.utils import setup_logging
+
+if TYPE_CHECKING:
+    # Imported when a conversation is opened, so listing sessions does not load
+    # ollama and the tokenizer
+    from src.history import ConversationHistory
+
+# Initialize logger
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Characters of the first question used as the title of a conversation
+SESSION_TITLE_CHARS = 60
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a connection to the session database, creating the tables if needed.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+
+    Returns:
+        sqlite3.Connection: Open database connection.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    # The connection is shared by the threads of the store, which take turns
+    conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        "session_id TEXT PRIMARY KEY, title TEXT NOT NULL, "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+        "message_count INTEGER NOT NULL DEFAULT 0, "
+        "summary TEXT NOT NULL DEFAULT '', summarized INTEGER NOT NULL DEFAULT 0)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS messages ("
+        "message_id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+        "role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS messages_by_session "
+        "ON messages (session_id, message_id)"
+    )
+    return conn
+
+
+class SessionStore:
+    """
+    Chat conversations persisted in SQLite, shared by the Streamlit app and
+    the CLI.
+
+    Messages are appended as they are exchanged and read back a page at a
+    time, newest first, so showing or resuming a conversation costs the same
+    however long it has grown. The running summary of `ConversationHistory` is
+    stored with its session, so a resumed conversation only loads the messages
+    the summary does not cover.
+
+    The store keeps one connection open, so the tables and the journal mode
+    are set up once per process instead of on every call.
+    """
+
+    def __init__(self, db_path: str = SESSION_STORE_PATH) -> None:
+        """
+        Args:
+            db_path (str, optional): Path to the SQLite database file.
+        """
+        self.db_path = db_path
+        self._conn = _connect(db_path)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Holds the store's connection for one transaction, committed when the
+        block succeeds and rolled back when it raises.
+
+        Yields:
+            sqlite3.Connection: The open database connection.
+        """
+        with self._lock, self._conn:
+            yield self._conn
+
+    def create_session(self) -> str:
+        """
+        Starts a new conversation. It is stored with its first messages.
+
+        Returns:
+            str: The session ID.
+        """
+        return uuid.uuid4().hex
+
+    def list_sessions(self, limit: int = SESSION_LIST_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Returns the most recently active conversations.
+
+        Args:
+            limit (int, optional): Maximum number of conversations.
+
+        Returns:
+            List[Dict[str, Any]]: 'session_id', 'title', 'updated_at' and
+                'message_count' of each conversation, most recent first.
+        """
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT session_id, title, updated_at, message_count FROM sessions "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {
+                "session_id": session_id,
+                "title": title,
+                "updated_at": updated_at,
+                "message_count": message_count,
+            }
+            for session_id, title, updated_at, message_count in rows
+        ]
+
+    def add_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        """
+        Appends messages to a conversation in one transaction. The first user
+        message becomes the title of the conversation.
+
+        Args:
+            session_id (str): The session ID.
+            messages (List[Dict[str, str]]): Messages with 'role' and 'content'.
+        """
+        now = time.time()
+        title = next((msg["content"] for msg in messages if msg["role"] == "user"), "")[
+            :SESSION_TITLE_CHARS
+        ]
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions "
+                "(session_id, title, created_at, updated_at) VALUES (?, '', ?, ?)",
+                (session_id, now, now),
+            )
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(session_id, msg["role"], msg["content"], now) for msg in messages],
+            )
+            conn.execute(
+                "UPDATE sessions SET updated_at = ?, "
+                "message_count = message_count + ?, "
+                "title = CASE WHEN title = '' THEN ? ELSE title END "
+                "WHERE session_id = ?",
+                (now, len(messages), title, session_id),
+            )
+
+    def load_messages(
+        self, session_id: str, limit: int, before_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns a page of the most recent messages of a conversation.
+
+        Args:
+            session_id (str): The session ID.
+            limit (int): Maximum number of messages.
+            before_id (Optional[int]): Only return messages older than this
+                'message_id', to load the page before an earlier one.
+
+        Returns:
+            List[Dict[str, Any]]: Messages with 'message_id', 'role' and
+                'content', oldest first.
+        """
+        query = "SELECT message_id, role, content FROM messages WHERE session_id = ?"
+        params: Tuple[Any, ...] = (session_id,)
+        if before_id is not None:
+            query += " AND message_id < ?"
+            params += (before_id,)
+        query += " ORDER BY message_id DESC LIMIT ?"
+        with self._transaction() as conn:
+            rows = conn.execute(query, params + (limit,)).fetchall()
+        return [
+            {"message_id": message_id, "role": role, "content": content}
+            for message_id, role, content in reversed(rows)
+        ]
+
+    def count_messages(self, session_id: str) -> int:
+        """
+        Returns the number of messages in a conversation.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            int: The number of messages, 0 for an unknown session.
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT message_count FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        return int(row[0]) if row else 0
+
+    def save_summary(self, session_id: str, summary: str, summarized: int) -> None:
+        """
+        Stores the running summary of a conversation.
+
+        Args:
+            session_id (str): The session ID.
+            summary (str): The summary.
+            summarized (int): Number of leading messages the summary covers.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE sessions SET summary = ?, summarized = ? WHERE session_id = ?",
+                (summary, summarized, session_id),
+            )
+
+    def load_conversation(
+        self, session_id: str
+    ) -> Tuple[str, int, List[Dict[str, str]]]:
+        """
+        Returns what `ConversationHistory.restore` needs to resume a conversation.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            Tuple[str, int, List[Dict[str, str]]]: The summary, the number of
+                messages it covers and the messages after those, oldest first.
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT summary, summarized FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            summary, summarized = row if row else ("", 0)
+            rows = conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? "
+                "ORDER BY message_id LIMIT -1 OFFSET ?",
+                (session_id, summarized),
+            ).fetchall()
+        messages = [{"role": role, "content": content} for role, content in rows]
+        return summary, summarized, messages
+
+    def open_conversation(self, session_id: str) -> "ConversationHistory":
+        """
+        Returns the history to send to the model for a stored conversation,
+        saving its summary back to the store whenever it is updated.
+
+        Args:
+            session_id (str): The session ID; a new one gives an empty history.
+
+        Returns:
+            ConversationHistory: The restored history.
+        """
+        from src.history import ConversationHistory
+
+        conversation = ConversationHistory(
+            on_summary=lambda summary, summarized: self.save_summary(
+                session_id, summary, summarized
+            )
+        )
+        conversation.restore(*self.load_conversation(session_id))
+        return conversation
+
+    def delete_session(self, session_id: str) -> None:
+        """
+        Deletes a conversation and its messages.
+
+        Args:
+            session_id (str): The session ID.
+        """
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        logger.info(f"Deleted chat session {session_id}.")
+
+
+@lru_cache(maxsize=None)
+def get_session_store() -> SessionStore:
+    """
+    Creates and caches the chat session store of the process. It is cached
+    without Streamlit, so the CLI can list sessions without importing it.
+
+    Returns:
+        SessionStore: The session store at SESSION_STORE_PATH.
+    """
+    return SessionStore()
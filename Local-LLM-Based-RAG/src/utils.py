@@ -78,3 +78,27 @@ def chunk_text(text: str, chunk_size: int, overlap: int = 100) -> List[str]:
         f"Text split into {len(chunks)} chunks with chunk size {chunk_size} and overlap {overlap}."
     )
     return chunks
+
+
+def merge_chunks(chunks: List[str]) -> str:
+    """
+    Reassembles a document's text from its overlapping chunks.
+
+    Args:
+        chunks (List[str]): The chunks of a document, in order.
+
+    Returns:
+        str: The document text with each overlap included once.
+    """
+    text = chunks[0] if chunks else ""
+    for chunk in chunks[1:]:
+        # The longest suffix of the text that starts the next chunk is the overlap
+        probe = chunk[:32]
+        start = text.find(probe, max(0, len(text) - len(chunk)))
+        while start != -1 and not chunk.startswith(text[start:]):
+            start = text.find(probe, start + 1)
+        if start == -1:
+            text = f"{text} {chunk}"
+        else:
+            text += chunk[len(text) - start :]
+    return text
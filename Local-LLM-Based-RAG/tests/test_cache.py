@@ -0,0 +1,59 @@
+import numpy as np
+
+from src.cache import SemanticAnswerCache
+
+SCOPE = "scope"
+GENERATION = 1
+
+
+def unit(*components: float) -> np.ndarray:
+    """Returns a 4-dimensional embedding with the given leading components."""
+    vector = np.zeros(4, dtype=np.float32)
+    vector[: len(components)] = components
+    return vector
+
+
+def make_cache(max_entries: int = 1000) -> SemanticAnswerCache:
+    return SemanticAnswerCache(threshold=0.95, ttl_seconds=100, max_entries=max_entries)
+
+
+def test_hit_among_several_entries() -> None:
+    cache = make_cache()
+    cache.put(unit(1), SCOPE, GENERATION, "first")
+    cache.put(unit(0, 1), SCOPE, GENERATION, "second")
+    cache.put(unit(0, 0, 1), SCOPE, GENERATION, "third")
+
+    assert cache.get(unit(0, 1, 0.01), SCOPE, GENERATION) == "second"
+    assert cache.stats()["hits"] == 1
+
+
+def test_miss_below_threshold_or_out_of_scope() -> None:
+    cache = make_cache()
+    cache.put(unit(1), SCOPE, GENERATION, "first")
+    cache.put(unit(0, 1), SCOPE, GENERATION, "second")
+
+    assert cache.get(unit(1, 1), SCOPE, GENERATION) is None
+    assert cache.get(unit(1), "other scope", GENERATION) is None
+    assert cache.get(unit(1), SCOPE, GENERATION + 1) is None
+    assert cache.stats()["misses"] == 3
+
+
+def test_negative_similarity_is_a_miss() -> None:
+    cache = make_cache()
+    cache.put(unit(1), SCOPE, GENERATION, "first")
+
+    assert cache.get(unit(-1), SCOPE, GENERATION) is None
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    cache = make_cache(max_entries=2)
+    cache.put(unit(1), SCOPE, GENERATION, "first")
+    cache.put(unit(0, 1), SCOPE, GENERATION, "second")
+    # Using the first answer makes the second the least recently used
+    assert cache.get(unit(1), SCOPE, GENERATION) == "first"
+    cache.put(unit(0, 0, 1), SCOPE, GENERATION, "third")
+
+    assert cache.get(unit(0, 1), SCOPE, GENERATION) is None
+    assert cache.get(unit(1), SCOPE, GENERATION) == "first"
+    assert cache.get(unit(0, 0, 1), SCOPE, GENERATION) == "third"
+    assert cache.stats()["entries"] == 2